@@ -0,0 +1,123 @@
+"""Chemins de lecture et d'écriture de l'app, hors Streamlit : base, file d'écriture, caches mémoire et disque.
+
+L'app (via ses st.cache_resource) et les benchmarks passent par les mêmes fonctions.
+"""
+import pandas as pd
+
+from schema import COLONNES, categoriser, ingerer_charges, ingerer_revenus, ingerer_soldes, vers_stockage
+from storage import SQLiteStorage, diff_lignes, nouvel_id
+
+
+def avec_ids(df):
+    """Donne un ID aux lignes ajoutées dans l'éditeur (elles arrivent sans)"""
+    df = df.copy()
+    if "ID" not in df.columns:
+        df["ID"] = ""
+    manquants = df["ID"].isna() | (df["ID"].astype(str).str.strip() == "")
+    df.loc[manquants, "ID"] = [nouvel_id() for _ in range(int(manquants.sum()))]
+    return df
+
+
+def dans_fenetre(mois_paiement, fenetre):
+    debut, fin = fenetre
+    return (mois_paiement >= debut) & (mois_paiement <= fin)
+
+
+def cle_version(table, user_email):
+    """Clé de révision d'un compte dans le cache partagé ("*" = tous comptes) : +1 à chaque écriture"""
+    return ("VERSION", table, str(user_email))
+
+
+class AccesDonnees:
+    """`db` (StorageBackend), `file` (WriteBehindQueue des ajouts), `cache` (SnapshotCache), `disque` (SnapshotDisque ou None)"""
+
+    def __init__(self, db, file, cache, disque=None):
+        self.db = db
+        self.file = file
+        self.cache = cache
+        self.disque = disque
+
+    def invalider(self, table, user_email):
+        partition = self.db.partition(table, user_email)
+        # Disque d'abord : un rechargement entre les deux ne doit pas retrouver l'ancien instantané
+        if self.disque is not None:
+            self.disque.supprimer(table, partition)
+        self.cache.invalider((table, partition))
+        self.cache.invalider(cle_version(table, "*"))   # révision tous comptes (analytique)
+
+    # --- LECTURE ---
+    def partition_parsee(self, table, partition, parser):
+        """Partition entière, parsée une seule fois : cache mémoire, puis instantané disque, puis le Cloud"""
+        charger = lambda: parser(self.db.lire_partition(table, partition))
+        if self.disque is not None:
+            charger = lambda charger=charger: self.disque.obtenir(table, partition, charger)
+        return self.cache.obtenir((table, partition), charger)
+
+    def lire_snapshot(self, table, user_email, parser):
+        """Lignes de l'utilisateur, extraites de la partition en cache"""
+        df = self.partition_parsee(table, self.db.partition(table, user_email), parser)
+        return df[df["User"] == str(user_email)].reset_index(drop=True)
+
+    def lire_tous(self, table, parser):
+        """Toute la table, tous comptes : onglet par onglet via le cache partagé (Sheets), une seule requête (SQLite)"""
+        if isinstance(self.db, SQLiteStorage):
+            return parser(self.db.lire_tout(table))
+        morceaux = [self.partition_parsee(table, p, parser) for p in self.db.partitions(table)]
+        return categoriser(pd.concat(morceaux, ignore_index=True), table) if morceaux else parser([])
+
+    def lire_revenus(self, user_email, fenetre=None):
+        """Revenus de l'utilisateur payés dans `fenetre` = ("YYYY-MM", "YYYY-MM"), ou tout l'historique si None"""
+        en_attente = self.file.en_attente("DATA", user_email)
+        if fenetre and self.db.FENETRE_NATIVE:
+            # SQLite : requête sur la plage (index User + Mois Paiement)
+            df_r = ingerer_revenus(self.db.lire_fenetre(user_email, *fenetre))
+        else:
+            # Sheets : l'onglet est lu (et parsé) une fois pour tous, on n'en garde que la fenêtre
+            df_r = self.lire_snapshot("DATA", user_email, ingerer_revenus)
+            if fenetre:
+                df_r = df_r[dans_fenetre(df_r["Mois Paiement"], fenetre)].reset_index(drop=True)
+        # + ses saisies pas encore parties vers le Cloud
+        if en_attente:
+            ids_lus = set(df_r["ID"])
+            en_attente = [r for r in en_attente if r["ID"] not in ids_lus]
+        if en_attente:
+            df_a = ingerer_revenus(en_attente)
+            if fenetre:
+                df_a = df_a[dans_fenetre(df_a["Mois Paiement"], fenetre)]
+            df_r = categoriser(pd.concat([df_r, df_a], ignore_index=True), "DATA")
+        return df_r
+
+    def lectures(self, user_email, fenetre=None):
+        """Les trois lectures d'un compte {table: fonction}, à lancer en parallèle (DATA sur la fenêtre de mois)"""
+        return {
+            "DATA": lambda: self.lire_revenus(user_email, fenetre),
+            "CHARGES": lambda: self.lire_snapshot("CHARGES", user_email, ingerer_charges),
+            "SOLDES": lambda: self.lire_snapshot("SOLDES", user_email, ingerer_soldes),
+        }
+
+    # --- ÉCRITURE ---
+    def sauver(self, table, user_email, df_origine, df):
+        """N'envoie au Cloud que les lignes ajoutées, modifiées ou supprimées. Retourne le tableau avec ses IDs."""
+        df = avec_ids(df)
+        if table == "DATA":
+            # Les ajouts encore en file doivent exister côté Cloud avant d'être modifiés : sinon le diff les verrait
+            # absents (modifiés -> réinsérés en double, supprimés -> renvoyés par la file). flush attend un envoi en cours.
+            if not self.file.flush() and self.file.en_attente("DATA", user_email):
+                raise RuntimeError("des revenus ajoutés n'ont pas encore pu être envoyés au Cloud, réessayez dans un instant")
+        inserts, updates, deletes = diff_lignes(vers_stockage(df_origine, table), vers_stockage(df, table), COLONNES[table])
+        if inserts or updates or deletes:
+            self.db.appliquer_diff(table, user_email, inserts, updates, deletes)
+            self.invalider(table, user_email)
+        return df
+
+    def soumettre_revenu(self, user_email, row_dict):
+        """Mise en file (retour immédiat). Retourne le ticket pour suivre l'envoi au Cloud."""
+        return self.file.soumettre("DATA", {**row_dict, "User": user_email})
+
+    def importer(self, user_email, df_import):
+        """Import en masse : un seul envoi groupé (append_rows) pour tout le fichier"""
+        records = vers_stockage(df_import, "DATA")
+        for r in records:
+            r["User"] = user_email
+        self.db.ajouter_lot("DATA", records)
+        self.invalider("DATA", user_email)
@@ -0,0 +1,84 @@
+"""Analytique tous comptes (sans Streamlit) : un passage groupby sur DATA et CHARGES.
+
+- situations : une ligne par (compte, mois) avec Entrées, charges, Solde, Score et Etat,
+  selon les règles du coach (moteur.niveau, comme analyser_situation)
+- cohortes : percentiles par type de contrat principal ou par mois
+"""
+import numpy as np
+import pandas as pd
+
+from moteur import ETATS, niveau
+
+GROUPES = ["FIXES", "VARIABLES", "EPARGNE"]
+QUANTILES = [0.1, 0.25, 0.5, 0.75, 0.9]
+MESURES = ["Entrées", "Solde", "Score", "Ratio fixes"]
+
+
+def charges_par_compte(df_charges):
+    """Total des charges par compte et par Groupe (centimes, montants > 0 comme la timeline) : une ligne par compte.
+    "Sorties" = toutes les charges du compte, y compris hors GROUPES."""
+    c = df_charges[df_charges["Montant"] > 0]
+    totaux = c.groupby([c["User"].astype(str), c["Groupe"].astype(str)])["Montant"].sum().unstack(fill_value=0)
+    totaux = totaux.reindex(df_charges["User"].astype(str).unique(), fill_value=0)
+    return totaux.reindex(columns=GROUPES, fill_value=0).assign(Sorties=totaux.sum(axis=1).astype("int64"))
+
+
+def revenus_mensuels(df_revenus, mois):
+    """Entrées (centimes) et type de contrat principal (le plus gros montant) par (compte, mois de paiement)"""
+    r = df_revenus[df_revenus["Mois Paiement"].isin(mois)]
+    cles = [r["User"].astype(str).rename("User"), r["Mois Paiement"].rename("Mois")]
+    entrees = r.groupby(cles)["Montant Net"].sum().rename("Entrées")
+    par_type = r.groupby(cles + [r["Type"].astype(str).rename("Type")])["Montant Net"].sum()
+    principal = (
+        par_type.sort_values(ascending=False, kind="stable").reset_index(level="Type")
+        .pipe(lambda d: d[~d.index.duplicated()])["Type"]
+    )
+    return pd.concat([entrees, principal], axis=1)
+
+
+def situations(df_revenus, df_charges, mois):
+    """Une ligne par (compte, mois) pour tous les comptes et tous les `mois` ("YYYY-MM"), en euros.
+    Même calcul que le tableau de bord : les charges se répètent chaque mois, score = entrées / fixes."""
+    mois = list(mois)
+    charges = charges_par_compte(df_charges)
+    revenus = revenus_mensuels(df_revenus, mois)
+    comptes = charges.index.union(revenus.index.get_level_values("User").unique())
+    comptes = comptes[comptes != ""]
+    grille = pd.MultiIndex.from_product([comptes, mois], names=["User", "Mois"])
+
+    df = revenus.reindex(grille)
+    df["Entrées"] = df["Entrées"].fillna(0).astype("int64")
+    df["Type"] = df["Type"].fillna("Aucun revenu")
+    c = charges.reindex(grille.get_level_values("User"), fill_value=0).to_numpy()
+    for i, g in enumerate(GROUPES + ["Sorties"]):
+        df[g] = c[:, i]
+
+    # Calcul en centimes, rendu en euros (comme IndexMensuel.kpis)
+    entrees, fixes = df["Entrées"].to_numpy(), df["FIXES"].to_numpy()
+    sorties = df["Sorties"].to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        score = np.where(fixes > 0, entrees / np.where(fixes > 0, fixes, 1), 0.0)
+        ratio = np.where(entrees > 0, fixes / np.where(entrees > 0, entrees, 1), np.nan)
+    out = pd.DataFrame({
+        "Type": df["Type"].to_numpy(),
+        "Entrées": entrees / 100,
+        "Sorties": sorties / 100,
+        "Solde": (entrees - sorties) / 100,
+        "Score": score,
+        "Ratio fixes": ratio,
+    }, index=grille)
+    for g in GROUPES:
+        out[g.capitalize()] = df[g].to_numpy() / 100
+    out["Niveau"] = niveau(out["Solde"].to_numpy(), score)
+    out["Etat"] = pd.Categorical.from_codes(out["Niveau"], ETATS)
+    return out.reset_index()
+
+
+def cohortes(sit, par="Type"):
+    """Percentiles (p10..p90) des mesures par cohorte, nombre de comptes et répartition des états"""
+    groupes = sit.groupby(par, observed=True, sort=True)
+    q = groupes[MESURES].quantile(QUANTILES).unstack()
+    q.columns = [f"{m} p{round(p * 100)}" for m, p in q.columns]
+    etats = pd.crosstab(sit[par], sit["Etat"], normalize="index").reindex(columns=ETATS, fill_value=0.0)
+    etats.columns = [f"% {e.split()[0]}" for e in etats.columns]
+    return pd.concat([groupes.size().rename("Comptes"), etats * 100, q], axis=1)
@@ -1,43 +1,50 @@
 import streamlit as st
 import pandas as pd
+import altair as alt
+import logging
+import functools
+import hmac
 import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+import perf
+from write_behind import WriteBehindQueue, EN_ATTENTE, ECHEC
+from snapshot_cache import SnapshotCache
+from snapshot_disque import SnapshotDisque
+from quota import ClasseurPlanifie, Planificateur
+from import_revenus import importer
+import export
+import analytique
+from paie import TYPES_REVENUS, calculer_net, date_paiement
+from moteur import IndexMensuel, analyser_situation, build_timeline, decaler_mois, derniere_ouverture, projeter, scenarios
+from schema import ingerer_revenus, ingerer_charges, ingerer_soldes, categoriser, pour_editeur
+from storage import GoogleSheetsStorage, SQLiteStorage, ShardRouter, ouvrir_classeur, nouvel_id
+from acces_donnees import AccesDonnees, cle_version, dans_fenetre
 
-def update_revenus_cloud(user_email, df_cleaned):
-    """Ecrase les revenus en forçant le format numérique propre via l'apostrophe"""
-    sh = get_db_connection()
-    ws = sh.worksheet("DATA")
-    
-    all_records = ws.get_all_records()
-    other_users_data = [r for r in all_records if str(r.get("User")) != str(user_email)]
-    
-    new_user_data = []
-    for _, row in df_cleaned.iterrows():
-        r = row.to_dict()
-        r["User"] = user_email
-        
-        # 🚨 LE HACK ABSOLU POUR L'HISTORIQUE : On met l'apostrophe
-        val_pure = str(r["Montant Net"]).replace(',', '.')
-        r["Montant Net"] = f"'{val_pure}"
-            
-        r["Date"] = str(r["Date"])
-        r["Date Paiement"] = str(r["Date Paiement"])
-        new_user_data.append(r)
-        
-    final_data = other_users_data + new_user_data
-    
-    ws.clear()
-    if final_data:
-        headers = list(final_data[0].keys())
-        ws.update([headers] + [list(d.values()) for d in final_data])
-    else:
-        ws.append_row(["User", "Date", "Mois", "Source", "Type", "Détails", "Montant Net", "Date Paiement", "Mois Paiement"])
-        
 # --- 1. CONFIGURATION ---
 st.set_page_config(page_title="SalaryFlow SaaS", page_icon="🚀", layout="wide")
 
+# Instrumentation : [perf] log = true (journal JSON, log_file = "perf.jsonl" pour un fichier) / panel = true
+PERF = st.secrets.get("perf", {})
+
+@st.cache_resource
+def configurer_journal_perf():
+    if not PERF.get("log"):
+        return
+    handler = logging.FileHandler(PERF["log_file"]) if PERF.get("log_file") else logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    perf.log.addHandler(handler)
+    perf.log.setLevel(logging.INFO)
+
+configurer_journal_perf()
+# Un run par exécution du script. Celui d'avant a pu être coupé par st.rerun / st.stop : on le clôt ici.
+if st.session_state.get('perf_run') is not None:
+    perf.fin_run(st.session_state['perf_run'], interrompu=True)
+_ctx = get_script_run_ctx()
+st.session_state['perf_run'] = perf.debut_run(session=_ctx.session_id if _ctx else None, user=st.session_state.get('user_email'))
+
 # --- 2. CSS ---
 st.markdown("""
     <style>
@@ -62,58 +69,125 @@ st.markdown("""
     .status-bad { background-color: #EF5350; }
     </style>
     """, unsafe_allow_html=True)
-# --- 3. CONNEXION DATABASE (GOOGLE SHEETS) ---
+# --- 3. CONNEXION DATABASE (GOOGLE SHEETS OU SQLITE) ---
+@st.cache_resource
+def get_planificateur():
+    # Un seul seau à jetons pour toutes les sessions : Sheets limite à ~60 requêtes/minute
+    conf = st.secrets.get("storage", {})
+    return Planificateur(debit=conf.get("quota_par_minute", 60) / 60, capacite=conf.get("quota_rafale", 10))
+
 @st.cache_resource
 def get_db_connection():
-    scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-    creds = ServiceAccountCredentials.from_json_keyfile_dict(st.secrets["gcp_service_account"], scope)
-    client = gspread.authorize(creds)
-    return client.open("SalaryFlow_DB")
+    # Choix du moteur via les secrets : [storage] backend = "sqlite" / "gsheets" (défaut)
+    conf = st.secrets.get("storage", {})
+    if conf.get("backend") == "sqlite":
+        return SQLiteStorage(conf.get("sqlite_path", "salaryflow.db"))
+    # Tous les appels à l'API passent par le planificateur partagé (quota, reprises, onglets en cache)
+    classeur = ouvrir_classeur(st.secrets["gcp_service_account"])
+    perf.suivre_http(classeur.client.session)   # requêtes et octets reçus, par rerun
+    sh = ClasseurPlanifie(classeur, get_planificateur())
+    # Sharding optionnel : [storage] sharding = "hash" (N onglets) ou "user" (un onglet par compte)
+    router = None
+    if conf.get("sharding"):
+        router = ShardRouter(sh, mode=conf["sharding"], shards=conf.get("shards", 16))
+    return GoogleSheetsStorage(sh, router)
 
-def load_user_data(user_email):
-    sh = get_db_connection()
-    
-    # --- 1. CHARGEMENT REVENUS ---
+@st.cache_resource
+def get_snapshot_cache():
+    # Onglets parsés partagés entre sessions : N connexions simultanées = 1 seul téléchargement
+    conf = st.secrets.get("storage", {})
+    return SnapshotCache(ttl=conf.get("cache_ttl", 300))
+
+@st.cache_resource
+def get_snapshot_disque():
+    # Instantanés sur disque : un redémarrage relit les onglets inchangés sans les télécharger.
+    # [storage] snapshot_dir = "" pour désactiver.
+    conf = st.secrets.get("storage", {})
+    dossier = conf.get("snapshot_dir", ".snapshots")
+    if not dossier:
+        return None
+    return SnapshotDisque(dossier, get_db_connection().revision, ttl_revision=conf.get("revision_ttl", 30))
+
+# Version des données d'un compte, toutes sessions confondues : +1 à chaque écriture acceptée.
+# Une session qui a vu toutes les versions peut appliquer ses propres écritures en local (write-through).
+TABLES = ("DATA", "CHARGES", "SOLDES")
+
+def _noter_versions(user_email):
+    cache = get_snapshot_cache()
+    st.session_state['versions'] = {t: cache.revision(cle_version(t, user_email)) for t in TABLES}
+
+def _versions_a_jour(user_email):
+    cache = get_snapshot_cache()
+    vues = st.session_state.get('versions', {})
+    return all(vues.get(t) == cache.revision(cle_version(t, user_email)) for t in TABLES)
+
+def _ecriture_session(table, user_email):
+    """Après une écriture acceptée de cette session. True : on l'applique en local.
+    False : quelqu'un d'autre a écrit entre-temps -> rechargement complet au prochain run."""
+    nouvelle = get_snapshot_cache().invalider(cle_version(table, user_email))
+    vues = st.session_state.setdefault('versions', {})
+    if vues.get(table) == nouvelle - 1:
+        vues[table] = nouvelle
+        return True
+    st.session_state.pop('data_loaded', None)
+    return False
+
+@st.cache_resource
+def get_write_queue():
+    # File d'écriture partagée par toutes les sessions : les ajouts partent en lots
+    conf = st.secrets.get("storage", {})
+
+    def apres_ecriture(table, records):
+        for user_email in {r["User"] for r in records}:
+            get_acces().invalider(table, user_email)
+
+    return WriteBehindQueue(get_db_connection(), intervalle=conf.get("flush_interval", 2.0), apres_ecriture=apres_ecriture)
+
+@st.cache_resource
+def get_acces():
+    # Lectures / écritures de l'app (module acces_donnees, partagé avec les benchmarks)
+    return AccesDonnees(get_db_connection(), get_write_queue(), get_snapshot_cache(), get_snapshot_disque())
+
+@st.cache_data(ttl=st.secrets.get("storage", {}).get("cache_ttl", 300), max_entries=8, show_spinner="Calcul sur tous les comptes...")
+def analytique_tous_comptes(mois, revisions):
+    """(situations, cohortes par type du dernier mois, cohortes par mois).
+    `revisions` ne sert que de clé : toute écriture de l'app relance le calcul, le TTL couvre le reste."""
+    with perf.span("calcul.analytique", mois=len(mois)):
+        acces = get_acces()
+        sit = analytique.situations(acces.lire_tous("DATA", ingerer_revenus), acces.lire_tous("CHARGES", ingerer_charges), mois)
+        return sit, analytique.cohortes(sit[sit["Mois"] == mois[-1]]), analytique.cohortes(sit, "Mois")
+
+def _en_parallele(user_email, taches):
+    """Lance les lectures {nom: fonction} en même temps (I/O + parsing de chacune se chevauchent).
+    Chaque lecture est mesurée dans son propre span. Retourne {nom: Future}."""
+    ctx, run = get_script_run_ctx(), perf.run_courant()
+
+    def executer(nom, fn):
+        # Les threads du pool gardent l'accès aux ressources Streamlit (cache_resource, secrets)
+        # et leurs mesures comptent dans le run en cours
+        add_script_run_ctx(threading.current_thread(), ctx)
+        perf.attacher(run)
+        with perf.span(f"chargement.{nom}", user=str(user_email)):
+            return fn()
+
+    with ThreadPoolExecutor(max_workers=len(taches)) as pool:
+        return {nom: pool.submit(executer, nom, fn) for nom, fn in taches.items()}
+
+def load_user_data(user_email, fenetre=None):
+    # DATA (fenêtre de mois), CHARGES et SOLDES sont lus en même temps
+    with perf.span("chargement", user=str(user_email)):
+        lectures = _en_parallele(user_email, get_acces().lectures(user_email, fenetre))
+
+    # --- 1. REVENUS (seulement les mois de la fenêtre) ---
     try:
-        ws_r = sh.worksheet("DATA")
-        data_r = ws_r.get_all_records()
-        df_r = pd.DataFrame(data_r)
-        
-        if not df_r.empty:
-            # Sécurité : on vérifie que la colonne User existe
-            if "User" in df_r.columns:
-                df_r = df_r[df_r["User"] == user_email]
-            
-            # --- FIX ANTI-GONFLEMENT (SÉCURITÉ ABSOLUE) ---
-            # 1. On force en texte et on vire tout sauf chiffres, points, virgules et signes
-            df_r["Montant Net"] = df_r["Montant Net"].astype(str).str.replace(r'[^\d.,+-]', '', regex=True)
-            # 2. On remplace la virgule par un point
-            df_r["Montant Net"] = df_r["Montant Net"].str.replace(',', '.', regex=False)
-            # 3. On convertit en vrai nombre
-            df_r["Montant Net"] = pd.to_numeric(df_r["Montant Net"], errors='coerce').fillna(0.0)
-            
-            # 4. Nettoyage final : on vire les lignes vides ou à zéro
-            df_r = df_r[df_r["Montant Net"] > 0]
-        else:
-            df_r = pd.DataFrame(columns=["User", "Date", "Mois", "Source", "Type", "Détails", "Montant Net", "Date Paiement", "Mois Paiement"])
+        df_r = lectures["DATA"].result()
     except Exception as e:
         st.error(f"Erreur technique Revenus: {e}")
-        df_r = pd.DataFrame(columns=["User", "Date", "Mois", "Source", "Type", "Détails", "Montant Net", "Date Paiement", "Mois Paiement"])
+        df_r = ingerer_revenus([])
 
-    # --- 2. CHARGEMENT CHARGES ---
+    # --- 2. CHARGES ---
     try:
-        ws_c = sh.worksheet("CHARGES")
-        data_c = ws_c.get_all_records()
-        df_c = pd.DataFrame(data_c)
-        
-        if not df_c.empty:
-            if "User" in df_c.columns:
-                df_c = df_c[df_c["User"] == user_email]
-            
-            # Même fix de sécurité pour les montants des charges
-            df_c["Montant"] = df_c["Montant"].astype(str).str.replace(r'[^\d.,+-]', '', regex=True)
-            df_c["Montant"] = df_c["Montant"].str.replace(',', '.', regex=False)
-            df_c["Montant"] = pd.to_numeric(df_c["Montant"], errors='coerce').fillna(0.0)
+        df_c = lectures["CHARGES"].result()
         
         if df_c.empty:
             default_charges = [
@@ -131,105 +205,44 @@ def load_user_data(user_email):
             ]
             df_c = pd.DataFrame(default_charges, columns=["Groupe", "Sous-Groupe", "Intitule", "Montant", "Jour"])
             df_c["User"] = user_email
+            df_c = ingerer_charges(df_c)
     except Exception as e:
         st.error(f"Erreur technique Charges: {e}")
-        df_c = pd.DataFrame()
+        df_c = ingerer_charges([])
 
-    return df_r, df_c
-    # --- 2. CHARGEMENT CHARGES ---
+    # --- 3. SOLDE DU COMPTE (facultatif : sans lui, chaque mois part de 0) ---
     try:
-        ws_c = sh.worksheet("CHARGES")
-        data_c = ws_c.get_all_records()
-        df_c = pd.DataFrame(data_c)
-        
-        if not df_c.empty:
-            df_c = df_c[df_c["User"] == user_email]
-
-            if "Montant" in df_c.columns:
-                df_c["Montant"] = df_c["Montant"].astype(str).str.replace(",", ".", regex=False)
-                df_c["Montant"] = pd.to_numeric(df_c["Montant"], errors='coerce').fillna(0.0)
-            
-            # Pour les charges, on évite quand même les doublons stricts (car c'est mensuel)
-            # Mais si vous voulez pouvoir mettre 2 fois "Loyer", enlevez la ligne ci-dessous :
-            df_c = df_c.drop_duplicates() 
-            df_c = df_c[df_c["Montant"] > 0]
-            
-        if df_c.empty:
-            default_charges = [
-                ("EPARGNE", "Court Terme", "Livret A", 0, 1),
-                ("FIXES", "Logement", "Loyer", 0, 5),
-                ("FIXES", "Logement", "Energie/Eau", 0, 15),
-                ("FIXES", "Logement", "Internet", 0, 10),
-                ("FIXES", "Transport", "Abonnement TBM", 0, 5),
-                ("FIXES", "Abonnements", "Spotify", 0, 10),
-                ("FIXES", "Abonnements", "Téléphone", 0, 10),
-                ("FIXES", "Banque", "Frais Bancaires", 0, 1),
-                ("VARIABLES", "Plaisir", "Restos / Sorties", 0, 20),
-                ("VARIABLES", "Beauté", "Ongles / Esthétique", 0, 15),
-                ("VARIABLES", "Animaux", "Véto / Croquettes", 0, 20),
-            ]
-            df_c = pd.DataFrame(default_charges, columns=["Groupe", "Sous-Groupe", "Intitule", "Montant", "Jour"])
-            df_c["User"] = user_email
-    except:
-        df_c = pd.DataFrame()
+        df_s = lectures["SOLDES"].result()
+    except Exception as e:
+        st.error(f"Erreur technique Solde: {e}")
+        df_s = ingerer_soldes([])
 
-    return df_r, df_c
+    return df_r, df_c, df_s
     
+@perf.mesure("sauvegarde.historique")
+def update_revenus_cloud(user_email, df_origine, df_cleaned):
+    """N'envoie au Cloud que les lignes ajoutées, modifiées ou supprimées. Retourne le tableau avec ses IDs."""
+    return get_acces().sauver("DATA", user_email, df_origine, df_cleaned)
+
+@perf.mesure("sauvegarde.revenu")
 def save_revenu_cloud(user_email, row_dict):
-    sh = get_db_connection()
-    ws = sh.worksheet("DATA")
-    
-    # 🚨 LE HACK ABSOLU : On force Google Sheets à lire ça comme du texte avec l'apostrophe '
-    montant_securise = f"'{row_dict['Montant Net']}".replace(',', '.')
-    
-    # Ordre des colonnes correspondant au Sheet
-    row = [
-        user_email, 
-        row_dict["Date"], 
-        row_dict["Mois"], 
-        row_dict["Source"], 
-        row_dict["Type"], 
-        row_dict["Détails"], 
-        montant_securise,  # <-- ON ENVOIE LA VALEUR BLOQUÉE ICI
-        row_dict["Date Paiement"], 
-        row_dict["Mois Paiement"]
-    ]
-    ws.append_row(row)
-
-def save_charges_cloud(user_email, df_charges):
-    sh = get_db_connection()
-    ws = sh.worksheet("CHARGES")
-    
-    # 1. Lire tout le sheet
-    all_data = ws.get_all_records()
-    
-    # 2. Garder tout ce qui n'est PAS à l'utilisateur actuel
-    new_data = [row for row in all_data if str(row.get('User')) != str(user_email)]
-    
-    # 3. Ajouter les nouvelles charges de l'utilisateur
-    for _, row in df_charges.iterrows():
-        r = row.to_dict()
-        r['User'] = user_email
-        
-        # 🚨 HACK APOSTROPHE (Bloque la multiplication Google Sheets)
-        val_pure = str(r.get("Montant", 0)).replace(',', '.')
-        r['Montant'] = f"'{val_pure}"
-        
-        # 🚨 SÉCURITÉ TIMELINE (Si tu oublies de mettre un jour, on met le 1er du mois)
-        try:
-            r['Jour'] = int(r.get("Jour", 1))
-        except:
-            r['Jour'] = 1
-            
-        new_data.append(r)
-        
-    # 4. Tout réécrire (Nettoyage + Mise à jour)
-    ws.clear()
-    if new_data:
-        headers = list(new_data[0].keys())
-        ws.update([headers] + [list(d.values()) for d in new_data])
-    else:
-        ws.append_row(["User", "Groupe", "Sous-Groupe", "Intitule", "Montant", "Jour"])
+    """Mise en file (retour immédiat). Retourne le ticket pour suivre l'envoi au Cloud."""
+    return get_acces().soumettre_revenu(user_email, row_dict)
+
+@perf.mesure("sauvegarde.import")
+def import_revenus_cloud(user_email, df_import):
+    """Import en masse : un seul envoi groupé (append_rows) pour tout le fichier"""
+    get_acces().importer(user_email, df_import)
+
+@perf.mesure("sauvegarde.charges")
+def save_charges_cloud(user_email, df_origine, df_charges):
+    """Seules les charges ajoutées / modifiées / supprimées sont écrites. Retourne le tableau avec ses IDs."""
+    return get_acces().sauver("CHARGES", user_email, df_origine, df_charges)
+
+@perf.mesure("sauvegarde.solde")
+def save_solde_cloud(user_email, df_origine, df_solde):
+    """Solde d'ouverture (une ligne par compte) : même écriture différentielle que les charges"""
+    return get_acces().sauver("SOLDES", user_email, df_origine, df_solde)
         
 # --- 4. LOGIN SYSTEM (Email = ID) ---
 if 'user_email' not in st.session_state:
@@ -256,52 +269,257 @@ if 'sim_val' not in st.session_state:
 if 'view_date' not in st.session_state:
     st.session_state['view_date'] = datetime.now().replace(day=1)
 
+# Fenêtre chargée par défaut autour du mois affiché (l'historique plus ancien vient à la demande)
+FENETRE_AVANT, FENETRE_APRES = 3, 12
+if 'fenetre' not in st.session_state:
+    mois_vue = st.session_state['view_date'].strftime("%Y-%m")
+    st.session_state['fenetre'] = (decaler_mois(mois_vue, -FENETRE_AVANT), decaler_mois(mois_vue, FENETRE_APRES))
+
+@perf.mesure("chargement.fenetre")
+def etendre_fenetre(debut, fin):
+    """Charge uniquement les mois manquants quand on sort de la fenêtre (None = tout est déjà là)"""
+    actuelle = st.session_state['fenetre']
+    if actuelle is None or (debut >= actuelle[0] and fin <= actuelle[1]):
+        return
+    morceaux = [st.session_state['data_revenus']]
+    if debut < actuelle[0]:
+        morceaux.append(get_acces().lire_revenus(user, (debut, decaler_mois(actuelle[0], -1))))
+    if fin > actuelle[1]:
+        morceaux.append(get_acces().lire_revenus(user, (decaler_mois(actuelle[1], 1), fin)))
+    st.session_state['data_revenus'] = categoriser(pd.concat(morceaux, ignore_index=True), "DATA")
+    st.session_state['fenetre'] = (min(debut, actuelle[0]), max(fin, actuelle[1]))
+    st.session_state['data_rev'] = nouvel_id()
+
+def charger_tout_historique():
+    if st.session_state['fenetre'] is not None:
+        st.session_state['data_revenus'] = get_acces().lire_revenus(user)
+        st.session_state['fenetre'] = None
+        st.session_state['data_rev'] = nouvel_id()
+
+def appliquer_revenus(lignes):
+    """Write-through : les revenus écrits rejoignent la session (et l'index par mois) sans relecture"""
+    fenetre = st.session_state['fenetre']
+    if fenetre is not None:
+        lignes = lignes[dans_fenetre(lignes["Mois Paiement"], fenetre)]
+    if lignes.empty:
+        return
+    df = st.session_state['data_revenus']
+    if len(lignes) == 1 and st.session_state.get('index_rev') == st.session_state['data_rev']:
+        # Saisie unitaire : mise à jour incrémentale de l'index au lieu d'une reconstruction
+        st.session_state['index_mois'].ajouter_revenu(len(df), lignes["Mois Paiement"].iloc[0], int(lignes["Montant Net"].iloc[0]))
+        st.session_state['index_rev'] = rev = nouvel_id()
+    else:
+        rev = nouvel_id()
+    st.session_state['data_revenus'] = categoriser(pd.concat([df, lignes], ignore_index=True), "DATA")
+    st.session_state['data_rev'] = rev
+
+def bandeau_fenetre(cle):
+    """Rappelle la plage de mois chargée, avec un bouton pour récupérer tout l'historique"""
+    fenetre = st.session_state['fenetre']
+    if fenetre is None:
+        return
+    col_txt, col_btn = st.columns([3, 1])
+    col_txt.caption(f"📆 Paiements chargés : de {fenetre[0]} à {fenetre[1]}.")
+    if col_btn.button("📚 Tout l'historique", key=cle):
+        with st.spinner("Chargement de l'historique..."):
+            charger_tout_historique()
+        st.rerun()
+
+# Éditeur d'historique : une page = un mois (ou une année) de paiements, filtrée côté serveur
+LIGNES_PAR_PAGE = 200
+
+def periodes_historique(df, par_annee):
+    """Mois ("YYYY-MM") ou années ("YYYY") présents dans l'historique, du plus récent au plus ancien"""
+    periodes = df["Mois Paiement"].str.slice(0, 4 if par_annee else 7).dropna()
+    return sorted(periodes[periodes != ""].unique(), reverse=True)
+
+def filtre_historique(df, periode, types=(), recherche=""):
+    """Masque des lignes de la page : période, types cochés, source contenant `recherche`"""
+    masque = df["Mois Paiement"].str.startswith(periode, na=False)
+    if types:
+        masque &= df["Type"].isin(types)
+    if recherche:
+        # Recherche sur les catégories (quelques dizaines de sources), pas sur chaque ligne
+        sources = df["Source"].cat.categories
+        masque &= df["Source"].isin(sources[sources.str.contains(recherche, case=False, regex=False)])
+    return masque
+
+def remplacer_page(df, page_avant, page_apres, index=None):
+    """La session garde tout le reste de l'historique ; seule la page éditée est remplacée.
+
+    Lignes modifiées gardées à leur place, supprimées retirées, ajoutées à la fin : l'`index` par mois
+    (s'il est fourni) suit ligne à ligne, et le grand livre n'oublie que les mois touchés.
+    """
+    page_apres = page_apres.assign(User=user)
+    df = df.reset_index(drop=True)
+    positions = pd.Series(df.index.get_indexer(page_avant.index), index=page_avant["ID"].to_numpy())
+    gardees = page_apres["ID"].isin(positions.index).to_numpy()
+    modifiees = page_apres[gardees].set_axis(positions[page_apres["ID"][gardees]].to_numpy())
+    supprimees = positions[~positions.index.isin(page_apres["ID"])].to_numpy()
+    if index is not None:
+        avant = df.iloc[modifiees.index]
+        for pos, mois, montant, ancien_mois, ancien_montant in zip(
+            modifiees.index, modifiees["Mois Paiement"], modifiees["Montant Net"], avant["Mois Paiement"], avant["Montant Net"],
+        ):
+            if (mois, montant) != (ancien_mois, ancien_montant):
+                index.modifier_revenu(pos, str(ancien_mois), int(ancien_montant), str(mois), int(montant))
+        # Du bas vers le haut : chaque suppression ne décale que les positions suivantes
+        for pos in sorted(supprimees, reverse=True):
+            index.supprimer_revenu(pos, str(df["Mois Paiement"].iat[pos]), int(df["Montant Net"].iat[pos]))
+    df = pd.concat([df.drop(index=positions.to_numpy()), modifiees]).sort_index().reset_index(drop=True)
+    ajoutees = page_apres[~gardees]
+    if index is not None:
+        for i, (mois, montant) in enumerate(zip(ajoutees["Mois Paiement"], ajoutees["Montant Net"])):
+            index.ajouter_revenu(len(df) + i, str(mois), int(montant))
+    return categoriser(pd.concat([df, ajoutees], ignore_index=True), "DATA")
+
+# Une autre session (autre appareil) a écrit sur ce compte : on resynchronise
+if 'data_loaded' in st.session_state and not _versions_a_jour(user):
+    del st.session_state['data_loaded']
+
 # LE FIX : On ne charge qu'une seule fois au démarrage
 if 'data_loaded' not in st.session_state:
     with st.spinner('Chargement initial...'):
-        # On récupère les données propres du Cloud
-        df_cloud_r, df_cloud_c = load_user_data(user)
+        # Versions notées AVANT la lecture : une écriture concurrente forcera une resynchro
+        _noter_versions(user)
+        # On récupère les données propres du Cloud (fenêtre de mois seulement)
+        df_cloud_r, df_cloud_c, df_cloud_s = load_user_data(user, st.session_state['fenetre'])
         
         # ON ÉCRASE (pas de concaténation ici !)
         st.session_state['data_revenus'] = df_cloud_r
         st.session_state['data_charges'] = df_cloud_c
+        st.session_state['data_soldes'] = df_cloud_s
         
-        # On verrouille le chargement
+        # On verrouille le chargement (+ jeton de version pour les calculs en cache)
         st.session_state['data_loaded'] = True
+        st.session_state['data_rev'] = nouvel_id()
 
 # --- 6. MOTEUR & INTELLIGENCE ---
-def calculer_net(type_c, taux, heures, paniers, charges_pct):
-    try:
-        # On remplace les virgules par des points avant conversion au cas où
-        t = float(str(taux).replace(',', '.'))
-        h = float(str(heures).replace(',', '.'))
-        p = float(str(paniers).replace(',', '.')) if paniers else 0.0
-        pct = float(str(charges_pct).replace(',', '.')) / 100.0 if charges_pct else 0.0
-        
-        if type_c == "Intérim":
-            # Calcul brut -> net intérim (IFM/CP inclus)
-            res = ((t * h * 1.21) * 0.78) + p
-        else:
-            res = ((t * h) * (1 - pct)) + p
-            
-        return round(float(res), 2) # Retourne un NOMBRE pur
-    except Exception as e:
-        return 0.0
-
-def analyser_situation(solde, score, timeline_df):
-    tension_date = None
-    if not timeline_df.empty:
-        for _, row in timeline_df.iterrows():
-            if row['Cumul'] < 0:
-                tension_date = row['Jour']
-                break
-    if score < 1 or solde < 0:
-        msg = f"Tension le {tension_date}" if tension_date else "Déficit prévu"
-        return "🔴 RISQUE DÉTECTÉ", "status-bad", msg, [f"❌ Manque : {abs(solde):.0f}€", "💪 Action : Travaillez plus", "✂️ Action : Coupez les variables"]
-    elif score < 1.5 or solde < 200:
-        return "🟠 SITUATION FRAGILE", "status-warn", f"Marge faible ({solde:.0f}€)", ["⚠️ Attention aux imprévus", "🎯 Zéro écart ce mois-ci"]
-    else:
-        return "🟢 SITUATION STABLE", "status-ok", f"Marge : {solde:.0f}€", ["✅ Tout est vert", f"💰 Epargnez {solde*0.5:.0f}€"]
+def ouverture_compte():
+    """(mois, solde en centimes) saisi par l'utilisateur, ou None"""
+    return derniere_ouverture(st.session_state['data_soldes'])
+
+def couvrir_grand_livre(*mois):
+    """Les soldes se calculent de proche en proche depuis le mois d'ouverture : ces mois-là doivent être chargés"""
+    ouverture = ouverture_compte()
+    if ouverture is not None:
+        etendre_fenetre(min(ouverture[0], *mois), max(ouverture[0], *mois))
+
+def index_mensuel():
+    """Index par mois de la session (et grand livre), reconstruit uniquement si data_rev a changé"""
+    if st.session_state.get('index_rev') != st.session_state['data_rev']:
+        st.session_state['index_mois'] = IndexMensuel(st.session_state['data_revenus'], st.session_state['data_charges'])
+        st.session_state['index_mois'].ouvrir(*(ouverture_compte() or (None, 0)))
+        st.session_state['index_rev'] = st.session_state['data_rev']
+    return st.session_state['index_mois']
+
+def solde_debut(index, mois):
+    """Solde au 1er du mois en euros (0 sans solde d'ouverture)"""
+    return index.solde_ouverture(mois) / 100
+
+@st.cache_data(show_spinner="Lecture du fichier...", max_entries=4)
+def lire_import(contenu, nom, user_email):
+    """Parse le fichier importé une seule fois (les reruns de l'aperçu réutilisent le résultat)"""
+    return importer(contenu, nom, user_email)
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def projection_utilisateur(user_email, data_rev, debut, n_mois, solde_initial, _df_r, _df_c):
+    """Projection mise en cache par utilisateur et par version des données (les DataFrames ne sont pas hachés)"""
+    return projeter(_df_r, _df_c, debut, n_mois, solde_initial)
+
+# Fragments nommés : une interaction ne rejoue que les fragments qui lisent ce qu'elle change
+# (st.rerun([...]) depuis le callback du widget) ; CSS, login, barre latérale et le reste de la page ne bougent pas.
+DEPENDANCES = {
+    "mois": ["entete", "bilan", "timeline", "outils"],
+    "simulation": ["simulation", "bilan", "timeline"],
+    "donnees": ["historique"],   # en plus, quand la navigation a chargé des mois
+}
+
+def rerun_fragment():
+    """True pendant un rerun limité à des fragments (le haut du script n'a pas été exécuté)"""
+    ctx = get_script_run_ctx()
+    return bool(ctx and ctx.fragment_ids_this_run)
+
+def fragment(cle):
+    """st.fragment nommé `cle` (cible de st.rerun). Rejoué seul, il compte comme un run perf à part."""
+    def decorateur(fn):
+        @functools.wraps(fn)
+        def enveloppe():
+            if not rerun_fragment():
+                return fn()   # run complet : mesuré avec le script
+            run = perf.debut_run(session=get_script_run_ctx().session_id, user=st.session_state.get('user_email'), fragment=cle)
+            try:
+                fn()
+            except BaseException:
+                perf.fin_run(run, interrompu=True)   # st.rerun / st.stop
+                raise
+            perf.fin_run(run, interrompu=False)
+        return st.fragment(enveloppe, key=cle)
+    return decorateur
+
+def preparer_mois(mois):
+    """Mois hors de la fenêtre chargée : on va chercher les mois manquants (et eux seuls),
+    ainsi que ceux qui le séparent du solde d'ouverture"""
+    fenetre = st.session_state['fenetre']
+    if fenetre is not None and not (fenetre[0] <= mois <= fenetre[1]):
+        etendre_fenetre(decaler_mois(mois, -FENETRE_AVANT), decaler_mois(mois, FENETRE_APRES))
+    couvrir_grand_livre(mois, datetime.now().strftime("%Y-%m"))
+
+def calculs_du_mois():
+    """KPIs, timeline et analyse du coach du mois affiché : calculés une fois par (données, mois, simulation),
+    quel que soit le nombre de fragments qui les affichent"""
+    mois = st.session_state['view_date'].strftime("%Y-%m")
+    index = index_mensuel()
+    cle = (st.session_state['data_rev'], mois, st.session_state['sim_val'])
+    memo = st.session_state.get('calculs_mois')
+    if memo is not None and memo[0] == cle:
+        return memo[1]
+    debut = solde_debut(index, mois)
+    with perf.span("calcul.kpis"):
+        k = index.kpis(mois, st.session_state['sim_val'])
+    with perf.span("calcul.timeline"):
+        df_tl = build_timeline(st.session_state['data_revenus'], st.session_state['data_charges'], mois,
+                               st.session_state['sim_val'], index=index, solde_initial=debut)
+    with perf.span("calcul.coach"):
+        coach = analyser_situation(k["solde"], k["score"], df_tl)
+    calculs = {"mois": mois, "index": index, "debut": debut, "kpis": k, "timeline": df_tl, "coach": coach}
+    st.session_state['calculs_mois'] = (cle, calculs)
+    return calculs
+
+def changer_simulation():
+    st.session_state['sim_val'] = float(st.session_state['sim_saisie'])
+    st.rerun(DEPENDANCES["simulation"])
+
+def retirer_simulation():
+    st.session_state['sim_val'] = st.session_state['sim_saisie'] = 0.0
+    st.rerun(DEPENDANCES["simulation"])
+
+@fragment("simulation")
+def simulation():
+    # Clé du widget réinitialisée depuis sim_val (elle disparaît quand on quitte le tableau de bord)
+    if 'sim_saisie' not in st.session_state:
+        st.session_state['sim_saisie'] = float(st.session_state['sim_val'])
+    st.number_input("Simuler entrée (€)", step=50.0, key="sim_saisie", on_change=changer_simulation)
+    if st.session_state['sim_val'] > 0:
+        st.warning(f"⚠️ **Une simulation est active : {st.session_state['sim_val']} €**")
+        st.caption("Ce montant s'ajoute à vos calculs mais n'est pas enregistré.")
+        st.button("🗑️ Supprimer la simulation", type="primary", on_click=retirer_simulation)
+
+def admin_deverrouille():
+    """L'email seul ne prouve rien (connexion sans mot de passe) : l'analytique demande [admin] password"""
+    if st.session_state.get('admin_ok'):
+        return True
+    attendu = str(st.secrets.get("admin", {}).get("password", ""))
+    if not attendu:
+        st.error("Analytique désactivée : définissez [admin] password dans les secrets.")
+        return False
+    saisi = st.text_input("🔑 Mot de passe administrateur", type="password", key="admin_mdp")
+    if st.button("Déverrouiller"):
+        if hmac.compare_digest(saisi.encode(), attendu.encode()):
+            st.session_state['admin_ok'] = True
+            st.rerun()
+        st.error("Mot de passe incorrect")
+    return False
 
 # --- 7. NAVIGATION ---
 with st.sidebar:
@@ -313,167 +531,62 @@ with st.sidebar:
         st.rerun()
         
     st.markdown("---")
-    menu = st.radio("Menu", ["🔮 Tableau de Bord", "➕ Ajouter un revenu", "💳 Charges & Budgets"])
+    pages = ["🔮 Tableau de Bord", "➕ Ajouter un revenu", "💳 Charges & Budgets"]
+    # Vue tous comptes proposée aux emails de [admin] emails = [...], ouverte par [admin] password
+    if user in [e.strip().lower() for e in st.secrets.get("admin", {}).get("emails", [])]:
+        pages.append("📊 Analytique (admin)")
+    menu = st.radio("Menu", pages)
+    st.session_state['perf_run'].attributs["page"] = menu
     
-    st.markdown("---")
-    val_sim = st.number_input("Simuler entrée (€)", value=float(st.session_state['sim_val']), step=50.0)
-    if val_sim != st.session_state['sim_val']:
-        st.session_state['sim_val'] = val_sim
-        st.rerun()
+    # Suivi des sauvegardes envoyées en arrière-plan
+    if st.session_state.get('tickets'):
+        statuts = [get_write_queue().statut(t) for t in st.session_state['tickets']]
+        if ECHEC in statuts:
+            st.error("❌ Une sauvegarde n'a pas pu être envoyée au Cloud.")
+            # La ligne affichée en local (write-through) n'existe pas côté Cloud : une resynchro par échec
+            deja = st.session_state.setdefault('echecs_vus', set())
+            nouveaux = {t for t, s in zip(st.session_state['tickets'], statuts) if s == ECHEC} - deja
+            if nouveaux:
+                deja.update(nouveaux)
+                st.session_state.pop('data_loaded', None)
+        elif EN_ATTENTE in statuts:
+            st.caption(f"⏳ {statuts.count(EN_ATTENTE)} sauvegarde(s) en cours d'envoi")
+        else:
+            st.caption("☁️ Tout est synchronisé")
+            st.session_state['tickets'] = []
+    
+    # La simulation ne sert qu'au tableau de bord (et ne rejoue que ses fragments)
+    if menu == "🔮 Tableau de Bord":
+        st.markdown("---")
+        simulation()
 
 # --- PAGE 1 : DASHBOARD ---
-if menu == "🔮 Tableau de Bord":
+def changer_mois(n):
+    """◀ / ▶ : seuls les fragments qui dépendent du mois sont rejoués (et l'historique si des mois ont été chargés)"""
+    vue = st.session_state['view_date']
+    st.session_state['view_date'] = (vue - timedelta(days=1) if n < 0 else vue + timedelta(days=32)).replace(day=1)
+    rev = st.session_state['data_rev']
+    preparer_mois(st.session_state['view_date'].strftime("%Y-%m"))
+    st.rerun(DEPENDANCES["mois"] + (DEPENDANCES["donnees"] if st.session_state['data_rev'] != rev else []))
+
+@fragment("entete")
+def entete():
     c1, c2, c3 = st.columns([1, 6, 1])
-    if c1.button("◀"):
-        st.session_state['view_date'] = (st.session_state['view_date'] - timedelta(days=1)).replace(day=1)
-        st.rerun()
-    
-    mois_str = st.session_state['view_date'].strftime("%Y-%m")
+    c1.button("◀", on_click=changer_mois, args=(-1,))
     c2.markdown(f"<h2 style='text-align: center; margin:0;'>{st.session_state['view_date'].strftime('%B %Y').capitalize()}</h2>", unsafe_allow_html=True)
-    
-    if c3.button("▶"):
-        st.session_state['view_date'] = (st.session_state['view_date'] + timedelta(days=32)).replace(day=1)
-        st.rerun()
-
-    df_r, df_c = st.session_state['data_revenus'], st.session_state['data_charges']
-    
-    # ... (Tu es dans la section PAGE 1 : DASHBOARD, juste après les boutons Précédent/Suivant) ...
-
-    # =================================================================
-    # 🧠 MOTEUR DE CALCUL CENTRAL (KPIs + TIMELINE)
-    # =================================================================
-    
-    # 1. Récupération des données LIVE
-    df_r_live = st.session_state['data_revenus']
-    df_c_live = st.session_state['data_charges']
-    
-    # 2. Préparation des variables par défaut (pour éviter les crashs si vide)
-    mois_actuel_str = st.session_state['view_date'].strftime("%Y-%m")
-    revenus_du_mois = pd.DataFrame() # Vide par défaut
-    in_month = 0.0
-    
-    # 3. Calcul des REVENUS du mois
-    if not df_r_live.empty:
-        # On s'assure que la colonne existe
-        if "Mois Paiement" in df_r_live.columns:
-            revenus_du_mois = df_r_live[df_r_live["Mois Paiement"] == mois_actuel_str]
-            
-            # Calcul du total des entrées (sécurisé)
-            # On convertit en nombre au cas où ce serait du texte
-            revenus_du_mois["Montant Net"] = pd.to_numeric(revenus_du_mois["Montant Net"], errors='coerce').fillna(0.0)
-            in_month = revenus_du_mois["Montant Net"].sum()
-
-    # 4. Total Entrées (Revenus réels + Simulation)
-    entree_totale = in_month + st.session_state['sim_val']
-    
-    # 5. Calcul des CHARGES (Fixes / Var / Epargne)
-    # On convertit tout en numérique d'un coup pour éviter les bugs
-    if not df_c_live.empty and "Montant" in df_c_live.columns:
-        df_c_live["Montant"] = pd.to_numeric(df_c_live["Montant"], errors='coerce').fillna(0.0)
-        
-        fixes = df_c_live[df_c_live["Groupe"]=="FIXES"]["Montant"].sum()
-        epargne = df_c_live[df_c_live["Groupe"]=="EPARGNE"]["Montant"].sum()
-        variables = df_c_live[df_c_live["Groupe"]=="VARIABLES"]["Montant"].sum()
-    else:
-        fixes, epargne, variables = 0.0, 0.0, 0.0
-
-    total_sorties = fixes + epargne + variables
-    
-    # 6. Résultats Finaux
-    solde = entree_totale - total_sorties
-    score = (entree_totale / fixes) if fixes > 0 else 0
-
-    # =================================================================
-    # 🗓️ CONSTRUCTION DE LA TIMELINE
-    # =================================================================
-    tl_data = []
-    # 1. AJOUT DES CHARGES
-    if not df_c_live.empty:
-        for _, r in df_c_live.iterrows():
-            # On ne prend que les charges qui ont un montant
-            m = pd.to_numeric(str(r.get('Montant', 0)).replace(',', '.'), errors='coerce')
-            if m and m > 0: 
-                try: j = int(r['Jour'])
-                except: j = 1
-                tl_data.append({"Jour": j, "Nom": r['Intitule'], "Type": "Charge", "Montant": -float(m)})
-            
-    # 2. AJOUT DES REVENUS (DÉJÀ FILTRÉS PAR MOIS PLUS HAUT)
-    if not revenus_du_mois.empty:
-        for _, r in revenus_du_mois.iterrows():
-            try:
-                # On récupère la date brute pour extraire le VRAI jour
-                date_s = str(r["Date Paiement"]).strip()
-                if "-" in date_s: # Format YYYY-MM-DD
-                    d = int(date_s.split("-")[2][:2])
-                elif "/" in date_s: # Format DD/MM/YYYY
-                    d = int(date_s.split("/")[0])
-                else:
-                    d = pd.to_datetime(date_s).day
-            except:
-                d = 1
-            
-            tl_data.append({
-                "Jour": d, 
-                "Nom": r["Source"], 
-                "Type": r["Type"], 
-                "Montant": float(r["Montant Net"])
-            })
-            
-    # 3. CRÉATION DU DATAFRAME FINAL
-    df_tl = pd.DataFrame(tl_data)
+    c3.button("▶", on_click=changer_mois, args=(1,))
 
-    if not df_tl.empty:
-        # On trie par jour pour que le graphique soit dans le bon sens
-        df_tl = df_tl.sort_values("Jour")
-        # On calcule le cumulé pour la courbe
-        df_tl["Cumul"] = df_tl["Montant"].cumsum()
+@fragment("bilan")
+def bilan():
+    """Bandeau du coach, stabilité et KPIs (mois + simulation)"""
+    calculs = calculs_du_mois()
+    k, debut_mois = calculs["kpis"], calculs["debut"]
+    entree_totale, total_sorties = k["entree_totale"], k["total_sorties"]
+    fixes, solde, score = k["fixes"], k["solde"], k["score"]
+    etat, css, desc, conseils = calculs["coach"]
 
-    # A. Ajout des CHARGES
-    for _, r in df_c_live.iterrows():
-        try:
-            if r['Montant'] > 0: 
-                tl_data.append({
-                    "Jour": int(r['Jour']), 
-                    "Nom": r['Intitule'], 
-                    "Type": "Charge", 
-                    "Montant": -float(r['Montant'])
-                })
-        except: pass
-
-    # B. Ajout des REVENUS (ceux filtrés plus haut)
-    if not revenus_du_mois.empty:
-        for _, r in revenus_du_mois.iterrows():
-            try:
-                # On essaie de lire la date proprement
-                d_obj = pd.to_datetime(r["Date Paiement"], dayfirst=True, errors='coerce')
-                montant = float(r["Montant Net"])
-                
-                if pd.notnull(d_obj) and montant > 0:
-                    tl_data.append({
-                        "Jour": d_obj.day, 
-                        "Nom": r["Source"], 
-                        "Type": "Revenu", 
-                        "Montant": montant
-                    })
-            except: pass
-
-    # C. Ajout de la SIMULATION
-    if st.session_state['sim_val'] > 0: 
-        tl_data.append({"Jour": 15, "Nom": "Simulation", "Type": "Sim", "Montant": st.session_state['sim_val']})
-
-    # D. Finalisation du Tableau Timeline
-    df_tl = pd.DataFrame(tl_data)
-    if not df_tl.empty:
-        df_tl = df_tl.sort_values("Jour")
-        df_tl["Cumul"] = df_tl["Montant"].cumsum()
-    # =================================================================
-    # 🧠 ANALYSE DU COACH
-    # =================================================================
-    etat, css, desc, conseils = analyser_situation(solde, score, df_tl)
-
-    # --- AFFICHAGE (Rien à changer en dessous) ---
     st.markdown(f"""<div class="status-banner {css}"> {etat} <br> <span style="font-size:0.9rem;">{desc}</span></div>""", unsafe_allow_html=True)
-    
+
     col_g, col_k = st.columns([1, 2])
     with col_g:
         st.markdown("### Stabilité")
@@ -486,88 +599,232 @@ if menu == "🔮 Tableau de Bord":
         k1.metric("Entrées", f"{entree_totale:,.0f} €")
         k2.metric("Sorties", f"{total_sorties:,.0f} €")
         k3.metric("Solde", f"{solde:,.0f} €")
+        if calculs["index"].ouverture is not None:
+            st.caption(f"🏦 Compte au 1er du mois : {debut_mois:,.0f} € · en fin de mois : {debut_mois + solde:,.0f} €")
         st.markdown("### 🧠 Coach")
         for c in conseils: st.markdown(f"<div class='coach-text'>{c}</div>", unsafe_allow_html=True)
 
-  # --- AFFICHAGE TIMELINE FORMATÉ ---
+@fragment("timeline")
+def timeline():
+    """Timeline de trésorerie du mois (mois + simulation)"""
+    df_tl = calculs_du_mois()["timeline"]
     st.markdown("### 🗓️ Timeline de Trésorerie")
     if not df_tl.empty:
         # On définit le style et le formatage
-        st.dataframe(
-            df_tl[["Jour", "Nom", "Type", "Montant", "Cumul"]].style.map(
-                lambda x: 'color:#EF5350;font-weight:bold' if x < 0 else 'color:#00E676;font-weight:bold', 
-                subset=['Cumul', 'Montant']
-            ).format({
-                "Montant": "{:.2f} €", # Affiche 145.57 €
-                "Cumul": "{:.2f} €"
-            }, decimal='.'), # <--- FORCE LE POINT ICI
-            use_container_width=True, 
-            hide_index=True
-        )
-    else: 
+        with perf.span("rendu.timeline"):
+            st.dataframe(
+                df_tl[["Jour", "Nom", "Type", "Montant", "Cumul"]].style.map(
+                    lambda x: 'color:#EF5350;font-weight:bold' if x < 0 else 'color:#00E676;font-weight:bold',
+                    subset=['Cumul', 'Montant']
+                ).format({
+                    "Montant": "{:.2f} €", # Affiche 145.57 €
+                    "Cumul": "{:.2f} €"
+                }, decimal='.'), # <--- FORCE LE POINT ICI
+                use_container_width=True,
+                hide_index=True
+            )
+    else:
         st.info("Aucune opération prévue sur ce mois.")
 
-# ... (Le code de ta Timeline existante est juste au dessus) ...
+@fragment("outils")
+def outils():
+    """Projection, scénarios et export : leurs propres widgets ne rejouent que ce fragment"""
+    calculs = calculs_du_mois()
+    mois_actuel_str, index, debut_mois = calculs["mois"], calculs["index"], calculs["debut"]
+    df_r_live, df_c_live = st.session_state['data_revenus'], st.session_state['data_charges']
 
-   # --- NOUVELLE SECTION : GESTIONNAIRE D'HISTORIQUE ---
-    st.markdown("---")
-    st.subheader("🛠 Gestion & Corrections")
-    
+    # --- PROJECTION MULTI-MOIS (calculée une fois par version des données) ---
+    with st.expander("📅 Projection sur l'année"):
+        horizon = st.radio("Horizon", [12, 24], horizontal=True, format_func=lambda n: f"{n} mois")
+        rev = st.session_state['data_rev']
+        etendre_fenetre(datetime.now().strftime("%Y-%m"), decaler_mois(datetime.now().strftime("%Y-%m"), horizon - 1))
+        if st.session_state['data_rev'] != rev and rerun_fragment():
+            st.rerun()   # mois chargés pendant un rerun du fragment : le reste de la page doit les voir
+        with perf.span("calcul.projection"):
+            _, resume = projection_utilisateur(
+                user, st.session_state['data_rev'], datetime.now().strftime("%Y-%m"), horizon,
+                solde_debut(index, datetime.now().strftime("%Y-%m")) if index.ouverture is not None else None,
+                st.session_state['data_revenus'], st.session_state['data_charges'],
+            )
+        with perf.span("rendu.projection"):
+            st.dataframe(
+                resume.style.map(
+                    lambda x: 'color:#EF5350;font-weight:bold' if x < 0 else 'color:#00E676;font-weight:bold',
+                    subset=[c for c in ("Solde", "Clôture") if c in resume.columns]
+                ).format({
+                    "Entrées": "{:.2f} €",
+                    "Sorties": "{:.2f} €",
+                    "Solde": "{:.2f} €",
+                    "Tension": lambda j: "—" if pd.isna(j) else f"le {j:.0f}",
+                    **({"Clôture": "{:.2f} €"} if "Clôture" in resume.columns else {}),
+                }, decimal='.'),
+                use_container_width=True
+            )
+
+    # --- SCÉNARIOS « ET SI » : toute une grille évaluée d'un coup (un seul run par comparaison) ---
+    with st.expander("🧪 Comparer des scénarios"):
+        with st.form("scenarios"):
+            s1, s2 = st.columns(2)
+            sc_min, sc_max = s1.slider("Revenu en plus (€)", 0, 5000, (0, 1000), step=50)
+            sc_pas = s2.select_slider("Pas (€)", [50, 100, 250, 500], value=250)
+            sc_j1, sc_j2 = s1.slider("Versé le", 1, 31, (1, 31))
+            sc_coupes = s2.multiselect("Baisse des variables (%)", [0, 10, 25, 50, 100], default=[0, 25])
+            sc_epargne = st.checkbox("Comparer avec un mois sans épargne")
+            st.form_submit_button("🧪 Comparer")
+
+        with perf.span("calcul.scenarios"):
+            df_sc = scenarios(
+                df_r_live, df_c_live, mois_actuel_str,
+                montants=range(sc_min, sc_max + 1, sc_pas), jours=range(sc_j1, sc_j2 + 1),
+                coupes_variables=sc_coupes or [0], sans_epargne=[False, True] if sc_epargne else [False],
+                index=index, solde_initial=debut_mois,
+            )
+        df_sc["Variante"] = ("Variables -" + df_sc["Coupe variables"].map("{:.0f}".format) + " %"
+                             + df_sc["Sans épargne"].map({True: " · sans épargne", False: ""}))
+
+        with perf.span("rendu.scenarios"):
+            # Le montant fixe le solde, la date le point bas du mois : une carte par variante
+            st.caption(f"{len(df_sc)} scénarios · couleur = point bas de la trésorerie dans le mois")
+            carte = alt.Chart(df_sc).mark_rect().encode(
+                x=alt.X("Jour:O", title="Versé le"),
+                y=alt.Y("Montant:O", title="Revenu en plus (€)", sort="descending"),
+                color=alt.Color("Point bas:Q", scale=alt.Scale(scheme="redyellowgreen", domainMid=0)),
+                tooltip=["Montant", "Jour", "Variante", "Solde", alt.Tooltip("Score:Q", format=".2f"), "Tension", "Point bas", "Etat"],
+            ).properties(height=220).facet(row=alt.Row("Variante:N", title=None))
+            st.altair_chart(carte, use_container_width=True)
+            # Solde, score et état ne dépendent pas de la date : une ligne par (montant, variante)
+            synthese = df_sc.drop_duplicates(["Montant", "Variante"])[["Montant", "Variante", "Entrées", "Sorties", "Solde", "Score", "Etat"]]
+            st.dataframe(synthese.round(2), use_container_width=True, hide_index=True)
+
+    # --- EXPORT (fichier généré au clic, écrit en flux) ---
+    with st.expander("📤 Exporter mes données"):
+        mois_donnees = sorted(m for m in index.positions if len(m) == 7)
+        debut_liste = min(mois_donnees[:1] + [mois_actuel_str])
+        # Jusqu'à 24 mois devant, et au moins jusqu'au mois affiché (on peut naviguer plus loin)
+        fin_liste = max(pd.Period(datetime.now(), freq="M") + 24, pd.Period(mois_actuel_str, freq="M"))
+        periodes = pd.period_range(debut_liste, fin_liste, freq="M").strftime("%Y-%m").tolist()
+        tl_debut, tl_fin = st.select_slider("Période de la timeline", options=periodes, value=(mois_actuel_str, mois_actuel_str))
+        fmt = st.radio("Format", ["Excel (.xlsx)", "CSV"], horizontal=True)
+        fenetre, ouverture = st.session_state['fenetre'], ouverture_compte()
+        df_r_session, df_c_exp = st.session_state['data_revenus'], st.session_state['data_charges']
+
+        def revenus_complets():
+            # La session ne garde qu'une fenêtre de mois : au clic, l'export relit tout l'historique
+            return df_r_session if fenetre is None else get_acces().lire_revenus(user)
+
+        def blocs(nom, df_r):
+            if nom == "historique": return export.COLONNES_HISTORIQUE, export.blocs_historique(df_r)
+            if nom == "charges": return export.COLONNES_CHARGES, export.blocs_charges(df_c_exp)
+            # Cumul depuis le solde réel : le grand livre est recalculé sur tout l'historique
+            return export.COLONNES_TIMELINE_EXPORT, export.blocs_timeline(df_r, df_c_exp, tl_debut, tl_fin, ouverture=ouverture)
+
+        def fichier_csv(nom):
+            return export.vers_csv(*blocs(nom, None if nom == "charges" else revenus_complets()))
+
+        def fichier_xlsx():
+            df_r = revenus_complets()
+            return export.vers_xlsx({"Historique": blocs("historique", df_r), "Charges": blocs("charges", df_r), "Timeline": blocs("timeline", df_r)})
+
+        if fmt == "CSV":
+            e1, e2, e3 = st.columns(3)
+            for col, nom in zip((e1, e2, e3), ("historique", "charges", "timeline")):
+                col.download_button(
+                    f"⬇️ {nom.capitalize()}", data=lambda nom=nom: fichier_csv(nom),
+                    file_name=f"salaryflow_{nom}.csv", mime="text/csv", on_click="ignore",
+                )
+        else:
+            st.download_button(
+                "⬇️ Télécharger le classeur", data=fichier_xlsx,
+                file_name="salaryflow.xlsx", on_click="ignore",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            )
+
+@fragment("historique")
+def historique():
+    """Éditeur d'historique : filtres, pages et saisies ne rejouent que ce fragment"""
+    mois_actuel_str = st.session_state['view_date'].strftime("%Y-%m")
     with st.expander("📝 Modifier, Supprimer ou Nettoyer", expanded=True):
-        
-        # --- 1. GESTION DE LA SIMULATION (INTEGRÉE ICI) ---
-        if st.session_state['sim_val'] > 0:
-            st.warning(f"⚠️ **Une simulation est active : {st.session_state['sim_val']} €**")
-            col_sim_txt, col_sim_btn = st.columns([3, 1])
-            col_sim_txt.info("Ce montant s'ajoute à vos calculs mais n'est pas enregistré.")
-            if col_sim_btn.button("🗑️ Supprimer la simulation", type="primary"):
-                st.session_state['sim_val'] = 0.0
-                st.rerun()
-            st.markdown("---") # Séparateur visuel
-        # --------------------------------------------------
 
         st.info("Cochez les lignes du tableau ci-dessous pour les supprimer définitivement.")
-        
-        # SÉCURISATION DES DONNÉES AVANT AFFICHAGE
-        df_to_edit = st.session_state['data_revenus'].copy()
-        
-        if not df_to_edit.empty:
-            # Conversion forcée en DATE et NOMBRE pour éviter les bugs
-            df_to_edit["Date Paiement"] = pd.to_datetime(df_to_edit["Date Paiement"], dayfirst=True, errors='coerce')
-            
-            if df_to_edit["Montant Net"].dtype == object:
-                df_to_edit["Montant Net"] = df_to_edit["Montant Net"].astype(str).str.replace(",", ".", regex=False)
-                df_to_edit["Montant Net"] = pd.to_numeric(df_to_edit["Montant Net"], errors='coerce')
+        bandeau_fenetre("fenetre_historique")
 
-        # TABLEAU ÉDITABLE
-        edited_history = st.data_editor(
-            df_to_edit,
-            num_rows="dynamic",
-            use_container_width=True,
-            key="history_editor",
-            column_config={
-                "User": None, 
-                "Montant Net": st.column_config.NumberColumn("Net (€)", format="%.2f €", step=0.01),
-                "Date Paiement": st.column_config.DateColumn("Date Paiement", format="DD/MM/YYYY"),
-                "Source": st.column_config.TextColumn("Source (Client)"),
-            },
-            hide_index=True
+        # PAGE AFFICHÉE : une période de paiement + filtres (seule cette page part vers le navigateur)
+        df_hist = st.session_state['data_revenus']
+        f1, f2, f3, f4 = st.columns([1, 1, 2, 2])
+        par_annee = f1.radio("Page", ["Mois", "Année"], horizontal=True, key="hist_par") == "Année"
+        periodes = periodes_historique(df_hist, par_annee)
+        courante = mois_actuel_str[:4] if par_annee else mois_actuel_str
+        periode = f2.selectbox(
+            "Période", periodes, key=f"hist_periode_{par_annee}",
+            index=periodes.index(courante) if courante in periodes else 0,
         )
+        types_filtre = f3.multiselect("Type", TYPES_REVENUS, key="hist_types")
+        recherche = f4.text_input("🔎 Source", key="hist_recherche").strip()
+
+        with perf.span("rendu.historique"):
+            page_avant = df_hist[filtre_historique(df_hist, periode or "", types_filtre, recherche)] if periodes else df_hist.iloc[:0]
+            n_pages = max(1, -(-len(page_avant) // LIGNES_PAR_PAGE))
+            if n_pages > 1:
+                num_page = st.number_input(f"Page (sur {n_pages})", 1, n_pages, 1)
+                page_avant = page_avant.iloc[(num_page - 1) * LIGNES_PAR_PAGE:num_page * LIGNES_PAR_PAGE]
+            else:
+                num_page = 1
+            st.caption(f"{len(page_avant)} ligne(s) affichée(s) sur {len(df_hist)} chargée(s).")
+
+            # Les données sont déjà typées : on passe juste les montants en euros pour l'affichage
+            df_to_edit = pour_editeur(page_avant.reset_index(drop=True), "DATA")
+
+            # TABLEAU ÉDITABLE (une clé par page : les saisies d'une page ne débordent pas sur l'autre)
+            edited_history = st.data_editor(
+                df_to_edit,
+                num_rows="dynamic",
+                use_container_width=True,
+                key=f"history_editor_{periode}_{','.join(types_filtre)}_{recherche}_{num_page}_{st.session_state['data_rev']}",
+                column_config={
+                    "User": None, 
+                    "ID": None,
+                    "Montant Net": st.column_config.NumberColumn("Net (€)", format="%.2f €", step=0.01),
+                    "Date": st.column_config.DateColumn("Date", format="DD/MM/YYYY"),
+                    "Date Paiement": st.column_config.DateColumn("Date Paiement", format="DD/MM/YYYY"),
+                    "Source": st.column_config.TextColumn("Source (Client)"),
+                },
+                hide_index=True
+            )
 
         col_save, col_info = st.columns([1, 3])
-        
+    
         if col_save.button("💾 Valider les corrections", type="primary"):
             try:
-                # Mise à jour Session
-                st.session_state['data_revenus'] = edited_history
-                # Mise à jour Cloud
-                update_revenus_cloud(user, edited_history)
-                
+                # Mise à jour Cloud (uniquement les lignes touchées, et seulement dans la page)
+                edited_history = update_revenus_cloud(user, page_avant, ingerer_revenus(edited_history, filtrer=False))
+                # Mise à jour Session (write-through, sauf si une autre session a écrit entre-temps)
+                if _ecriture_session("DATA", user):
+                    # Index à jour : on le fait suivre (sans reconstruction ni perte du grand livre)
+                    index = st.session_state['index_mois'] if st.session_state.get('index_rev') == st.session_state['data_rev'] else None
+                    st.session_state['data_revenus'] = remplacer_page(st.session_state['data_revenus'], page_avant, edited_history, index)
+                    st.session_state['data_rev'] = rev = nouvel_id()
+                    if index is not None:
+                        st.session_state['index_rev'] = rev
+            
                 st.success("✅ Données mises à jour !")
                 st.rerun()
             except Exception as e:
                 st.error(f"Erreur de sauvegarde : {e}")
 
+if menu == "🔮 Tableau de Bord":
+    # Premier affichage (ou retour sur la page) : mois manquants et grand livre chargés avant les fragments
+    with st.spinner("Chargement de l'historique..."):
+        preparer_mois(st.session_state['view_date'].strftime("%Y-%m"))
+    entete()
+    bilan()
+    timeline()
+    outils()
+
+    # --- NOUVELLE SECTION : GESTIONNAIRE D'HISTORIQUE ---
+    st.markdown("---")
+    st.subheader("🛠 Gestion & Corrections")
+    historique()
+
 # --- PAGE 2 : AJOUT ---
 elif menu == "➕ Ajouter un revenu":
     st.header("Nouvelle Rentrée")
@@ -582,7 +839,7 @@ elif menu == "➕ Ajouter un revenu":
 
     c1, c2 = st.columns(2)
     source = c1.text_input("Source")
-    typ = c2.selectbox("Type", ["Intérim", "Micro-Entreprise", "Salaire", "Chomâge", "APL", "Prime d'activité", "Remboursements", "Autre"])
+    typ = c2.selectbox("Type", TYPES_REVENUS)
     
     label_date = "Date de la mission" if typ in ["Intérim", "Micro-Entreprise"] else "Date de versement"
     date_mission = st.date_input(label_date, datetime.now())
@@ -598,10 +855,9 @@ elif menu == "➕ Ajouter un revenu":
         heures = nettoyer_chiffre(cc2.text_input("Heures", "0.00"))
         paniers = nettoyer_chiffre(cc3.text_input("Paniers (€)", "0.00"))
         
-        montant_final = calculer_net("Intérim", taux, heures, paniers, 0)
+        montant_final = calculer_net("Intérim", taux, heures, paniers)
         st.write(f"**Net : {montant_final:.2f} €**")
-        if date_mission.month == 12: d_pay = datetime(date_mission.year + 1, 1, 12)
-        else: d_pay = datetime(date_mission.year, date_mission.month + 1, 12)
+        d_pay = date_paiement("Intérim", date_mission)
         st.caption(f"Paiement auto : {d_pay.strftime('%d/%m/%Y')}")
         
     elif typ == "Micro-Entreprise":
@@ -611,8 +867,8 @@ elif menu == "➕ Ajouter un revenu":
         paniers = nettoyer_chiffre(cc3.text_input("Frais (€)", "0.00"))
         charges = nettoyer_chiffre(cc4.text_input("% Charges", "21.20"))
         
-        d_pay = st.date_input("Date Paiement", value=date_mission + timedelta(days=30))
-        montant_final = calculer_net("Autre", taux, heures, paniers, charges)
+        d_pay = st.date_input("Date Paiement", value=date_paiement("Micro-Entreprise", date_mission).date())
+        montant_final = calculer_net("Micro-Entreprise", taux, heures, paniers, charges)
         st.write(f"**Net : {montant_final:.2f} €**")
         
     else:
@@ -623,66 +879,184 @@ elif menu == "➕ Ajouter un revenu":
         montant_final_str = str(round(montant_final, 2)).replace('.', ',')
         new = {"Date": date_mission.strftime("%d/%m/%Y"), "Mois": date_mission.strftime("%Y-%m"), "Source": source, "Type": typ, "Détails": "App", "Montant Net": montant_final_str, "Date Paiement": d_pay.strftime("%Y-%m-%d"), "Mois Paiement": d_pay.strftime("%Y-%m")}
         
-        # SAUVEGARDE GOOGLE SHEETS
+        # SAUVEGARDE GOOGLE SHEETS (en arrière-plan)
         try:
-            save_revenu_cloud(user, new)
+            ticket = save_revenu_cloud(user, new)
+            st.session_state.setdefault('tickets', []).append(ticket)
             
-            # 🚨 LA CORRECTION EST ICI : On vide la mémoire pour forcer le rafraîchissement auto
-            if 'data_loaded' in st.session_state:
-                del st.session_state['data_loaded']
+            # Write-through : la ligne (ID = ticket) s'affiche tout de suite, sans relire le Cloud
+            if _ecriture_session("DATA", user):
+                appliquer_revenus(ingerer_revenus([{**new, "User": user, "ID": ticket}]))
                 
-            st.success("✅ Sauvegardé dans le Cloud !")
+            st.success("✅ Enregistré ! Envoi au Cloud en cours...")
             st.rerun()
         except Exception as e:
             st.error(f"Erreur de sauvegarde : {e}")
 
+    # --- IMPORT EN MASSE (relevés d'agence) ---
+    st.markdown("---")
+    with st.expander("📥 Importer un relevé (CSV / Excel)"):
+        st.caption("Colonnes reconnues : Date, Source, Type, Taux, Heures, Paniers, % Charges, Net, Date Paiement. "
+                   "Sans colonne Net, le net et la date de paiement sont calculés comme dans le formulaire.")
+        fichier = st.file_uploader("Fichier", type=["csv", "xlsx"])
+        if fichier is not None:
+            df_import, erreurs = lire_import(fichier.getvalue(), fichier.name, user)
+            
+            k1, k2, k3 = st.columns(3)
+            k1.metric("Lignes valides", f"{len(df_import)}")
+            k2.metric("Total net", f"{df_import['Montant Net'].sum() / 100:,.2f} €")
+            k3.metric("Lignes rejetées", f"{len(erreurs)}")
+            
+            st.dataframe(pour_editeur(df_import.head(100), "DATA"), use_container_width=True, hide_index=True,
+                         column_config={"User": None, "ID": None, "Montant Net": st.column_config.NumberColumn("Net (€)", format="%.2f €")})
+            if not erreurs.empty:
+                st.warning("Lignes ignorées :")
+                st.dataframe(erreurs, use_container_width=True, hide_index=True)
+            
+            if not df_import.empty and st.button(f"📥 Importer {len(df_import)} revenus", type="primary"):
+                try:
+                    with st.spinner("Envoi au Cloud..."):
+                        import_revenus_cloud(user, df_import)
+                    if _ecriture_session("DATA", user):
+                        appliquer_revenus(df_import)
+                    st.success("✅ Import terminé !")
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"Erreur d'import : {e}")
+
 # --- PAGE 3 : CHARGES ---
 elif menu == "💳 Charges & Budgets":
     st.header("Mes Charges")
     st.info("Chaque modification est sauvegardée dans votre espace Cloud.")
     
-    edited = st.data_editor(
-        st.session_state['data_charges'],
-        num_rows="dynamic",
-        use_container_width=True,
-        column_config={
-            "User": None,  # <--- 1. ON CACHE LA COLONNE USER ICI
-            "Montant": st.column_config.NumberColumn(
-                "Montant (€)",
-                min_value=0.0,
-                max_value=10000.0,
-                step=0.01,
-                format="%.2f €"
-            ),
-            "Jour": st.column_config.NumberColumn(
-                "Jour du mois",
-                min_value=1,
-                max_value=31,
-                step=1
-            ),
-            "Groupe": st.column_config.SelectboxColumn(
-                "Type",
-                options=["FIXES", "VARIABLES", "EPARGNE"]
-            )
-        }
-    )
+    with perf.span("rendu.charges"):
+        edited = st.data_editor(
+            pour_editeur(st.session_state['data_charges'], "CHARGES"),
+            num_rows="dynamic",
+            use_container_width=True,
+            column_config={
+                "User": None,  # <--- 1. ON CACHE LA COLONNE USER ICI
+                "ID": None,
+                "Montant": st.column_config.NumberColumn(
+                    "Montant (€)",
+                    min_value=0.0,
+                    max_value=10000.0,
+                    step=0.01,
+                    format="%.2f €"
+                ),
+                "Jour": st.column_config.NumberColumn(
+                    "Jour du mois",
+                    min_value=1,
+                    max_value=31,
+                    step=1
+                ),
+                "Groupe": st.column_config.SelectboxColumn(
+                    "Type",
+                    options=["FIXES", "VARIABLES", "EPARGNE"]
+                )
+            }
+        )
+    
     
     if st.button("☁️ Mettre à jour le Cloud", type="primary"):
         try:
-            # Nettoyage des virgules (12,50 -> 12.50)
-            if "Montant" in edited.columns:
-                edited["Montant"] = edited["Montant"].astype(str).str.replace(",", ".", regex=False)
-                edited["Montant"] = pd.to_numeric(edited["Montant"], errors='coerce').fillna(0.0)
-
-            # Sauvegarde
-            save_charges_cloud(user, edited)
+            # Sauvegarde (retour au schéma typé : centimes, Jour entier)
+            df_charges = save_charges_cloud(user, st.session_state['data_charges'], ingerer_charges(edited))
             
-            # 🚨 ON VIDE LA MÉMOIRE POUR FORCER L'ACTUALISATION DU DASHBOARD
-            if 'data_loaded' in st.session_state:
-                del st.session_state['data_loaded']
+            # Write-through : le tableau sauvegardé devient celui de la session (totaux par groupe recalculés)
+            if _ecriture_session("CHARGES", user):
+                st.session_state['data_charges'] = df_charges
+                if st.session_state.get('index_rev') == st.session_state['data_rev']:
+                    st.session_state['index_mois'].maj_charges(df_charges)
+                    st.session_state['index_rev'] = st.session_state['data_rev'] = nouvel_id()
+                else:
+                    st.session_state['data_rev'] = nouvel_id()
                 
             st.success("✅ Vos charges sont à jour !")
             st.rerun()
-            
+
         except Exception as e:
             st.error(f"Erreur : {e}")
+
+    # Solde réel du compte : point de départ du grand livre (soldes de début / fin de mois)
+    st.subheader("🏦 Solde du compte")
+    ouverture = ouverture_compte()
+    with st.form("solde_compte"):
+        s1, s2 = st.columns(2)
+        mois_solde = s1.text_input("Au 1er du mois (AAAA-MM)", ouverture[0] if ouverture else datetime.now().strftime("%Y-%m"))
+        montant_solde = s2.number_input("Solde (€)", value=ouverture[1] / 100 if ouverture else 0.0, step=10.0, format="%.2f")
+        b1, b2 = st.columns(2)
+        enregistrer = b1.form_submit_button("💾 Enregistrer le solde", type="primary")
+        effacer = b2.form_submit_button("🗑️ Retirer le solde", disabled=ouverture is None)
+
+    if enregistrer or effacer:
+        origine = st.session_state['data_soldes']
+        ids = origine["ID"].head(1).tolist() or [""]
+        df_solde = ingerer_soldes(pd.DataFrame([] if effacer else [{"User": user, "Mois": mois_solde, "Solde": montant_solde, "ID": ids[0]}]))
+        if enregistrer and df_solde.empty:
+            st.error("Mois invalide : format attendu AAAA-MM")
+        else:
+            try:
+                df_solde = save_solde_cloud(user, origine, df_solde)
+                if _ecriture_session("SOLDES", user):
+                    st.session_state['data_soldes'] = df_solde
+                    if st.session_state.get('index_rev') == st.session_state['data_rev']:
+                        # Seul le grand livre change : l'index par mois est conservé
+                        st.session_state['index_mois'].ouvrir(*(ouverture_compte() or (None, 0)))
+                        st.session_state['index_rev'] = st.session_state['data_rev'] = nouvel_id()
+                    else:
+                        st.session_state['data_rev'] = nouvel_id()
+                st.success("✅ Solde enregistré !" if enregistrer else "✅ Solde retiré")
+                st.rerun()
+            except Exception as e:
+                st.error(f"Erreur : {e}")
+
+# --- PAGE 4 : ANALYTIQUE TOUS COMPTES (ADMIN) ---
+elif menu == "📊 Analytique (admin)":
+    st.header("📊 Analytique tous comptes")
+    if admin_deverrouille():
+        maintenant = pd.Period(datetime.now(), freq="M")
+        choix_mois = pd.period_range(maintenant - 24, maintenant + 12, freq="M").strftime("%Y-%m").tolist()
+        a1, a2 = st.columns(2)
+        mois_fin = a1.selectbox("Mois", choix_mois, index=choix_mois.index(maintenant.strftime("%Y-%m")))
+        n_mois = a2.slider("Historique (mois)", 1, 24, 12)
+        mois_analyse = tuple(decaler_mois(mois_fin, -i) for i in reversed(range(n_mois)))
+        revisions = tuple(get_snapshot_cache().revision(cle_version(t, "*")) for t in TABLES)
+        sit, par_type, par_mois = analytique_tous_comptes(mois_analyse, revisions)
+
+        du_mois = sit[sit["Mois"] == mois_fin]
+        m1, m2, m3, m4, m5 = st.columns(5)
+        m1.metric("Comptes", len(du_mois))
+        for col, (n, etat) in zip((m2, m3, m4), enumerate(analytique.ETATS)):
+            col.metric(etat, int((du_mois["Niveau"] == n).sum()))
+        m5.metric("Score médian", f"{du_mois['Score'].median():.2f}" if len(du_mois) else "—")
+
+        with perf.span("rendu.analytique"):
+            st.subheader(f"Par type de contrat principal ({mois_fin})")
+            st.dataframe(par_type.round(2), use_container_width=True)
+            st.subheader("Par mois")
+            st.line_chart(par_mois[[c for c in par_mois.columns if c.startswith("% ")]])
+            st.dataframe(par_mois.round(2), use_container_width=True)
+            with st.expander(f"Comptes en {analytique.ETATS[0]} ({mois_fin})"):
+                risque = du_mois[du_mois["Niveau"] == 0].sort_values("Solde")
+                st.dataframe(risque[["User", "Type", "Entrées", "Sorties", "Solde", "Score"]].head(500).round(2), use_container_width=True, hide_index=True)
+
+# --- 8. PANNEAU PERF (secrets : [perf] panel = true) ---
+if PERF.get("panel"):
+    resume = st.session_state['perf_run'].resume()
+    with st.sidebar.expander("⏱️ Perf (ce rerun)"):
+        st.caption(f"{resume['duree'] * 1000:.0f} ms · {resume['compteurs'].get('http.requetes', 0)} requêtes · "
+                   f"{resume['compteurs'].get('http.octets', 0) / 1024:.0f} Ko reçus")
+        if resume['spans']:
+            df_spans = pd.DataFrame(resume['spans']).groupby("nom", sort=False)["duree"].agg(["count", "sum"])
+            st.dataframe((df_spans.assign(sum=df_spans["sum"] * 1000)).rename(columns={"count": "Appels", "sum": "ms"}).round(1), use_container_width=True)
+        st.json(resume['compteurs'], expanded=False)
+        st.caption("Cache partagé")
+        st.json(get_snapshot_cache().stats(), expanded=False)
+        if get_snapshot_disque() is not None:
+            st.caption("Instantanés disque")
+            st.json(get_snapshot_disque().stats(), expanded=False)
+        if not isinstance(get_db_connection(), SQLiteStorage):
+            st.caption("Appels Google Sheets (depuis le démarrage)")
+            st.dataframe(pd.DataFrame(get_planificateur().stats()).T.round(4), use_container_width=True)
+perf.fin_run(st.session_state['perf_run'], interrompu=False)
@@ -0,0 +1,214 @@
+"""Benchmarks SalaryFlow : chargement, sauvegardes et calcul du tableau de bord à 1k / 10k / 100k lignes.
+
+Tout tourne sur le classeur en mémoire (fake_gspread) derrière les vraies couches de l'app :
+AccesDonnees (lectures / sauvegardes de l'app) -> ClasseurPlanifie -> GoogleSheetsStorage -> schema / moteur.
+
+Usage (depuis la racine du dépôt) :
+    python -m benchmarks.bench
+    python -m benchmarks.bench --lignes 1000 10000 --latence 0.05
+    python -m benchmarks.bench --sortie reference.json
+    python -m benchmarks.bench --reference reference.json    # code retour 1 si un benchmark régresse
+"""
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from acces_donnees import AccesDonnees
+from benchmarks import donnees
+from benchmarks.fake_gspread import FakeSpreadsheet
+from moteur import IndexMensuel, build_timeline, projeter
+from quota import ClasseurPlanifie, Planificateur
+from schema import categoriser, ingerer_revenus
+from snapshot_cache import SnapshotCache
+from snapshot_disque import SnapshotDisque
+from storage import COLONNES_SOLDES, GoogleSheetsStorage, nouvel_id
+from write_behind import WriteBehindQueue
+
+LIGNES = [1_000, 10_000, 100_000]
+LIGNES_PAR_USER = 200
+SEUIL = 1.5   # plus lent que la référence au-delà de ce facteur = régression
+
+
+# --- 1. MISE EN PLACE ---
+class Scenario:
+    """Un classeur de `n` revenus (n / 200 utilisateurs) et la base d'accès de l'app par-dessus"""
+
+    def __init__(self, n, latence=0.0, latence_par_ligne=0.0):
+        n_users = max(1, n // LIGNES_PAR_USER)
+        self.user = donnees.utilisateurs(1)[0]
+        self.valeurs = {"DATA": donnees.revenus(n_users, n), "CHARGES": donnees.charges(n_users), "SOLDES": [COLONNES_SOLDES]}
+        self.latence, self.latence_par_ligne = latence, latence_par_ligne
+        self.reinitialiser()
+
+    def reinitialiser(self):
+        self.sh = FakeSpreadsheet(self.valeurs, self.latence, self.latence_par_ligne)
+        self.db = GoogleSheetsStorage(ClasseurPlanifie(self.sh, Planificateur(debit=1e9, capacite=1e9)))
+        # Comme get_write_queue, sans envoi périodique : seuls les flush des sauvegardes la vident
+        self.file = WriteBehindQueue(self.db, intervalle=3600, apres_ecriture=self._apres_ecriture)
+        self.redemarrer()
+
+    def redemarrer(self, dossier=None):
+        """Nouveau processus : cache mémoire vide, instantanés disque dans `dossier` (None = sans disque)"""
+        disque = SnapshotDisque(dossier, self.db.revision) if dossier else None
+        self.acces = AccesDonnees(self.db, self.file, SnapshotCache(ttl=300), disque)
+
+    def _apres_ecriture(self, table, records):
+        for user_email in {r["User"] for r in records}:
+            self.acces.invalider(table, user_email)
+
+
+def charger(sc):
+    """Même chemin que load_user_data : DATA, CHARGES et SOLDES en parallèle, via le cache partagé"""
+    lectures = sc.acces.lectures(sc.user)
+    with ThreadPoolExecutor(max_workers=len(lectures)) as pool:
+        futures = [pool.submit(fn) for fn in lectures.values()]
+        return tuple(f.result() for f in futures)
+
+
+# --- 2. BENCHMARKS (chacun : préparation non chronométrée -> fonction chronométrée) ---
+def bench_chargement(sc):
+    sc.reinitialiser()
+    return lambda: charger(sc)
+
+
+def bench_chargement_cache(sc):
+    sc.reinitialiser()
+    charger(sc)
+    return lambda: charger(sc)
+
+
+def bench_chargement_disque(sc):
+    """Redémarrage de l'app : cache mémoire vide, instantanés disque à jour (un seul appel : la révision)"""
+    sc.reinitialiser()
+    charger(sc)   # première lecture : les lignes sans ID en reçoivent un (le classeur change)
+    dossier = tempfile.mkdtemp(prefix="salaryflow_snapshots_")
+    sc.redemarrer(dossier)
+    charger(sc)
+    sc.redemarrer(dossier)
+
+    def relire():
+        try:
+            charger(sc)
+        finally:
+            shutil.rmtree(dossier, ignore_errors=True)
+    return relire
+
+
+def bench_sauvegarde_historique(sc):
+    """update_revenus_cloud : 1 % des montants modifiés, une suppression, un ajout"""
+    sc.reinitialiser()
+    avant, _, _ = charger(sc)
+    apres = avant.copy()
+    modifies = apres.index[:: max(1, len(apres) // 100)]
+    apres.loc[modifies, "Montant Net"] += 100
+    nouvelle = apres.iloc[[0]].assign(ID=nouvel_id())
+    apres = categoriser(pd.concat([apres.iloc[1:], nouvelle], ignore_index=True), "DATA")
+
+    return lambda: sc.acces.sauver("DATA", sc.user, avant, apres)
+
+
+def bench_sauvegarde_charges(sc):
+    """save_charges_cloud : une charge modifiée"""
+    sc.reinitialiser()
+    _, avant, _ = charger(sc)
+    apres = avant.copy()
+    apres.loc[0, "Montant"] += 500
+
+    return lambda: sc.acces.sauver("CHARGES", sc.user, avant, apres)
+
+
+def bench_tableau_de_bord(sc):
+    """Index + KPIs + timeline du mois + projection 24 mois, pour UN compte portant toutes les lignes"""
+    sc.reinitialiser()
+    df_r = ingerer_revenus(sc.db.lire_partition("DATA", "DATA"))
+    _, df_c, _ = charger(sc)
+    mois = df_r["Mois Paiement"].mode().iloc[0]
+
+    def calculer():
+        index = IndexMensuel(df_r, df_c)
+        index.kpis(mois)
+        build_timeline(df_r, df_c, mois, index=index)
+        projeter(df_r, df_c, mois, 24)
+    return calculer
+
+
+BENCHMARKS = {
+    "chargement": bench_chargement,
+    "chargement_cache": bench_chargement_cache,
+    "chargement_disque": bench_chargement_disque,
+    "sauvegarde_historique": bench_sauvegarde_historique,
+    "sauvegarde_charges": bench_sauvegarde_charges,
+    "tableau_de_bord": bench_tableau_de_bord,
+}
+
+
+# --- 3. EXÉCUTION ---
+def mesurer(preparer, sc, repetitions):
+    """Meilleur temps (ms) sur `repetitions` essais, chacun sur une préparation neuve.
+    Retourne aussi le nombre d'appels API de la partie chronométrée."""
+    temps = []
+    for _ in range(repetitions):
+        fn = preparer(sc)
+        avant = sum(sc.sh.appels.values())
+        debut = time.perf_counter()
+        fn()
+        temps.append((time.perf_counter() - debut) * 1000)
+        appels = sum(sc.sh.appels.values()) - avant
+    return min(temps), appels
+
+
+def executer(lignes=LIGNES, repetitions=3, latence=0.0, latence_par_ligne=0.0, noms=None):
+    resultats = []
+    for n in lignes:
+        sc = Scenario(n, latence, latence_par_ligne)
+        for nom, preparer in BENCHMARKS.items():
+            if noms and nom not in noms:
+                continue
+            ms, appels = mesurer(preparer, sc, repetitions)
+            resultats.append({"benchmark": nom, "lignes": n, "ms": round(ms, 2), "appels_api": appels})
+            print(f"{nom:<24}{n:>9} lignes {ms:>10.1f} ms {appels:>5} appels", flush=True)
+    return resultats
+
+
+def regressions(resultats, reference, seuil=SEUIL):
+    ref = {(r["benchmark"], r["lignes"]): r["ms"] for r in reference}
+    return [
+        {**r, "reference_ms": ref[(r["benchmark"], r["lignes"])]}
+        for r in resultats
+        if (r["benchmark"], r["lignes"]) in ref and r["ms"] > seuil * max(ref[(r["benchmark"], r["lignes"])], 1.0)
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lignes", type=int, nargs="+", default=LIGNES)
+    parser.add_argument("--repetitions", type=int, default=3)
+    parser.add_argument("--latence", type=float, default=0.0, help="secondes par appel API simulé")
+    parser.add_argument("--latence-par-ligne", type=float, default=0.0, help="secondes par ligne transférée")
+    parser.add_argument("--bench", nargs="+", choices=list(BENCHMARKS), help="seulement ces benchmarks")
+    parser.add_argument("--sortie", help="écrit les résultats (JSON)")
+    parser.add_argument("--reference", help="résultats de référence (JSON) à comparer")
+    parser.add_argument("--seuil", type=float, default=SEUIL)
+    args = parser.parse_args(argv)
+
+    resultats = executer(args.lignes, args.repetitions, args.latence, args.latence_par_ligne, args.bench)
+    if args.sortie:
+        with open(args.sortie, "w") as f:
+            json.dump(resultats, f, indent=2)
+    if args.reference:
+        with open(args.reference) as f:
+            lentes = regressions(resultats, json.load(f), args.seuil)
+        for r in lentes:
+            print(f"❌ {r['benchmark']} ({r['lignes']} lignes) : {r['ms']:.1f} ms contre {r['reference_ms']:.1f} ms", file=sys.stderr)
+        return 1 if lentes else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
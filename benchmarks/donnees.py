@@ -0,0 +1,70 @@
+"""Données synthétiques au format réel du Sheet : N utilisateurs x M revenus / charges.
+
+Comme en production, les formats sont mélangés : dates "JJ/MM/AAAA" et "AAAA-MM-JJ",
+montants "1234,56" / "'1234,56" / "1234.56", lignes historiques sans ID ni Mois Paiement.
+"""
+import numpy as np
+
+from storage import COLONNES_CHARGES, COLONNES_REVENUS, nouveaux_ids
+
+TYPES = ["Intérim", "Micro-Entreprise", "Salaire", "Chomâge", "APL", "Prime d'activité", "Remboursements", "Autre"]
+SOURCES = ["Adecco", "Manpower", "Randstad", "CAF", "France Travail", "Client A", "Client B", "Employeur"]
+CHARGES = [
+    ("FIXES", "Logement", "Loyer", 5), ("FIXES", "Logement", "Energie/Eau", 15), ("FIXES", "Logement", "Internet", 10),
+    ("FIXES", "Transport", "Abonnement TBM", 5), ("FIXES", "Abonnements", "Téléphone", 10),
+    ("VARIABLES", "Plaisir", "Restos / Sorties", 20), ("VARIABLES", "Animaux", "Véto / Croquettes", 20),
+    ("EPARGNE", "Court Terme", "Livret A", 1),
+]
+
+
+def utilisateurs(n):
+    return [f"user{i:05d}@exemple.fr" for i in range(n)]
+
+
+def _montant(rng, valeurs):
+    """Montants saisis à la main : virgule décimale, apostrophe de protection, parfois un point"""
+    texte = np.char.mod("%.2f", valeurs)
+    virgule = np.char.replace(texte, ".", ",")
+    forme = rng.integers(0, 3, len(valeurs))
+    return np.where(forme == 0, texte, np.where(forme == 1, virgule, np.char.add("'", virgule)))
+
+
+def revenus(n_users, n_lignes, debut="2021-01-01", fin="2026-12-31", graine=0):
+    """`n_lignes` revenus répartis sur `n_users` -> valeurs de l'onglet DATA (en-tête compris)"""
+    rng = np.random.default_rng(graine)
+    users = np.array(utilisateurs(n_users))[rng.integers(0, n_users, n_lignes)]
+    jours = np.datetime64(debut) + rng.integers(0, (np.datetime64(fin) - np.datetime64(debut)).astype(int), n_lignes)
+    paiement = jours + rng.integers(0, 45, n_lignes)
+    iso, iso_pay = np.datetime_as_string(jours, "D"), np.datetime_as_string(paiement, "D")
+    fr = np.char.add(np.char.add(np.char.add(np.char.add([s[8:10] for s in iso], "/"), [s[5:7] for s in iso]), "/"), [s[:4] for s in iso])
+    date = np.where(rng.random(n_lignes) < 0.7, fr, iso)
+    mois_pay = np.array([s[:7] for s in iso_pay])
+    # 5 % de lignes anciennes : ni ID ni Mois Paiement (recalculé à l'ingestion)
+    ancien = rng.random(n_lignes) < 0.05
+    ids = np.where(ancien, "", np.array(nouveaux_ids(n_lignes), dtype=object))
+    mois_pay = np.where(ancien, "", mois_pay)
+    colonnes = {
+        "User": users,
+        "Date": date,
+        "Mois": np.array([s[:7] for s in iso]),
+        "Source": np.array(SOURCES)[rng.integers(0, len(SOURCES), n_lignes)],
+        "Type": np.array(TYPES)[rng.integers(0, len(TYPES), n_lignes)],
+        "Détails": "App",
+        "Montant Net": _montant(rng, rng.gamma(2.0, 400.0, n_lignes).round(2)),
+        "Date Paiement": iso_pay,
+        "Mois Paiement": mois_pay,
+        "ID": ids,
+    }
+    lignes = np.column_stack([np.broadcast_to(np.asarray(colonnes[c], dtype=object), n_lignes) for c in COLONNES_REVENUS])
+    return [list(COLONNES_REVENUS)] + lignes.tolist()
+
+
+def charges(n_users, graine=0):
+    """Les charges types de chaque utilisateur -> valeurs de l'onglet CHARGES (en-tête compris)"""
+    rng = np.random.default_rng(graine)
+    lignes = [list(COLONNES_CHARGES)]
+    for user in utilisateurs(n_users):
+        montants = _montant(rng, rng.gamma(2.0, 60.0, len(CHARGES)).round(2))
+        for (groupe, sous_groupe, intitule, jour), montant, rid in zip(CHARGES, montants, nouveaux_ids(len(CHARGES))):
+            lignes.append([user, groupe, sous_groupe, intitule, str(montant), str(jour), rid])
+    return lignes
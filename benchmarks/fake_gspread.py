@@ -0,0 +1,136 @@
+"""Classeur Google Sheets en mémoire : les appels gspread utilisés par l'app, avec latence réglable.
+
+Chaque appel compte dans `appels` et attend `latence` secondes (+ `latence_par_ligne` x lignes
+transférées), pour reproduire le coût réseau de l'API sans compte de service.
+"""
+import threading
+import time
+from collections import Counter
+
+import gspread
+from gspread.utils import a1_to_rowcol, numericise_all
+
+
+class FakeWorksheet:
+    def __init__(self, classeur, title, id, rows=None):
+        self.classeur = classeur
+        self.title = title
+        self.id = id
+        self.rows = [list(r) for r in rows or []]
+
+    def _appel(self, nom, lignes=0):
+        self.classeur._appel(nom, lignes)
+
+    def _set(self, r, c, v):
+        while len(self.rows) < r:
+            self.rows.append([])
+        ligne = self.rows[r - 1]
+        while len(ligne) < c:
+            ligne.append("")
+        ligne[c - 1] = v
+
+    # --- LECTURE ---
+    def get_all_values(self):
+        self._appel("get_all_values", len(self.rows))
+        return [list(r) for r in self.rows]
+
+    def get_all_records(self, numericise_ignore=()):
+        """Comme gspread : les textes qui ressemblent à des nombres sont convertis, sauf numericise_ignore=["all"]"""
+        self._appel("get_all_records", len(self.rows))
+        if not self.rows:
+            return []
+        entetes = self.rows[0]
+        lignes = [[str(r[i]) if i < len(r) else "" for i in range(len(entetes))] for r in self.rows[1:]]
+        if list(numericise_ignore) != ["all"]:
+            lignes = [numericise_all(l, ignore=list(numericise_ignore)) for l in lignes]
+        return [dict(zip(entetes, l)) for l in lignes]
+
+    def row_values(self, i):
+        self._appel("row_values")
+        return list(self.rows[i - 1]) if len(self.rows) >= i else []
+
+    def col_values(self, c):
+        self._appel("col_values", len(self.rows))
+        return [r[c - 1] if len(r) >= c else "" for r in self.rows]
+
+    # --- ÉCRITURE ---
+    def append_row(self, valeurs, **kwargs):
+        self._appel("append_row", 1)
+        self.rows.append(list(valeurs))
+
+    def append_rows(self, lignes, **kwargs):
+        self._appel("append_rows", len(lignes))
+        self.rows.extend(list(r) for r in lignes)
+
+    def update_cell(self, r, c, v):
+        self._appel("update_cell", 1)
+        self._set(r, c, v)
+
+    def batch_update(self, plages, **kwargs):
+        self._appel("batch_update", len(plages))
+        for p in plages:
+            r, c = a1_to_rowcol(p["range"].split(":")[0])
+            for i, ligne in enumerate(p["values"]):
+                for j, v in enumerate(ligne):
+                    self._set(r + i, c + j, v)
+
+    def update(self, valeurs, *args, **kwargs):
+        self._appel("update", len(valeurs))
+        self.rows = [list(r) for r in valeurs]
+
+    def clear(self):
+        self._appel("clear")
+        self.rows = []
+
+
+ECRITURES = {"append_row", "append_rows", "update_cell", "batch_update", "update", "clear", "add_worksheet"}
+
+
+class FakeSpreadsheet:
+    def __init__(self, onglets=None, latence=0.0, latence_par_ligne=0.0):
+        self.latence = latence
+        self.latence_par_ligne = latence_par_ligne
+        self.appels = Counter()
+        self.modifications = 0
+        self.lock = threading.Lock()
+        self._onglets = {}
+        for titre, rows in (onglets or {}).items():
+            self._onglets[titre] = FakeWorksheet(self, titre, len(self._onglets), rows)
+
+    def _appel(self, nom, lignes=0):
+        with self.lock:
+            self.appels[nom] += 1
+            if nom in ECRITURES:
+                self.modifications += 1
+        attente = self.latence + self.latence_par_ligne * lignes
+        if attente:
+            time.sleep(attente)
+
+    def get_lastUpdateTime(self):
+        """Drive : date de modification du classeur (ici, un compteur d'écritures)"""
+        self._appel("get_lastUpdateTime")
+        return str(self.modifications)
+
+    def worksheet(self, titre):
+        self._appel("worksheet")
+        if titre not in self._onglets:
+            raise gspread.exceptions.WorksheetNotFound(titre)
+        return self._onglets[titre]
+
+    def worksheets(self):
+        self._appel("worksheets")
+        return list(self._onglets.values())
+
+    def add_worksheet(self, titre, rows=1000, cols=26, **kwargs):
+        self._appel("add_worksheet")
+        ws = FakeWorksheet(self, titre, len(self._onglets))
+        self._onglets[titre] = ws
+        return ws
+
+    def batch_update(self, body):
+        """Seules les suppressions de lignes (deleteDimension) sont utilisées par l'app"""
+        self._appel("batch_update")
+        par_id = {ws.id: ws for ws in self._onglets.values()}
+        for req in body["requests"]:
+            plage = req["deleteDimension"]["range"]
+            del par_id[plage["sheetId"]].rows[plage["startIndex"]:plage["endIndex"]]
@@ -0,0 +1,128 @@
+"""Export de l'historique, des charges et de la timeline (XLSX ou CSV).
+
+Les lignes sont produites à la volée, par blocs de BLOC lignes, et écrites au fil de l'eau :
+xlsxwriter en mode constant_memory pour l'Excel, générateur de morceaux pour le CSV.
+Le fichier final est rendu en bytes (ce qu'attend st.download_button) : il tient donc en mémoire.
+"""
+import csv
+import io
+
+import pandas as pd
+import xlsxwriter
+
+from moteur import COLONNES_TIMELINE, IndexMensuel, build_timeline
+from schema import pour_editeur
+
+BLOC = 5000
+
+COLONNES_HISTORIQUE = ["Date", "Mois", "Source", "Type", "Détails", "Montant Net", "Date Paiement", "Mois Paiement"]
+COLONNES_CHARGES = ["Groupe", "Sous-Groupe", "Intitule", "Montant", "Jour"]
+COLONNES_TIMELINE_EXPORT = ["Mois"] + COLONNES_TIMELINE
+COLONNES_EUROS = {"Montant Net", "Montant", "Cumul"}
+COLONNES_DATES = {"Date", "Date Paiement"}
+EPOQUE_EXCEL = pd.Timestamp("1899-12-30")
+
+
+# --- 1. BLOCS (générateurs de DataFrames de BLOC lignes au plus, montants en euros) ---
+def _par_blocs(df, colonnes, table):
+    for debut in range(0, len(df), BLOC):
+        bloc = pour_editeur(df.iloc[debut:debut + BLOC], table)
+        yield bloc[[c for c in colonnes if c in bloc.columns]]
+
+
+def blocs_historique(df_revenus):
+    return _par_blocs(df_revenus, COLONNES_HISTORIQUE, "DATA")
+
+
+def blocs_charges(df_charges):
+    return _par_blocs(df_charges, COLONNES_CHARGES, "CHARGES")
+
+
+def blocs_timeline(df_revenus, df_charges, debut, fin, index=None, ouverture=None):
+    """Timeline mois par mois, de `debut` à `fin` ("YYYY-MM") : un seul mois en mémoire à la fois.
+    Le cumul part du solde au 1er de chaque mois tenu par le grand livre de `index` (ou ouvert sur `ouverture`)."""
+    if index is None:
+        index = IndexMensuel(df_revenus, df_charges)
+        index.ouvrir(*(ouverture or (None, 0)))
+    for periode in pd.period_range(debut, fin, freq="M"):
+        mois = periode.strftime("%Y-%m")
+        df_tl = build_timeline(df_revenus, df_charges, mois, index=index, solde_initial=index.solde_ouverture(mois) / 100)
+        if not df_tl.empty:
+            yield df_tl.assign(Mois=mois)[COLONNES_TIMELINE_EXPORT]
+
+
+def _lignes(bloc):
+    bloc = bloc.astype(object)
+    return bloc.where(bloc.notna(), None).itertuples(index=False, name=None)
+
+
+# --- 2. ÉCRITURE ---
+def _pour_xlsx(bloc):
+    """Dates -> numéros de série Excel (vectorisé : write_datetime cellule par cellule est très lent)"""
+    bloc = bloc.copy()
+    for col in bloc.columns:
+        if pd.api.types.is_datetime64_any_dtype(bloc[col]):
+            bloc[col] = (bloc[col] - EPOQUE_EXCEL) / pd.Timedelta(days=1)
+    return bloc
+
+
+def vers_xlsx(feuilles):
+    """{nom d'onglet: (entêtes, blocs)} -> contenu du fichier XLSX (bytes)"""
+    sortie = io.BytesIO()
+    wb = xlsxwriter.Workbook(sortie, {
+        "constant_memory": True,
+        # Textes saisis par l'utilisateur : jamais interprétés comme formules ou liens
+        "strings_to_formulas": False, "strings_to_urls": False,
+    })
+    gras = wb.add_format({"bold": True})
+    formats = {"euros": wb.add_format({"num_format": "#,##0.00 €"}), "date": wb.add_format({"num_format": "dd/mm/yyyy"})}
+    for nom, (entetes, blocs) in feuilles.items():
+        ws = wb.add_worksheet(nom)
+        # En constant_memory les lignes partent sur disque dans l'ordre : formats de colonnes AVANT d'écrire
+        for i, col in enumerate(entetes):
+            fmt = "euros" if col in COLONNES_EUROS else "date" if col in COLONNES_DATES else None
+            ws.set_column(i, i, 14, formats.get(fmt))
+        ws.write_row(0, 0, entetes, gras)
+        n = 1
+        for bloc in blocs:
+            for ligne in _lignes(_pour_xlsx(bloc)):
+                ws.write_row(n, 0, ligne)
+                n += 1
+    wb.close()
+    return sortie.getvalue()
+
+
+def _date_fr(serie):
+    """datetime64 -> "JJ/MM/AAAA" ("" si NaT), via NumPy : bien plus rapide que .dt.strftime"""
+    iso = pd.Series(serie.to_numpy().astype("datetime64[D]").astype(str), index=serie.index)
+    return (iso.str.slice(8, 10) + "/" + iso.str.slice(5, 7) + "/" + iso.str.slice(0, 4)).where(serie.notna(), "")
+
+
+def _pour_csv(bloc):
+    """Format Excel français : dates JJ/MM/AAAA, montants "12,50" (vectorisé)"""
+    bloc = bloc.copy()
+    for col in bloc.columns:
+        if pd.api.types.is_datetime64_any_dtype(bloc[col]):
+            bloc[col] = _date_fr(bloc[col])
+        elif col in COLONNES_EUROS:
+            bloc[col] = bloc[col].astype(float).map("{:.2f}".format).str.replace(".", ",", regex=False)
+    return bloc
+
+
+def flux_csv(entetes, blocs, sep=";"):
+    """Générateur de morceaux CSV (UTF-8 avec BOM), un morceau par bloc"""
+    tampon = io.StringIO()
+    w = csv.writer(tampon, delimiter=sep)
+    tampon.write("\ufeff")
+    w.writerow(entetes)
+    for bloc in blocs:
+        w.writerows(_lignes(_pour_csv(bloc)))
+        yield tampon.getvalue().encode("utf-8")
+        tampon.seek(0)
+        tampon.truncate()
+    yield tampon.getvalue().encode("utf-8")
+
+
+def vers_csv(entetes, blocs):
+    """Contenu du fichier CSV (bytes) prêt à télécharger"""
+    return b"".join(flux_csv(entetes, blocs))
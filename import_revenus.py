@@ -0,0 +1,124 @@
+"""Import en masse de relevés (CSV / XLSX) : lecture par morceaux, calcul vectorisé, un seul envoi."""
+import io
+import unicodedata
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+from paie import TYPES_REVENUS, calculer_paie
+from schema import categoriser, dates, ingerer_revenus, mois_de, nombres
+from storage import nouveaux_ids
+
+TAILLE_MORCEAU = 5000
+
+# En-têtes acceptés (sans accents, en minuscules) -> colonne interne
+ALIAS = {
+    "date": "Date", "date mission": "Date", "date de la mission": "Date", "date de versement": "Date",
+    "source": "Source", "client": "Source", "agence": "Source",
+    "type": "Type", "contrat": "Type",
+    "taux": "Taux", "taux/ca": "Taux", "taux horaire": "Taux",
+    "heures": "Heures", "qte/jours": "Heures", "quantite": "Heures",
+    "paniers": "Paniers", "paniers (€)": "Paniers", "frais": "Paniers",
+    "% charges": "Charges", "charges": "Charges",
+    "net": "Net", "montant": "Net", "montant net": "Net", "net (€)": "Net",
+    "date paiement": "Date Paiement",
+}
+
+
+def _cle(entete):
+    texte = str(entete).replace("€", "eur")
+    return unicodedata.normalize("NFKD", texte).encode("ascii", "ignore").decode().strip().lower()
+
+
+def _renommer(df):
+    alias = {_cle(k): v for k, v in ALIAS.items()}
+    return df.rename(columns=lambda c: alias.get(_cle(c), c))
+
+
+def _sans_lignes_vides(df):
+    """Écarte les lignes sans aucune valeur (y compris ";;;;;" ou cellules d'espaces)"""
+    remplie = df.apply(lambda c: c.astype(str).str.strip().ne("") & c.notna()).any(axis=1)
+    return df[remplie]
+
+
+def lire_par_morceaux(fichier, nom, taille=TAILLE_MORCEAU):
+    """Itère sur le fichier par DataFrames de `taille` lignes (tout en texte, sauf les dates Excel).
+    L'index de chaque morceau est le numéro de ligne dans le fichier (en-tête = ligne 1) ; lignes vides ignorées."""
+    if isinstance(fichier, (bytes, bytearray)):
+        fichier = io.BytesIO(fichier)
+    if nom.lower().endswith((".xlsx", ".xlsm")):
+        wb = load_workbook(fichier, read_only=True, data_only=True)
+        lignes = wb.active.iter_rows(values_only=True)
+        entetes = [str(c) if c is not None else "" for c in next(lignes, [])]
+        morceau, numeros = [], []
+        for numero, ligne in enumerate(lignes, start=2):
+            morceau.append(ligne)
+            numeros.append(numero)
+            if len(morceau) == taille:
+                yield _renommer(_sans_lignes_vides(pd.DataFrame(morceau, columns=entetes, index=numeros)))
+                morceau, numeros = [], []
+        if morceau:
+            yield _renommer(_sans_lignes_vides(pd.DataFrame(morceau, columns=entetes, index=numeros)))
+        wb.close()
+    else:
+        # Séparateur deviné sur l'en-tête (";" pour un export Excel français, "," sinon)
+        entete = fichier.readline().decode("utf-8-sig", errors="ignore")
+        fichier.seek(0)
+        sep = ";" if entete.count(";") >= entete.count(",") else ","
+        # Lignes blanches gardées pour que l'index suive le fichier, puis écartées
+        for morceau in pd.read_csv(fichier, sep=sep, dtype=str, chunksize=taille, encoding="utf-8-sig", skip_blank_lines=False):
+            morceau.index = morceau.index + 2
+            yield _renommer(_sans_lignes_vides(morceau))
+
+
+def preparer_morceau(df, user_email):
+    """Un morceau brut -> (lignes DATA au schéma typé, erreurs). L'index de `df` = numéro de ligne du fichier."""
+    n = len(df)
+    vide = pd.Series([np.nan] * n, index=df.index)
+    col = lambda c: df[c] if c in df.columns else vide
+
+    types = col("Type").fillna("Autre").astype(str).str.strip().replace("", "Autre")
+    date_mission = dates(col("Date"))
+
+    # Net et date de paiement : colonnes fournies, sinon règles du type (voir paie.REGLES)
+    paie = calculer_paie(
+        types, nombres(col("Taux")), nombres(col("Heures")), nombres(col("Paniers")), date_mission,
+        charges_pct=nombres(col("Charges")),
+    ).set_index(df.index)
+    net = nombres(col("Net")).fillna(paie["Net"])
+    d_pay = dates(col("Date Paiement")).fillna(paie["Date Paiement"])
+
+    raisons = pd.Series("", index=df.index)
+    raisons = raisons.mask(~types.isin(TYPES_REVENUS), "Type inconnu")
+    raisons = raisons.mask(net.fillna(0) <= 0, "Montant nul ou illisible")
+    raisons = raisons.mask(date_mission.isna(), "Date illisible")
+    ok = raisons == ""
+
+    lignes = pd.DataFrame({
+        "User": user_email,
+        "Date": date_mission,
+        "Mois": mois_de(date_mission),
+        "Source": col("Source").fillna("").astype(str),
+        "Type": types,
+        "Détails": "Import",
+        "Montant Net": net.round(2),
+        "Date Paiement": d_pay,
+        "Mois Paiement": mois_de(d_pay),
+    })[ok]
+    lignes["ID"] = nouveaux_ids(len(lignes))
+
+    erreurs = pd.DataFrame({"Ligne": df.index.to_numpy(), "Raison": raisons.to_numpy()})[~ok.to_numpy()]
+    return ingerer_revenus(lignes), erreurs
+
+
+def importer(fichier, nom, user_email, taille=TAILLE_MORCEAU):
+    """Lit tout le fichier par morceaux. Retourne (revenus valides au schéma typé, erreurs)."""
+    valides, erreurs = [], []
+    for morceau in lire_par_morceaux(fichier, nom, taille):
+        ok, ko = preparer_morceau(morceau, user_email)
+        valides.append(ok)
+        erreurs.append(ko)
+    if not valides:
+        return ingerer_revenus([]), pd.DataFrame(columns=["Ligne", "Raison"])
+    return categoriser(pd.concat(valides, ignore_index=True), "DATA"), pd.concat(erreurs, ignore_index=True)
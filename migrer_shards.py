@@ -0,0 +1,36 @@
+"""Migration unique : découpe DATA / CHARGES / SOLDES en shards selon la config [storage] des secrets.
+
+Usage : python migrer_shards.py [.streamlit/secrets.toml] [--force]
+
+Refuse de tourner si l'annuaire ou des shards existent déjà : une seconde passe réécrirait les shards
+depuis les onglets d'origine et perdrait tout ce qui a été écrit depuis. --force pour passer outre.
+"""
+import argparse
+import sys
+import tomllib
+
+from quota import ClasseurPlanifie, Planificateur
+from storage import ShardRouter, migrer_vers_shards, ouvrir_classeur
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("secrets", nargs="?", default=".streamlit/secrets.toml")
+    parser.add_argument("--force", action="store_true", help="réécrit les shards existants depuis les onglets d'origine")
+    args = parser.parse_args()
+    with open(args.secrets, "rb") as f:
+        secrets = tomllib.load(f)
+
+    conf = secrets.get("storage", {})
+    # Beaucoup d'appels d'affilée : on reste sous le quota par minute (reprises sur 429)
+    sh = ClasseurPlanifie(ouvrir_classeur(secrets["gcp_service_account"]), Planificateur(debit=conf.get("quota_par_minute", 60) / 60))
+    router = ShardRouter(sh, mode=conf.get("sharding", "hash"), shards=conf.get("shards", 16))
+
+    try:
+        bilan = migrer_vers_shards(sh, router, force=args.force)
+    except ValueError as e:
+        sys.exit(f"❌ {e} (--force pour réécrire quand même)")
+    for table, onglets in bilan.items():
+        print(f"{table} : {sum(onglets.values())} lignes -> {len(onglets)} onglets")
+        for titre, n in sorted(onglets.items()):
+            print(f"  {titre} : {n}")
+    print("✅ Migration terminée. Activez [storage] sharding dans les secrets puis redémarrez l'app.")
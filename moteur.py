@@ -0,0 +1,399 @@
+"""Moteur de calcul SalaryFlow (sans Streamlit) : KPIs, timeline du mois, diagnostic du coach
+et projection multi-mois. Importable seul (numpy + pandas), par l'app comme par les traitements batch.
+
+Les tableaux d'entrée suivent le schéma canonique (voir schema.py) : montants en centimes int64,
+dates en datetime64. Les résultats sont rendus en euros.
+"""
+import numpy as np
+import pandas as pd
+
+COLONNES_TIMELINE = ["Jour", "Nom", "Type", "Montant", "Cumul"]
+
+
+def jours_paiement(dates):
+    """Jour du mois de chaque date, quel que soit le format (YYYY-MM-DD, DD/MM/YYYY, datetime). 1 si illisible."""
+    if pd.api.types.is_datetime64_any_dtype(dates):
+        return dates.dt.day.fillna(1).astype(int)
+    texte = dates.astype(str).str.strip()
+    jour = texte.str.extract(r'^\d{4}-\d{1,2}-(\d{1,2})', expand=False)          # YYYY-MM-DD
+    jour = jour.fillna(texte.str.extract(r'^(\d{1,2})/', expand=False))        # DD/MM/YYYY
+    return pd.to_numeric(jour, errors='coerce').fillna(1).astype(int)
+
+
+def build_timeline(df_revenus, df_charges, month, sim=0.0, index=None, solde_initial=0.0):
+    """Timeline du mois `month` ("YYYY-MM") : charges du mois, revenus payés ce mois-ci
+    et simulation éventuelle (le 15), triés par jour avec le cumul (à partir de `solde_initial`, en euros).
+    Avec un `IndexMensuel`, les revenus du mois sont pris directement (pas de filtre).
+    """
+    morceaux = []
+
+    # 1. CHARGES (on ne prend que celles qui ont un montant)
+    if df_charges is not None and not df_charges.empty and "Montant" in df_charges.columns:
+        c = df_charges[df_charges["Montant"] > 0]
+        morceaux.append(pd.DataFrame({
+            "Jour": c["Jour"].astype(int),
+            "Nom": c["Intitule"].astype(str),
+            "Type": "Charge",
+            "Montant": -c["Montant"],
+        }))
+
+    # 2. REVENUS PAYÉS DANS LE MOIS
+    if df_revenus is not None and not df_revenus.empty and "Mois Paiement" in df_revenus.columns:
+        if index is not None:
+            r = index.revenus(df_revenus, month)
+        else:
+            r = df_revenus[df_revenus["Mois Paiement"].astype(str) == month]
+        r = r[r["Montant Net"] > 0]
+        morceaux.append(pd.DataFrame({
+            "Jour": jours_paiement(r["Date Paiement"]),
+            "Nom": r["Source"].astype(str),
+            "Type": r["Type"].astype(str),
+            "Montant": r["Montant Net"],
+        }))
+
+    # 3. SIMULATION
+    if sim and sim > 0:
+        morceaux.append(pd.DataFrame({"Jour": [15], "Nom": ["Simulation"], "Type": ["Sim"], "Montant": [round(sim * 100)]}))
+
+    morceaux = [m for m in morceaux if not m.empty]
+    if not morceaux:
+        return pd.DataFrame(columns=COLONNES_TIMELINE)
+
+    # 4. TRI PAR JOUR (stable : charges puis revenus le même jour) + CUMUL (exact, en centimes)
+    df_tl = pd.concat(morceaux, ignore_index=True).sort_values("Jour", kind="stable", ignore_index=True)
+    cents = df_tl["Montant"].astype("int64")
+    df_tl["Montant"] = cents / 100
+    df_tl["Cumul"] = (cents.cumsum() + round(solde_initial * 100)) / 100
+    return df_tl[COLONNES_TIMELINE]
+
+
+def decaler_mois(mois, n):
+    """ "YYYY-MM" + n mois (arithmétique entière, sans Period)"""
+    a, m = divmod(int(mois[:4]) * 12 + int(mois[5:7]) - 1 + n, 12)
+    return f"{a:04d}-{m + 1:02d}"
+
+
+class IndexMensuel:
+    """Index construit une fois par chargement des données :
+    positions et totaux des revenus par `Mois Paiement`, totaux des charges par `Groupe`.
+    Changer de mois ou recalculer les KPIs ne rescane plus les tableaux.
+
+    Grand livre : à partir d'un solde réel saisi au 1er d'un mois (`ouvrir`), le solde d'ouverture
+    de chaque mois est calculé de proche en proche et gardé. Une modification sur un mois
+    n'efface que les soldes qui en dépendent.
+    """
+
+    def __init__(self, df_revenus, df_charges):
+        self.positions = {}   # mois -> np.array des positions (iloc) dans df_revenus
+        self.totaux = {}      # mois -> total Montant Net (centimes)
+        self.ouverture = None   # (mois, solde en centimes) saisi par l'utilisateur
+        self._soldes = {}       # mois -> solde d'ouverture calculé (centimes)
+        if df_revenus is not None and not df_revenus.empty and "Mois Paiement" in df_revenus.columns:
+            mois = df_revenus["Mois Paiement"].astype(str).to_numpy()
+            montants = pd.Series(df_revenus["Montant Net"].to_numpy())
+            groupes = montants.groupby(mois, sort=False)
+            self.positions = {m: np.asarray(pos) for m, pos in groupes.indices.items()}
+            self.totaux = groupes.sum().to_dict()
+        self.maj_charges(df_charges)
+
+    # --- LECTURE ---
+    def revenus(self, df_revenus, mois):
+        pos = self.positions.get(mois)
+        return df_revenus.iloc[pos] if pos is not None else df_revenus.iloc[0:0]
+
+    def total(self, mois):
+        """Total des revenus du mois, en euros"""
+        return int(self.totaux.get(mois, 0)) / 100
+
+    def charges(self, groupe):
+        """Total des charges du groupe, en euros"""
+        return int(self.groupes.get(groupe, 0)) / 100
+
+    def kpis(self, mois, sim=0.0):
+        """Entrées / sorties / solde / score du mois (en euros), comme sur le tableau de bord"""
+        entree_totale = self.total(mois) + sim
+        fixes, epargne, variables = self.charges("FIXES"), self.charges("EPARGNE"), self.charges("VARIABLES")
+        # Mêmes sorties que le grand livre (net) : toutes les charges, y compris hors de ces trois groupes
+        total_sorties = self.sorties / 100
+        solde = entree_totale - total_sorties
+        score = (entree_totale / fixes) if fixes > 0 else 0
+        return {
+            "entree_totale": entree_totale, "fixes": fixes, "epargne": epargne, "variables": variables,
+            "total_sorties": total_sorties, "solde": solde, "score": score,
+        }
+
+    # --- GRAND LIVRE ---
+    def ouvrir(self, mois, solde):
+        """Solde réel du compte au 1er de `mois` (centimes). None : pas de solde, chaque mois part de 0."""
+        self.ouverture = (mois, int(solde)) if mois else None
+        self._soldes = {}
+
+    def net(self, mois):
+        """Flux net du mois (centimes) : revenus payés dans le mois - charges (le solde de kpis, sans simulation)"""
+        return int(self.totaux.get(mois, 0)) - self.sorties
+
+    def solde_ouverture(self, mois):
+        """Solde au 1er de `mois` (centimes), depuis le mois déjà calculé le plus proche"""
+        if self.ouverture is None:
+            return 0
+        m0, s0 = self.ouverture
+        if mois in self._soldes:
+            return self._soldes[mois]
+        if mois >= m0:
+            # Vers l'avant : ouverture(m + 1) = ouverture(m) + net(m)
+            connus = [m for m in self._soldes if m0 <= m < mois]
+            m = max(connus, default=m0)
+            solde = self._soldes.get(m, s0)
+            while m < mois:
+                solde += self.net(m)
+                m = decaler_mois(m, 1)
+                self._soldes[m] = solde
+        else:
+            # Vers l'arrière : ouverture(m - 1) = ouverture(m) - net(m - 1)
+            connus = [m for m in self._soldes if mois < m <= m0]
+            m = min(connus, default=m0)
+            solde = self._soldes.get(m, s0)
+            while m > mois:
+                m = decaler_mois(m, -1)
+                solde -= self.net(m)
+                self._soldes[m] = solde
+        self._soldes.setdefault(m0, s0)
+        return self._soldes[mois]
+
+    def _invalider_soldes(self, mois=None):
+        """Le flux net de `mois` a changé (None : tous les mois) : on oublie les soldes qui en dépendent"""
+        if self.ouverture is None or mois is None:
+            self._soldes = {}
+            return
+        m0 = self.ouverture[0]
+        self._soldes = {m: v for m, v in self._soldes.items() if not (m0 <= mois < m or m <= mois < m0)}
+
+    # --- MISES À JOUR INCRÉMENTALES ---
+    def ajouter_revenu(self, position, mois, montant):
+        """Ligne ajoutée à la fin de df_revenus (position = len avant ajout, montant en centimes)"""
+        self.positions[mois] = np.append(self.positions.get(mois, np.empty(0, dtype=int)), position)
+        self.totaux[mois] = self.totaux.get(mois, 0) + montant
+        self._invalider_soldes(mois)
+
+    def modifier_revenu(self, position, ancien_mois, ancien_montant, mois, montant):
+        """Ligne corrigée sur place : montant et/ou mois de paiement (centimes)"""
+        self._invalider_soldes(ancien_mois)
+        self._invalider_soldes(mois)
+        self.totaux[ancien_mois] = self.totaux.get(ancien_mois, 0) - ancien_montant
+        if ancien_mois != mois:
+            self.positions[ancien_mois] = self.positions[ancien_mois][self.positions[ancien_mois] != position]
+            self.positions[mois] = np.sort(np.append(self.positions.get(mois, np.empty(0, dtype=int)), position))
+        self.totaux[mois] = self.totaux.get(mois, 0) + montant
+
+    def supprimer_revenu(self, position, mois, montant):
+        """Ligne retirée de df_revenus : les positions suivantes reculent d'un cran"""
+        self.totaux[mois] = self.totaux.get(mois, 0) - montant
+        self._invalider_soldes(mois)
+        for m, pos in self.positions.items():
+            pos = pos[pos != position]
+            self.positions[m] = pos - (pos > position)
+
+    def maj_charges(self, df_charges):
+        # Une poignée de lignes : on recalcule les totaux par Groupe (et les charges touchent tous les mois)
+        self.groupes = {}
+        self.sorties = 0   # charges de la timeline (montants > 0, tous groupes), chaque mois
+        if df_charges is not None and not df_charges.empty and "Montant" in df_charges.columns:
+            c = df_charges[df_charges["Montant"] > 0]
+            self.groupes = c["Montant"].groupby(c["Groupe"].astype(str).to_numpy()).sum().to_dict()
+            self.sorties = int(c["Montant"].sum())
+        self._invalider_soldes()
+
+
+def derniere_ouverture(df_soldes):
+    """(mois, solde en centimes) le plus récent saisi par l'utilisateur (onglet SOLDES typé), ou None"""
+    if df_soldes is None or df_soldes.empty:
+        return None
+    ligne = df_soldes.sort_values("Mois").iloc[-1]
+    return ligne["Mois"], int(ligne["Solde"])
+
+
+# --- DIAGNOSTIC DU COACH ---
+def date_tension(timeline_df):
+    """Premier jour où le cumul passe sous zéro (None si jamais)"""
+    if timeline_df is None or timeline_df.empty:
+        return None
+    negatif = timeline_df["Cumul"].to_numpy() < 0
+    return int(timeline_df["Jour"].to_numpy()[negatif.argmax()]) if negatif.any() else None
+
+
+ETATS = ["🔴 RISQUE DÉTECTÉ", "🟠 SITUATION FRAGILE", "🟢 SITUATION STABLE"]
+
+
+def niveau(solde, score):
+    """0 = risque, 1 = fragile, 2 = stable. Scalaires ou tableaux (un compte ou tous à la fois)."""
+    solde, score = np.asarray(solde), np.asarray(score)
+    return np.select([(score < 1) | (solde < 0), (score < 1.5) | (solde < 200)], [0, 1], 2)
+
+
+def analyser_situation(solde, score, timeline_df):
+    """(état, classe CSS, message, conseils) à partir du solde, du score et de la timeline du mois"""
+    n = int(niveau(solde, score))
+    if n == 0:
+        tension_date = date_tension(timeline_df)
+        msg = f"Tension le {tension_date}" if tension_date else "Déficit prévu"
+        return ETATS[0], "status-bad", msg, [f"❌ Manque : {abs(solde):.0f}€", "💪 Action : Travaillez plus", "✂️ Action : Coupez les variables"]
+    elif n == 1:
+        return ETATS[1], "status-warn", f"Marge faible ({solde:.0f}€)", ["⚠️ Attention aux imprévus", "🎯 Zéro écart ce mois-ci"]
+    else:
+        return ETATS[2], "status-ok", f"Marge : {solde:.0f}€", ["✅ Tout est vert", f"💰 Epargnez {solde*0.5:.0f}€"]
+
+
+def bilan_mois(df_revenus, df_charges, mois, sim=0.0, index=None, ouverture=None):
+    """Tout ce qu'affiche le tableau de bord pour un mois : KPIs, timeline, diagnostic du coach.
+    La timeline part du solde au 1er du mois tenu par le grand livre de `index` (ou ouvert sur `ouverture`)."""
+    if index is None:
+        index = IndexMensuel(df_revenus, df_charges)
+        index.ouvrir(*(ouverture or (None, 0)))
+    k = index.kpis(mois, sim)
+    debut = index.solde_ouverture(mois) / 100
+    timeline = build_timeline(df_revenus, df_charges, mois, sim, index=index, solde_initial=debut)
+    etat, css, message, conseils = analyser_situation(k["solde"], k["score"], timeline)
+    return {
+        **k, "debut": debut, "timeline": timeline, "etat": etat, "css": css, "message": message,
+        "conseils": conseils, "tension": date_tension(timeline),
+    }
+
+
+def _index_mois(mois_paiement, debut):
+    """Décalage en mois entre chaque "YYYY-MM" et `debut` (pd.Period). -1 si illisible."""
+    texte = mois_paiement.astype(str).str.strip()
+    annee = pd.to_numeric(texte.str.slice(0, 4), errors='coerce')
+    mois = pd.to_numeric(texte.str.slice(5, 7), errors='coerce')
+    idx = (annee * 12 + mois) - (debut.year * 12 + debut.month)
+    return idx.fillna(-1).astype(int).to_numpy()
+
+
+def projeter(df_revenus, df_charges, debut, n_mois=12, solde_initial=None):
+    """Projection sur `n_mois` à partir de `debut` ("YYYY-MM") en un seul passage NumPy.
+
+    Sans `solde_initial`, chaque mois part de 0. Avec un solde au 1er de `debut` (euros),
+    les mois s'enchaînent : chaque mois démarre au solde de clôture du précédent.
+
+    Les charges se répètent chaque mois à leur `Jour` (ramené au dernier jour des mois courts),
+    les revenus tombent dans leur `Mois Paiement`. Retourne deux DataFrames indexés par mois :
+    - soldes : mois x jours (1..31), cumul de fin de journée (NaN après la fin du mois)
+    - resume : Entrées, Sorties, Solde et Tension (premier jour où le solde passe sous zéro ; dans la
+      journée les charges passent avant les revenus, comme dans `build_timeline`)
+    """
+    debut = pd.Period(debut, freq="M")
+    periodes = pd.period_range(debut, periods=n_mois, freq="M")
+    nb_jours = periodes.days_in_month.to_numpy()
+    lignes = np.arange(n_mois)
+    flux = np.zeros((n_mois, 31), dtype=np.int64)   # centimes
+    arrivees = np.zeros((n_mois, 31), dtype=np.int64)
+
+    # 1. CHARGES : mêmes montants chaque mois
+    sorties = 0
+    if df_charges is not None and not df_charges.empty and "Montant" in df_charges.columns:
+        m = df_charges["Montant"].to_numpy(dtype=np.int64)
+        j = df_charges["Jour"].clip(1, 31).to_numpy(dtype=np.int64)
+        m, j = m[m > 0], j[m > 0]
+        jour = np.minimum(j[None, :], nb_jours[:, None]) - 1
+        np.add.at(flux, (np.repeat(lignes, len(m)), jour.ravel()), np.tile(-m, n_mois))
+        sorties = m.sum()
+
+    # 2. REVENUS : placés dans leur mois de paiement
+    entrees = np.zeros(n_mois, dtype=np.int64)
+    if df_revenus is not None and not df_revenus.empty and "Mois Paiement" in df_revenus.columns:
+        m = df_revenus["Montant Net"].to_numpy(dtype=np.int64)
+        idx = _index_mois(df_revenus["Mois Paiement"], debut)
+        ok = (idx >= 0) & (idx < n_mois) & (m > 0)
+        idx, m = idx[ok], m[ok]
+        jour = np.clip(jours_paiement(df_revenus["Date Paiement"]).to_numpy()[ok], 1, 31)
+        jour = np.minimum(jour, nb_jours[idx]) - 1
+        np.add.at(arrivees, (idx, jour), m)
+        flux += arrivees
+        entrees = np.bincount(idx, weights=m, minlength=n_mois).round().astype(np.int64)
+
+    # 3. CUMUL JOUR PAR JOUR (reporté d'un mois sur l'autre) + DÉTECTION DE LA TENSION
+    cumul = flux.cumsum(axis=1)
+    if solde_initial is not None:
+        net = cumul[:, -1]
+        cumul += (round(solde_initial * 100) + np.concatenate(([0], net.cumsum()[:-1])))[:, None]
+    soldes = cumul / 100
+    hors_mois = np.arange(31)[None, :] >= nb_jours[:, None]
+    soldes[hors_mois] = np.nan
+    # Point bas de la journée : après les charges, avant les revenus du jour
+    negatif = (np.minimum(cumul - arrivees, cumul) < 0) & ~hors_mois
+    tension = np.where(negatif.any(axis=1), negatif.argmax(axis=1) + 1, np.nan)
+
+    index = pd.Index(periodes.strftime("%Y-%m"), name="Mois")
+    resume = pd.DataFrame({
+        "Entrées": entrees / 100,
+        "Sorties": np.full(n_mois, sorties / 100),
+        "Solde": (entrees - sorties) / 100,
+        "Tension": tension,
+    }, index=index)
+    if solde_initial is not None:
+        resume["Clôture"] = cumul[:, -1] / 100
+    return pd.DataFrame(soldes, index=index, columns=range(1, 32)), resume
+
+
+def scenarios(df_revenus, df_charges, mois, montants=(0.0,), jours=(15,), coupes_variables=(0,), sans_epargne=(False,), index=None, solde_initial=0.0):
+    """Grille de scénarios « et si » sur le mois `mois` ("YYYY-MM"), évaluée en un seul passage NumPy.
+
+    Chaque scénario combine un revenu en plus (en euros, versé le `jour`), une baisse des VARIABLES
+    (en %) et un mois avec ou sans EPARGNE. Retourne un DataFrame, un scénario par ligne :
+    Entrées, Sorties, Solde, Score, Tension, Point bas (cumul minimum, depuis `solde_initial`) et Etat.
+    Le scénario (0 €, 0 %, épargne versée) redonne exactement le tableau de bord du mois.
+    """
+    if index is None:
+        index = IndexMensuel(df_revenus, df_charges)
+
+    # 1. LA GRILLE : toutes les combinaisons, à plat
+    grille = np.meshgrid(
+        np.asarray(montants, dtype=float), np.asarray(jours, dtype=np.int64),
+        np.asarray(coupes_variables, dtype=float), np.asarray(sans_epargne, dtype=bool), indexing="ij",
+    )
+    montant, jour, coupe, sans_ep = (g.ravel() for g in grille)
+    n = len(montant)
+    extra = np.rint(montant * 100).astype(np.int64)
+    garde_var = 1 - coupe / 100
+
+    # 2. FLUX DU MOIS PAR JOUR (index 1..31, centimes), comme dans build_timeline
+    flux = {g: np.zeros(32, dtype=np.int64) for g in ("FIXES", "VARIABLES", "EPARGNE", "AUTRES")}
+    if df_charges is not None and not df_charges.empty and "Montant" in df_charges.columns:
+        c = df_charges[df_charges["Montant"] > 0]
+        groupe = c["Groupe"].astype(str).to_numpy()
+        for g in flux:
+            sel = ~np.isin(groupe, ["FIXES", "VARIABLES", "EPARGNE"]) if g == "AUTRES" else groupe == g
+            np.add.at(flux[g], np.clip(c["Jour"].to_numpy(dtype=np.int64)[sel], 1, 31), c["Montant"].to_numpy(dtype=np.int64)[sel])
+    revenus = np.zeros(32, dtype=np.int64)
+    if df_revenus is not None and not df_revenus.empty and "Mois Paiement" in df_revenus.columns:
+        r = index.revenus(df_revenus, mois)
+        r = r[r["Montant Net"] > 0]
+        np.add.at(revenus, jours_paiement(r["Date Paiement"]).clip(1, 31).to_numpy(), r["Montant Net"].to_numpy(dtype=np.int64))
+
+    # 3. CUMUL JOUR PAR JOUR POUR CHAQUE SCÉNARIO (S x 32)
+    charges = (
+        (flux["FIXES"] + flux["AUTRES"])[None, :]
+        + np.rint(flux["VARIABLES"][None, :] * garde_var[:, None]).astype(np.int64)
+        + flux["EPARGNE"][None, :] * (~sans_ep)[:, None]
+    )
+    entrees_jour = np.broadcast_to(revenus, (n, 32)).copy()
+    np.add.at(entrees_jour, (np.arange(n), np.clip(jour, 1, 31)), extra)
+    fin_jour = (entrees_jour - charges).cumsum(axis=1) + round(solde_initial * 100)
+    # Dans la journée, les charges passent avant les revenus : le point bas est après les charges (ou en fin de journée)
+    bas = np.minimum(fin_jour - entrees_jour, fin_jour)[:, 1:]
+    negatif = bas < 0
+    tension = np.where(negatif.any(axis=1), negatif.argmax(axis=1) + 1, np.nan)
+
+    # 4. KPIs (mêmes totaux que IndexMensuel.kpis, en centimes)
+    fixes = int(index.groupes.get("FIXES", 0))
+    variables = int(index.groupes.get("VARIABLES", 0))
+    epargne = int(index.groupes.get("EPARGNE", 0))
+    entree_totale = int(index.totaux.get(mois, 0)) + extra
+    sorties = index.sorties - (variables - np.rint(variables * garde_var).astype(np.int64)) - epargne * sans_ep
+    solde = (entree_totale - sorties) / 100
+    score = entree_totale / fixes if fixes > 0 else np.zeros(n)
+    return pd.DataFrame({
+        "Montant": montant, "Jour": jour, "Coupe variables": coupe, "Sans épargne": sans_ep,
+        "Entrées": entree_totale / 100, "Sorties": sorties / 100, "Solde": solde, "Score": score,
+        "Tension": tension, "Point bas": bas.min(axis=1) / 100,
+        "Etat": np.asarray(ETATS)[niveau(solde, score)],
+    })
@@ -0,0 +1,72 @@
+"""Moteur de paie : net à payer et date de paiement, calculés par lots à partir d'une table de règles."""
+import numpy as np
+import pandas as pd
+
+from schema import nombres
+
+# Une ligne par type de contrat :
+# - majoration : IFM + CP appliqués au brut (Intérim : 10 % + 10 % -> x1.21)
+# - charges    : taux de charges sociales (%) par défaut, remplaçable ligne à ligne
+# - delai      : "mois_suivant" (payé le N du mois suivant), "jours" (N jours après), "immediat"
+REGLES = pd.DataFrame(
+    [
+        ("Intérim",          1.21, 22.0, "mois_suivant", 12),
+        ("Micro-Entreprise", 1.00, 21.2, "jours",        30),
+        ("Salaire",          1.00, 0.0,  "immediat",     0),
+        ("Chomâge",          1.00, 0.0,  "immediat",     0),
+        ("APL",              1.00, 0.0,  "immediat",     0),
+        ("Prime d'activité", 1.00, 0.0,  "immediat",     0),
+        ("Remboursements",   1.00, 0.0,  "immediat",     0),
+        ("Autre",            1.00, 0.0,  "immediat",     0),
+    ],
+    columns=["Type", "majoration", "charges", "delai", "delai_valeur"],
+).set_index("Type")
+
+TYPES_REVENUS = list(REGLES.index)
+
+
+def _regles_par_ligne(types, regles):
+    """Position de la règle de chaque ligne (type inconnu -> règle "Autre")"""
+    idx = regles.index.get_indexer(pd.Index(np.asarray(types, dtype=object)))
+    return np.where(idx < 0, regles.index.get_loc("Autre"), idx)
+
+
+def calculer_paie(types, taux, heures, paniers, dates_mission, charges_pct=None, regles=REGLES):
+    """Net (euros, arrondi au centime) et date de paiement pour des tableaux entiers de missions.
+
+    net = taux x heures x majoration x (1 - charges %) + paniers
+    `charges_pct` (optionnel) remplace le taux de la règle là où il n'est pas NaN.
+    """
+    r = _regles_par_ligne(types, regles)
+    t, h, p = (np.nan_to_num(np.asarray(x, dtype=float)) for x in (taux, heures, paniers))
+    pct = regles["charges"].to_numpy()[r]
+    if charges_pct is not None:
+        pct = np.where(np.isnan(np.asarray(charges_pct, dtype=float)), pct, np.asarray(charges_pct, dtype=float))
+    net = np.round(t * h * regles["majoration"].to_numpy()[r] * (1 - pct / 100.0) + p, 2)
+
+    # Dates de paiement : les trois règles calculées en bloc, puis choix ligne à ligne
+    d = pd.DatetimeIndex(pd.to_datetime(np.asarray(dates_mission)))
+    valeur = regles["delai_valeur"].to_numpy()[r]
+    delai = regles["delai"].to_numpy()[r]
+    mois_suivant = (d.to_period("M") + 1).to_timestamp() + pd.to_timedelta(valeur - 1, unit="D")
+    apres_n_jours = d + pd.to_timedelta(valeur, unit="D")
+    d_pay = np.select(
+        [delai == "mois_suivant", delai == "jours"],
+        [mois_suivant.to_numpy(), apres_n_jours.to_numpy()],
+        default=d.to_numpy(),
+    )
+    return pd.DataFrame({"Net": net, "Date Paiement": pd.to_datetime(d_pay)})
+
+
+def calculer_net(type_c, taux, heures, paniers, charges_pct=None):
+    """Version unitaire pour le formulaire de saisie (accepte "12,50"). Retourne un NOMBRE pur."""
+    valeurs = nombres(pd.Series([taux, heures, paniers, charges_pct], dtype=object))
+    t, h, p, pct = valeurs.tolist()
+    res = calculer_paie([type_c], [t], [h], [p], [pd.NaT], charges_pct=[pct])
+    return float(res["Net"].iloc[0])
+
+
+def date_paiement(type_c, date_mission):
+    """Date de paiement prévue par la règle du type (ex. Intérim : le 12 du mois suivant)"""
+    res = calculer_paie([type_c], [0], [0], [0], [pd.Timestamp(date_mission)])
+    return res["Date Paiement"].iloc[0].to_pydatetime()
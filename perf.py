@@ -0,0 +1,141 @@
+"""Instrumentation : spans (durées), compteurs (appels API, octets) par rerun, journal JSON.
+
+Chaque rerun Streamlit ouvre un `Run` attaché au thread courant : les spans et compteurs
+enregistrés pendant ce run (y compris depuis les threads qui l'ont rattaché) s'y accumulent,
+en plus des totaux globaux. `fin_run` écrit une ligne JSON sur le logger "salaryflow.perf".
+"""
+import functools
+import json
+import logging
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+MAX_SPANS = 500
+
+log = logging.getLogger("salaryflow.perf")
+
+_lock = threading.Lock()
+_spans = deque(maxlen=MAX_SPANS)
+_compteurs = Counter()
+_local = threading.local()
+
+
+class Run:
+    """Un rerun : spans et compteurs de cette exécution du script"""
+
+    def __init__(self, **attributs):
+        self.attributs = attributs
+        self.debut = time.time()
+        self.derniere_activite = self.debut
+        self.spans = []
+        self.compteurs = Counter()
+        self.clos = False
+        self.lock = threading.Lock()
+
+    def resume(self):
+        with self.lock:
+            return {
+                **self.attributs,
+                "debut": self.debut,
+                "duree": self.derniere_activite - self.debut,
+                "spans": [{"nom": s["nom"], "duree": round(s["duree"], 6)} for s in self.spans],
+                "compteurs": dict(self.compteurs),
+            }
+
+
+# --- 1. RUNS ---
+def debut_run(**attributs):
+    run = Run(**attributs)
+    _local.run = run
+    return run
+
+
+def attacher(run):
+    """À appeler dans un thread de travail pour que ses mesures comptent dans `run`"""
+    _local.run = run
+
+
+def run_courant():
+    return getattr(_local, "run", None)
+
+
+def fin_run(run=None, **attributs):
+    """Clôt le run (celui du thread par défaut), écrit la ligne JSON et retourne le résumé"""
+    run = run or run_courant()
+    if run is None or run.clos:
+        return None
+    run.clos = True
+    run.attributs.update(attributs)
+    if not attributs.get("interrompu"):
+        run.derniere_activite = time.time()   # sinon : fin = dernière mesure (le reste est de l'attente)
+    if getattr(_local, "run", None) is run:
+        _local.run = None
+    resume = run.resume()
+    log.info(json.dumps(resume, ensure_ascii=False, default=str))
+    return resume
+
+
+# --- 2. MESURES ---
+@contextmanager
+def span(nom, **attributs):
+    """with span("chargement.DATA", user=...): ... -> durée enregistrée, même en cas d'exception"""
+    debut = time.perf_counter()
+    try:
+        yield
+    finally:
+        enregistrer(nom, time.perf_counter() - debut, **attributs)
+
+
+def mesure(nom):
+    """Décorateur : chaque appel de la fonction est un span `nom`"""
+    def decorateur(fn):
+        @functools.wraps(fn)
+        def enveloppe(*args, **kwargs):
+            with span(nom):
+                return fn(*args, **kwargs)
+        return enveloppe
+    return decorateur
+
+
+def enregistrer(nom, duree, **attributs):
+    s = {"nom": nom, "duree": duree, "fin": time.time(), "thread": threading.current_thread().name, **attributs}
+    with _lock:
+        _spans.append(s)
+    run = run_courant()
+    if run is not None:
+        with run.lock:
+            run.spans.append(s)
+            run.derniere_activite = s["fin"]
+
+
+def compter(nom, n=1):
+    with _lock:
+        _compteurs[nom] += n
+    run = run_courant()
+    if run is not None:
+        with run.lock:
+            run.compteurs[nom] += n
+            run.derniere_activite = time.time()
+
+
+def suivre_http(session):
+    """Compte requêtes HTTP et octets reçus d'une session `requests` (celle du client gspread)"""
+    def _reponse(reponse, *args, **kwargs):
+        compter("http.requetes")
+        compter("http.octets", len(reponse.content or b""))
+    session.hooks.setdefault("response", []).append(_reponse)
+
+
+# --- 3. LECTURE ---
+def spans(prefixe="", **filtres):
+    """Derniers spans (du plus ancien au plus récent) dont le nom commence par `prefixe`"""
+    with _lock:
+        copie = list(_spans)
+    return [s for s in copie if s["nom"].startswith(prefixe) and all(s.get(k) == v for k, v in filtres.items())]
+
+
+def compteurs():
+    with _lock:
+        return dict(_compteurs)
@@ -0,0 +1,157 @@
+"""Accès Google Sheets sous quota : limiteur à jetons partagé, reprises avec backoff, onglets en cache.
+
+Le classeur gspread est enveloppé une fois (voir ClasseurPlanifie) : tous les appels qui partent
+vers l'API, quelle que soit la session, passent par le même Planificateur.
+"""
+import random
+import threading
+import time
+
+import requests
+from gspread.exceptions import APIError
+
+import perf
+
+# 429 = quota par minute dépassé, 5xx = incident passager côté Google
+CODES_REESSAYABLES = {429, 500, 502, 503, 504}
+# Appels qui ajoutent ou suppriment des lignes : sur une 5xx, Google a peut-être déjà appliqué la requête.
+# On ne les rejoue que sur 429 (requête refusée avant traitement) pour ne pas créer de doublons
+# ni supprimer deux fois (batch_update du classeur = deleteDimension : les lignes suivantes ont remonté).
+NON_IDEMPOTENTS = {"append_row", "append_rows", "add_worksheet", "insert_row", "insert_rows", "delete_rows", "batch_update_classeur"}
+
+
+class TokenBucket:
+    """Seau à jetons : `debit` requêtes par seconde en régime établi, rafales jusqu'à `capacite`"""
+
+    def __init__(self, debit=1.0, capacite=10):
+        self.debit = float(debit)
+        self.capacite = float(capacite)
+        self.jetons = float(capacite)
+        self.dernier = time.monotonic()
+        self.lock = threading.Lock()
+
+    def prendre(self):
+        """Bloque jusqu'à obtenir un jeton. Retourne le temps d'attente (s)."""
+        attente_totale = 0.0
+        while True:
+            with self.lock:
+                maintenant = time.monotonic()
+                self.jetons = min(self.capacite, self.jetons + (maintenant - self.dernier) * self.debit)
+                self.dernier = maintenant
+                if self.jetons >= 1:
+                    self.jetons -= 1
+                    return attente_totale
+                attente = (1 - self.jetons) / self.debit
+            time.sleep(attente)
+            attente_totale += attente
+
+
+class Planificateur:
+    """Exécute les appels gspread sous le seau à jetons, avec reprises (backoff exponentiel + jitter)
+    sur 429 / 5xx / coupure réseau, et tient des métriques par type d'appel.
+    """
+
+    def __init__(self, debit=1.0, capacite=10, max_essais=6, base=1.0, plafond=32.0):
+        self.seau = TokenBucket(debit, capacite)
+        self.max_essais = max_essais
+        self.base = base
+        self.plafond = plafond
+        self.lock = threading.Lock()
+        self._metriques = {}   # nom -> {appels, reprises, echecs, attente, latence, latence_max}
+
+    def _noter(self, nom, **valeurs):
+        with self.lock:
+            m = self._metriques.setdefault(nom, {"appels": 0, "reprises": 0, "echecs": 0, "attente": 0.0, "latence": 0.0, "latence_max": 0.0})
+            for cle, v in valeurs.items():
+                m[cle] = max(m[cle], v) if cle == "latence_max" else m[cle] + v
+
+    def _reessayable(self, nom, erreur):
+        if isinstance(erreur, APIError):
+            return erreur.code == 429 or (erreur.code in CODES_REESSAYABLES and nom not in NON_IDEMPOTENTS)
+        return nom not in NON_IDEMPOTENTS
+
+    def executer(self, nom, fn, *args, **kwargs):
+        for essai in range(1, self.max_essais + 1):
+            self._noter(nom, attente=self.seau.prendre())
+            debut = time.monotonic()
+            try:
+                resultat = fn(*args, **kwargs)
+            except (APIError, requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                duree = time.monotonic() - debut
+                if essai == self.max_essais or not self._reessayable(nom, e):
+                    self._noter(nom, appels=1, echecs=1, latence=duree, latence_max=duree)
+                    perf.compter(f"api.{nom}")
+                    raise
+                self._noter(nom, reprises=1, latence=duree)
+                perf.compter("api.reprises")
+                time.sleep(min(self.plafond, self.base * 2 ** (essai - 1)) * random.uniform(0.5, 1.0))
+                continue
+            duree = time.monotonic() - debut
+            self._noter(nom, appels=1, latence=duree, latence_max=duree)
+            perf.compter(f"api.{nom}")
+            return resultat
+
+    def stats(self):
+        """Métriques par type d'appel (temps en secondes, latence moyenne incluse)"""
+        with self.lock:
+            stats = {nom: {**m, "latence_moy": m["latence"] / m["appels"] if m["appels"] else 0.0} for nom, m in self._metriques.items()}
+        return stats
+
+
+class _Planifie:
+    """Proxy : chaque méthode de l'objet gspread enveloppé passe par le planificateur"""
+
+    def __init__(self, cible, planificateur):
+        self._cible = cible
+        self._plan = planificateur
+
+    def __getattr__(self, nom):
+        if nom.startswith("_"):
+            raise AttributeError(nom)
+        attr = getattr(self._cible, nom)
+        if not callable(attr):
+            return attr
+        return lambda *args, **kwargs: self._plan.executer(nom, attr, *args, **kwargs)
+
+
+class OngletPlanifie(_Planifie):
+    pass
+
+
+class ClasseurPlanifie(_Planifie):
+    """gspread.Spreadsheet sous quota, avec les poignées d'onglets en cache (plus d'appel `worksheet` à chaque lecture)"""
+
+    def __init__(self, sh, planificateur):
+        super().__init__(sh, planificateur)
+        self._onglets = {}
+        self._lock = threading.Lock()
+
+    def _garder(self, ws):
+        onglet = OngletPlanifie(ws, self._plan)
+        with self._lock:
+            self._onglets[ws.title] = onglet
+        return onglet
+
+    def worksheet(self, titre):
+        with self._lock:
+            onglet = self._onglets.get(titre)
+        if onglet is not None:
+            return onglet
+        # WorksheetNotFound n'est pas une APIError : elle remonte telle quelle à l'appelant
+        return self._garder(self._plan.executer("worksheet", self._cible.worksheet, titre))
+
+    def add_worksheet(self, titre, *args, **kwargs):
+        return self._garder(self._plan.executer("add_worksheet", self._cible.add_worksheet, titre, *args, **kwargs))
+
+    def worksheets(self, *args, **kwargs):
+        return [self._garder(ws) for ws in self._plan.executer("worksheets", self._cible.worksheets, *args, **kwargs)]
+
+    def batch_update(self, corps):
+        # Même nom que le batch_update (valeurs) des onglets, qui lui peut être rejoué : métrique à part
+        return self._plan.executer("batch_update_classeur", self._cible.batch_update, corps)
+
+    def del_worksheet(self, onglet):
+        ws = onglet._cible if isinstance(onglet, OngletPlanifie) else onglet
+        with self._lock:
+            self._onglets.pop(ws.title, None)
+        return self._plan.executer("del_worksheet", self._cible.del_worksheet, ws)
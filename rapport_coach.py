@@ -0,0 +1,91 @@
+"""Rapport du coach pour tous les comptes : état du mois (🔴/🟠/🟢), solde, score et date de tension.
+
+Usage : python rapport_coach.py [--mois YYYY-MM] [--secrets .streamlit/secrets.toml] [--workers N] [--sortie rapport.csv]
+
+Les tables sont lues une fois (StorageBackend.lire_tout), puis les comptes sont répartis par lots
+sur un pool de processus. Le calcul est celui du tableau de bord (moteur.bilan_mois), sans Streamlit,
+depuis le solde réel du compte quand l'utilisateur en a saisi un (onglet SOLDES).
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+import tomllib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from moteur import bilan_mois, derniere_ouverture
+from quota import ClasseurPlanifie, Planificateur
+from schema import ingerer_charges, ingerer_revenus, ingerer_soldes
+from storage import GoogleSheetsStorage, SQLiteStorage, ShardRouter, ouvrir_classeur
+
+TAILLE_LOT = 200
+COLONNES_RAPPORT = ["User", "Mois", "Etat", "Entrées", "Sorties", "Solde", "Score", "Tension"]
+
+
+def ouvrir(secrets):
+    """Même choix de moteur que l'app ([storage] des secrets)"""
+    conf = secrets.get("storage", {})
+    if conf.get("backend") == "sqlite":
+        return SQLiteStorage(conf.get("sqlite_path", "salaryflow.db"))
+    sh = ClasseurPlanifie(ouvrir_classeur(secrets["gcp_service_account"]), Planificateur(debit=conf.get("quota_par_minute", 60) / 60))
+    router = ShardRouter(sh, mode=conf["sharding"], shards=conf.get("shards", 16)) if conf.get("sharding") else None
+    return GoogleSheetsStorage(sh, router)
+
+
+def par_utilisateur(df):
+    return {str(user): g.reset_index(drop=True) for user, g in df.groupby("User", observed=True, sort=False)}
+
+
+def bilans_lot(lot, mois):
+    """Exécuté dans un processus du pool : [(user, revenus, charges, ouverture)] -> lignes du rapport"""
+    lignes = []
+    for user, df_r, df_c, ouverture in lot:
+        b = bilan_mois(df_r, df_c, mois, ouverture=ouverture)
+        lignes.append({
+            "User": user, "Mois": mois, "Etat": b["etat"],
+            "Entrées": round(b["entree_totale"], 2), "Sorties": round(b["total_sorties"], 2),
+            "Solde": round(b["solde"], 2), "Score": round(b["score"], 2),
+            "Tension": b["tension"] if b["tension"] is not None else "",
+        })
+    return lignes
+
+
+def rapport(db, mois, workers=None, taille_lot=TAILLE_LOT):
+    # Toute la table typée en une seule passe (et pas partition par partition)
+    revenus = par_utilisateur(ingerer_revenus(db.lire_tout("DATA")))
+    charges = par_utilisateur(ingerer_charges(db.lire_tout("CHARGES")))
+    ouvertures = {u: derniere_ouverture(df) for u, df in par_utilisateur(ingerer_soldes(db.lire_tout("SOLDES"))).items()}
+    vide_r, vide_c = ingerer_revenus([]), ingerer_charges([])
+    comptes = [(u, revenus.get(u, vide_r), charges.get(u, vide_c), ouvertures.get(u)) for u in sorted(set(revenus) | set(charges)) if u]
+    lots = [comptes[i:i + taille_lot] for i in range(0, len(comptes), taille_lot)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return [ligne for lignes in pool.map(bilans_lot, lots, [mois] * len(lots)) for ligne in lignes]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mois", default=datetime.now().strftime("%Y-%m"))
+    parser.add_argument("--secrets", default=".streamlit/secrets.toml")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--sortie", help="fichier CSV (sinon sortie standard)")
+    args = parser.parse_args()
+
+    with open(args.secrets, "rb") as f:
+        secrets = tomllib.load(f)
+
+    debut = time.perf_counter()
+    lignes = rapport(ouvrir(secrets), args.mois, args.workers)
+
+    sortie = open(args.sortie, "w", newline="", encoding="utf-8") if args.sortie else sys.stdout
+    w = csv.DictWriter(sortie, fieldnames=COLONNES_RAPPORT, delimiter=";")
+    w.writeheader()
+    w.writerows(lignes)
+    if args.sortie:
+        sortie.close()
+
+    etats = Counter(l["Etat"] for l in lignes)
+    print(f"✅ {len(lignes)} comptes en {time.perf_counter() - debut:.1f}s : "
+          + ", ".join(f"{e} {n}" for e, n in sorted(etats.items())), file=sys.stderr)
@@ -0,0 +1,130 @@
+"""Schéma canonique : chaque onglet est parsé UNE fois à l'ingestion, puis tout le monde
+travaille sur des colonnes typées (montants en centimes int64, dates datetime64, catégories).
+"""
+import pandas as pd
+
+from storage import COLONNES_REVENUS, COLONNES_CHARGES, COLONNES_SOLDES
+
+MONTANT = {"DATA": "Montant Net", "CHARGES": "Montant", "SOLDES": "Solde"}
+CATEGORIES = {"DATA": ["User", "Source", "Type"], "CHARGES": ["User", "Groupe"], "SOLDES": ["User"]}
+DATES = {"DATA": ["Date", "Date Paiement"], "CHARGES": [], "SOLDES": []}
+COLONNES = {"DATA": COLONNES_REVENUS, "CHARGES": COLONNES_CHARGES, "SOLDES": COLONNES_SOLDES}
+
+
+def nombres(serie):
+    """Nombres saisis à la française ("'12,50", "1 200,5"...) -> float64. Illisible -> NaN."""
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie.astype(float)
+    # On vire tout sauf chiffres, points, virgules et signes, puis virgule -> point
+    texte = serie.astype(str).str.replace(r'[^\d.,+-]', '', regex=True).str.replace(',', '.', regex=False)
+    return pd.to_numeric(texte, errors='coerce').astype(float)
+
+
+def centimes(serie):
+    """Montants en euros (nombre, ou texte type "'12,50") -> centimes int64. Illisible -> 0."""
+    return (nombres(serie) * 100).round().fillna(0).astype("int64")
+
+
+def euros(serie):
+    return serie.astype("int64") / 100.0
+
+
+def dates(serie):
+    """Dates mixtes "YYYY-MM-DD" / "DD/MM/YYYY" (ou déjà des dates) -> datetime64. Illisible -> NaT."""
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie.astype("datetime64[ns]")
+    if serie.dtype == object and serie.map(lambda v: hasattr(v, "year")).all():
+        return pd.to_datetime(serie, errors='coerce').astype("datetime64[ns]")
+    texte = serie.astype(str).str.strip()
+    iso = pd.to_datetime(texte.str.slice(0, 10), format="%Y-%m-%d", errors='coerce')
+    fr = pd.to_datetime(texte.str.slice(0, 10), format="%d/%m/%Y", errors='coerce')
+    return iso.fillna(fr).astype("datetime64[ns]")
+
+
+def mois_de(serie):
+    """datetime64 -> "YYYY-MM" (vectorisé, "" si NaT)"""
+    mois = pd.Series(serie.to_numpy().astype("datetime64[M]").astype(str), index=serie.index)
+    return mois.where(serie.notna(), "")
+
+
+def texte(serie):
+    """Colonne -> texte, les valeurs manquantes devenant "" (et pas "nan")"""
+    return serie.astype(object).where(serie.notna(), "").astype(str)
+
+
+def categoriser(df, table):
+    for col in CATEGORIES[table]:
+        if col in df.columns:
+            df[col] = texte(df[col]).astype("category")
+    return df
+
+
+def _ingerer(data, table, filtrer):
+    df = pd.DataFrame(data)
+    if df.empty:
+        df = pd.DataFrame(columns=COLONNES[table])
+    else:
+        df = df.copy()
+    for col in COLONNES[table]:
+        if col not in df.columns:
+            df[col] = ""
+
+    col_montant = MONTANT[table]
+    df[col_montant] = centimes(df[col_montant])
+    for col in DATES[table]:
+        df[col] = dates(df[col])
+    df["ID"] = texte(df["ID"])
+    if filtrer:
+        # Nettoyage final : on vire les lignes vides ou à zéro
+        df = df[df[col_montant] > 0]
+    return categoriser(df.reset_index(drop=True), table)
+
+
+def ingerer_revenus(data, filtrer=True):
+    """Onglet DATA (liste de dicts ou DataFrame) -> schéma typé"""
+    df = _ingerer(data, "DATA", filtrer)
+    # Mois Paiement toujours au format "YYYY-MM" (recalculé depuis la date si besoin)
+    mois = texte(df["Mois Paiement"]).str.strip().str.slice(0, 7)
+    df["Mois Paiement"] = mois.where(mois.str.match(r'^\d{4}-\d{2}$'), mois_de(df["Date Paiement"]))
+    return df
+
+
+def ingerer_charges(data, filtrer=False):
+    """Onglet CHARGES -> schéma typé (Jour entier, 1 par défaut)"""
+    df = _ingerer(data, "CHARGES", filtrer)
+    df["Jour"] = pd.to_numeric(df["Jour"], errors='coerce').fillna(1).astype("int64")
+    return df
+
+
+def ingerer_soldes(data):
+    """Onglet SOLDES -> schéma typé (Solde en centimes, signé ; Mois "YYYY-MM", lignes illisibles écartées)"""
+    df = _ingerer(data, "SOLDES", filtrer=False)
+    df["Mois"] = texte(df["Mois"]).str.strip().str.slice(0, 7)
+    return df[df["Mois"].str.match(r'^\d{4}-\d{2}$')].reset_index(drop=True)
+
+
+def pour_editeur(df, table):
+    """Copie affichable dans st.data_editor : euros, texte libre à la place des catégories"""
+    df = df.copy()
+    df[MONTANT[table]] = euros(df[MONTANT[table]])
+    for col in CATEGORIES[table]:
+        if col in df.columns:
+            df[col] = texte(df[col])
+    return df
+
+
+def _date_texte(serie, fmt):
+    return serie.dt.strftime(fmt).fillna("")
+
+
+def vers_stockage(df, table):
+    """Schéma typé -> lignes (dicts de textes/nombres) au format historique du Sheet"""
+    out = pd.DataFrame({col: texte(df[col]) if col in df.columns else "" for col in COLONNES[table]}, index=df.index)
+    montant = MONTANT[table]
+    out[montant] = (df[montant].astype("int64") / 100).map("{:.2f}".format)
+    if table == "DATA":
+        out["Date"] = _date_texte(df["Date"], "%d/%m/%Y")
+        out["Date Paiement"] = _date_texte(df["Date Paiement"], "%Y-%m-%d")
+    elif table == "CHARGES":
+        out["Jour"] = df["Jour"].astype("int64")
+    return out.to_dict("records")
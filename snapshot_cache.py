@@ -0,0 +1,74 @@
+"""Cache process des onglets déjà parsés (DataFrames), partagé par toutes les sessions."""
+import threading
+import time
+
+
+class SnapshotCache:
+    """Une entrée par partition ("DATA", onglet) : DataFrame parsé + date d'expiration.
+
+    - N sessions qui demandent la même partition en même temps ne déclenchent qu'un seul
+      téléchargement (verrou par clé).
+    - Chaque écriture incrémente la révision de la partition et invalide l'entrée.
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = float(ttl)
+        self.lock = threading.Lock()
+        self._entrees = {}     # cle -> (df, expire_a, revision)
+        self._verrous = {}     # cle -> Lock (un seul chargement à la fois par clé)
+        self._revisions = {}   # cle -> int
+        self.hits = 0
+        self.misses = 0
+
+    def _verrou(self, cle):
+        with self.lock:
+            return self._verrous.setdefault(cle, threading.Lock())
+
+    def _lire(self, cle):
+        with self.lock:
+            entree = self._entrees.get(cle)
+            if entree and entree[1] > time.monotonic() and entree[2] == self._revisions.get(cle, 0):
+                self.hits += 1
+                return entree[0]
+        return None
+
+    def obtenir(self, cle, charger):
+        """Retourne le DataFrame en cache, ou appelle `charger()` (une seule fois pour tous)"""
+        df = self._lire(cle)
+        if df is not None:
+            return df
+        with self._verrou(cle):
+            # Une autre session a peut-être chargé pendant qu'on attendait le verrou
+            df = self._lire(cle)
+            if df is not None:
+                return df
+            with self.lock:
+                self.misses += 1
+                revision = self._revisions.get(cle, 0)
+            df = charger()
+            with self.lock:
+                # Si une écriture est passée pendant le chargement, on ne garde pas ce résultat
+                if revision == self._revisions.get(cle, 0):
+                    self._entrees[cle] = (df, time.monotonic() + self.ttl, revision)
+            return df
+
+    def invalider(self, cle):
+        """Écriture sur `cle` : l'entrée est jetée. Retourne la nouvelle révision."""
+        with self.lock:
+            self._revisions[cle] = self._revisions.get(cle, 0) + 1
+            self._entrees.pop(cle, None)
+            return self._revisions[cle]
+
+    def revision(self, cle):
+        with self.lock:
+            return self._revisions.get(cle, 0)
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entrees": len(self._entrees),
+            }
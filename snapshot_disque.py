@@ -0,0 +1,116 @@
+"""Instantanés disque des partitions parsées (Arrow/Feather), pour des démarrages à froid sans téléchargement.
+
+Chaque partition est écrite avec le jeton de révision du moteur au moment de sa lecture
+(Google Sheets : date de dernière modification du classeur, via Drive). Au redémarrage,
+un seul appel suffit à vérifier le jeton : s'il n'a pas bougé, l'instantané est relu du disque ;
+sinon seule la partition demandée est retéléchargée (puis réécrite). Le jeton vaut pour tout le
+classeur : après une écriture, chaque partition est retéléchargée une fois à sa prochaine lecture
+(et celle qui a été écrite est jetée tout de suite, voir `supprimer`).
+"""
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+import perf
+
+
+class SnapshotDisque:
+    """Se place sous SnapshotCache : `obtenir` est appelé uniquement quand la mémoire est vide."""
+
+    def __init__(self, dossier, revision, ttl_revision=30):
+        self.dossier = dossier
+        self.revision = revision            # callable -> jeton (str) ou None si le moteur n'en fournit pas
+        self.ttl_revision = float(ttl_revision)
+        self.lock = threading.Lock()
+        self._jeton = None                  # (jeton, lu_a) : un seul appel pour une rafale de sessions
+        self.hits = 0
+        self.misses = 0
+        self.octets_lus = 0
+        self.ms_lecture = 0.0
+        os.makedirs(dossier, exist_ok=True)
+
+    def _chemins(self, table, partition):
+        base = os.path.join(self.dossier, f"{table}__{partition}".replace("/", "_"))
+        return base + ".arrow", base + ".json"
+
+    def jeton(self):
+        with self.lock:
+            if self._jeton and time.monotonic() - self._jeton[1] < self.ttl_revision:
+                return self._jeton[0]
+        with perf.span("snapshot.revision"):
+            jeton = self.revision()
+        with self.lock:
+            self._jeton = (jeton, time.monotonic())
+        return jeton
+
+    def _lire(self, table, partition, jeton):
+        donnees, meta = self._chemins(table, partition)
+        try:
+            with open(meta) as f:
+                if json.load(f).get("jeton") != jeton:
+                    return None
+            debut = time.perf_counter()
+            df = pd.read_feather(donnees)
+        except (OSError, ValueError):
+            return None
+        duree = time.perf_counter() - debut
+        taille = os.path.getsize(donnees)
+        perf.enregistrer("snapshot.disque", duree, table=table, lignes=len(df), octets=taille)
+        with self.lock:
+            self.hits += 1
+            self.octets_lus += taille
+            self.ms_lecture += duree * 1000
+        return df
+
+    def _ecrire(self, table, partition, df, jeton):
+        donnees, meta = self._chemins(table, partition)
+        # Écriture atomique : fichier temporaire puis rename (jamais de fichier à moitié écrit)
+        df.reset_index(drop=True).to_feather(donnees + ".tmp")
+        os.replace(donnees + ".tmp", donnees)
+        with open(meta + ".tmp", "w") as f:
+            json.dump({"jeton": jeton, "lignes": len(df), "octets": os.path.getsize(donnees), "ecrit": time.time()}, f)
+        os.replace(meta + ".tmp", meta)
+
+    def obtenir(self, table, partition, charger):
+        """DataFrame de l'instantané s'il est à jour, sinon `charger()` (et l'instantané est réécrit)"""
+        jeton = self.jeton()
+        if jeton is None:
+            return charger()
+        df = self._lire(table, partition, jeton)
+        if df is not None:
+            return df
+        with self.lock:
+            self.misses += 1
+        # Jeton lu AVANT le téléchargement : une modification pendant la lecture le rendra périmé
+        df = charger()
+        try:
+            self._ecrire(table, partition, df, jeton)
+        except OSError:
+            pass   # disque plein / en lecture seule : on sert quand même les données
+        return df
+
+    def supprimer(self, table, partition):
+        """Écriture de l'app sur la partition : son instantané est jeté (jamais resservi périmé).
+        Les autres partitions ne sont pas touchées : leur jeton les périmera au prochain relevé."""
+        for chemin in self._chemins(table, partition):
+            try:
+                os.remove(chemin)
+            except FileNotFoundError:
+                pass
+        with self.lock:
+            self._jeton = None
+
+    def stats(self):
+        with self.lock:
+            fichiers = [f for f in os.listdir(self.dossier) if f.endswith(".arrow")]
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "fichiers": len(fichiers),
+                "octets_disque": sum(os.path.getsize(os.path.join(self.dossier, f)) for f in fichiers),
+                "octets_lus": self.octets_lus,
+                "ms_lecture": round(self.ms_lecture, 1),
+            }
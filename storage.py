@@ -0,0 +1,524 @@
+"""Couche de stockage SalaryFlow : une interface, deux moteurs (Google Sheets / SQLite local)."""
+import hashlib
+import math
+import os
+import re
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+
+import gspread
+import requests
+from gspread.utils import rowcol_to_a1
+from oauth2client.service_account import ServiceAccountCredentials
+
+from moteur import decaler_mois
+
+# Ordre des colonnes correspondant aux onglets du Sheet
+# "ID" = identifiant stable de la ligne, utilisé pour n'écrire que les lignes modifiées
+COLONNES_REVENUS = ["User", "Date", "Mois", "Source", "Type", "Détails", "Montant Net", "Date Paiement", "Mois Paiement", "ID"]
+COLONNES_CHARGES = ["User", "Groupe", "Sous-Groupe", "Intitule", "Montant", "Jour", "ID"]
+# Solde réel du compte au 1er du "Mois" (point de départ du grand livre)
+COLONNES_SOLDES = ["User", "Mois", "Solde", "ID"]
+COLONNES = {"DATA": COLONNES_REVENUS, "CHARGES": COLONNES_CHARGES, "SOLDES": COLONNES_SOLDES}
+
+# Colonnes montant à protéger contre la conversion automatique de Google Sheets
+COLONNES_MONTANT = {"DATA": "Montant Net", "CHARGES": "Montant", "SOLDES": "Solde"}
+
+# Tables arrivées après la création du classeur : l'onglet est créé à la première lecture
+TABLES_A_LA_DEMANDE = {"SOLDES"}
+
+
+def _cellule(valeur):
+    """Convertit une valeur pandas/numpy en type simple (JSON / SQLite)"""
+    if valeur is None:
+        return ""
+    if hasattr(valeur, "item"):  # np.int64, np.float64...
+        valeur = valeur.item()
+    if isinstance(valeur, float) and math.isnan(valeur):
+        return ""
+    if isinstance(valeur, (str, int, float)):
+        return valeur
+    return str(valeur)
+
+
+def nouvel_id():
+    return uuid.uuid4().hex[:12]
+
+
+def nouveaux_ids(n):
+    """n identifiants d'un coup (même format que nouvel_id), pour les imports en masse"""
+    brut = os.urandom(6 * n).hex()
+    return [brut[i:i + 12] for i in range(0, 12 * n, 12)]
+
+
+def _texte(valeur):
+    return str(_cellule(valeur))
+
+
+def mois_paiement(record):
+    """"YYYY-MM" de paiement d'une ligne brute, déduit comme à l'ingestion (schema.ingerer_revenus) :
+    la colonne "Mois Paiement" si elle est lisible, sinon "Date Paiement". "" si rien n'est lisible."""
+    mois = _texte(record.get("Mois Paiement")).strip()[:7]
+    if re.fullmatch(r"\d{4}-\d{2}", mois):
+        return mois
+    date = _texte(record.get("Date Paiement")).strip()[:10]
+    for fmt in ("%Y-%m-%d", "%d/%m/%Y"):
+        try:
+            return datetime.strptime(date, fmt).strftime("%Y-%m")
+        except ValueError:
+            pass
+    return ""
+
+
+def diff_lignes(avant, apres, colonnes):
+    """Compare deux listes de dicts par "ID" -> (insertions, mises à jour, IDs supprimés)"""
+    par_id = {_texte(r.get("ID")): r for r in avant if _texte(r.get("ID"))}
+    vus = set()
+    inserts, updates = [], []
+    for r in apres:
+        rid = _texte(r.get("ID"))
+        if rid not in par_id:
+            # Nouvelle ligne (ajoutée dans l'éditeur) : on lui attribue un ID si besoin
+            inserts.append({**r, "ID": rid or nouvel_id()})
+            continue
+        vus.add(rid)
+        ancien = par_id[rid]
+        if any(_texte(r.get(c, "")) != _texte(ancien.get(c, "")) for c in colonnes if c != "User"):
+            updates.append(r)
+    deletes = [rid for rid in par_id if rid not in vus]
+    return inserts, updates, deletes
+
+
+class StorageBackend:
+    """Interface commune. Une table = un onglet du Sheet ("DATA" ou "CHARGES")."""
+
+    # True si le moteur sait lire une plage de mois sans lire toute la partition
+    FENETRE_NATIVE = False
+
+    def partition(self, table, user_email):
+        """Clé du plus petit bloc lisible qui contient les lignes de l'utilisateur (onglet, shard...)"""
+        raise NotImplementedError
+
+    def lire_partition(self, table, partition):
+        """Retourne toutes les lignes (liste de dicts) de la partition"""
+        raise NotImplementedError
+
+    def partitions(self, table):
+        """Toutes les partitions de la table (traitements sur l'ensemble des comptes)"""
+        raise NotImplementedError
+
+    def lire_tout(self, table):
+        """Toutes les lignes de la table, tous comptes confondus (traitements batch, analytique)"""
+        return [r for p in self.partitions(table) for r in self.lire_partition(table, p)]
+
+    def revision(self):
+        """Jeton qui change à chaque modification des données (None : pas de jeton, pas d'instantané disque)"""
+        return None
+
+    def lire(self, table, user_email):
+        """Retourne les lignes (liste de dicts) de l'utilisateur uniquement"""
+        records = self.lire_partition(table, self.partition(table, user_email))
+        return [r for r in records if str(r.get("User")) == str(user_email)]
+
+    def lire_fenetre(self, user_email, debut, fin):
+        """Revenus (DATA) de l'utilisateur payés entre les mois `debut` et `fin` inclus ("YYYY-MM")"""
+        return [r for r in self.lire("DATA", user_email) if debut <= mois_paiement(r) <= fin]
+
+    def ajouter(self, table, record):
+        """Ajoute une ligne (dict) à la fin de la table"""
+        self.ajouter_lot(table, [record])
+
+    def ajouter_lot(self, table, records):
+        """Ajoute plusieurs lignes (de plusieurs utilisateurs) en un minimum d'appels"""
+        raise NotImplementedError
+
+    def appliquer_diff(self, table, user_email, inserts, updates, deletes):
+        """N'écrit que les lignes insérées / modifiées / supprimées (repérées par "ID")"""
+        raise NotImplementedError
+
+    def non_appliquee(self, erreur):
+        """True si l'écriture qui a levé `erreur` n'a certainement pas eu lieu (la renvoyer ne crée pas de doublon).
+        Par défaut on ne sait pas : False."""
+        return False
+
+
+def ouvrir_classeur(service_account_info, nom="SalaryFlow_DB"):
+    scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
+    creds = ServiceAccountCredentials.from_json_keyfile_dict(service_account_info, scope)
+    client = gspread.authorize(creds)
+    return client.open(nom)
+
+
+class ShardRouter:
+    """Annuaire User -> shard. Chaque table est découpée en onglets "<TABLE>_<shard>".
+
+    mode "hash" : N onglets partagés (shard = hash de l'email modulo N)
+    mode "user" : un onglet par utilisateur
+    L'onglet "ANNUAIRE" fait foi (permet de déplacer un compte), le hash sert pour les nouveaux.
+    """
+
+    ONGLET_ANNUAIRE = "ANNUAIRE"
+
+    def __init__(self, sh, mode="hash", shards=16):
+        if mode not in ("hash", "user"):
+            raise ValueError(f"Mode de sharding inconnu : {mode}")
+        self.sh = sh
+        self.mode = mode
+        self.shards = int(shards)
+        self.lock = threading.Lock()
+        self._annuaire = None
+
+    def shard_calcule(self, user_email):
+        digest = hashlib.sha1(str(user_email).strip().lower().encode("utf-8")).hexdigest()
+        if self.mode == "user":
+            return f"u{digest[:10]}"  # préfixe : jamais relu comme un nombre par get_all_records
+        return f"{int(digest, 16) % self.shards:02d}"
+
+    def _ws_annuaire(self):
+        try:
+            return self.sh.worksheet(self.ONGLET_ANNUAIRE)
+        except gspread.exceptions.WorksheetNotFound:
+            ws = self.sh.add_worksheet(self.ONGLET_ANNUAIRE, rows=1000, cols=2)
+            ws.append_row(["User", "Shard"])
+            return ws
+
+    def annuaire(self):
+        """Annuaire complet (chargé une fois par process)"""
+        with self.lock:
+            if self._annuaire is None:
+                records = self._ws_annuaire().get_all_records(numericise_ignore=["all"])
+                self._annuaire = {str(r["User"]): str(r["Shard"]).zfill(2) for r in records if r.get("User")}
+            return self._annuaire
+
+    def shard(self, user_email):
+        annuaire = self.annuaire()
+        user_email = str(user_email)
+        if user_email not in annuaire:
+            # Nouveau compte : on l'inscrit dans l'annuaire
+            with self.lock:
+                if user_email not in annuaire:
+                    shard = self.shard_calcule(user_email)
+                    self._ws_annuaire().append_row([user_email, shard])
+                    annuaire[user_email] = shard
+        return annuaire[user_email]
+
+    def onglet(self, table, user_email):
+        return f"{table}_{self.shard(user_email)}"
+
+    def enregistrer(self, affectations):
+        """Réécrit l'annuaire (utilisé par la migration)"""
+        with self.lock:
+            ws = self._ws_annuaire()
+            ws.clear()
+            ws.update([["User", "Shard"]] + [[u, s] for u, s in sorted(affectations.items())])
+            self._annuaire = dict(affectations)
+
+
+class GoogleSheetsStorage(StorageBackend):
+    """Moteur historique : le classeur "SalaryFlow_DB" (un onglet par table, ou par shard)."""
+
+    ESSAIS_IDS = 3   # relectures au plus quand l'onglet bouge pendant le complément des IDs
+
+    def __init__(self, spreadsheet, router=None):
+        self.sh = spreadsheet
+        self.router = router
+        self.lock = threading.Lock()
+        self._verrous = {}
+
+    def _verrou(self, titre):
+        """Un verrou par onglet : les écritures par numéro de ligne d'un onglet partagé passent une à une"""
+        with self.lock:
+            return self._verrous.setdefault(titre, threading.Lock())
+
+    @staticmethod
+    def _lignes_par_id(ws, col_id):
+        ids = ws.col_values(col_id)
+        return {v: i + 1 for i, v in enumerate(ids) if v and i > 0}
+
+    def partition(self, table, user_email):
+        # Sans sharding, tout le monde partage l'onglet de la table
+        if self.router is None:
+            return table
+        return self.router.onglet(table, user_email)
+
+    def partitions(self, table):
+        if self.router is None:
+            return [table]
+        return [ws.title for ws in self.sh.worksheets() if ws.title.startswith(f"{table}_")]
+
+    def revision(self):
+        # Drive ne donne la date de modification que pour le classeur entier (un seul appel pour tous les onglets)
+        return self.sh.get_lastUpdateTime()
+
+    def non_appliquee(self, erreur):
+        # 429 : refusée avant traitement. Connexion jamais établie : rien n'est parti.
+        # 5xx et timeouts de lecture : Google a pu appliquer la requête.
+        if isinstance(erreur, gspread.exceptions.APIError):
+            return erreur.code == 429
+        return isinstance(erreur, requests.exceptions.ConnectTimeout)
+
+    def _worksheet(self, table, titre):
+        """Ouvre l'onglet (créé à la volée pour un nouveau shard ou une nouvelle table)"""
+        try:
+            return self.sh.worksheet(titre)
+        except gspread.exceptions.WorksheetNotFound:
+            if self.router is None and table not in TABLES_A_LA_DEMANDE:
+                raise
+            ws = self.sh.add_worksheet(titre, rows=1000, cols=len(COLONNES[table]))
+            ws.append_row(COLONNES[table])
+            return ws
+
+    def _securiser(self, table, record):
+        # 🚨 LE HACK ABSOLU : On force Google Sheets à lire le montant comme du texte avec l'apostrophe '
+        r = {k: _cellule(v) for k, v in record.items()}
+        col = COLONNES_MONTANT[table]
+        if col in r:
+            r[col] = f"'{r[col]}".replace(',', '.')
+        return r
+
+    def _entetes(self, ws, table):
+        """Lit la ligne d'en-tête et ajoute la colonne "ID" si l'onglet date d'avant"""
+        headers = ws.row_values(1)
+        if not headers:
+            ws.append_row(COLONNES[table])
+            return list(COLONNES[table])
+        if "ID" not in headers:
+            ws.update_cell(1, len(headers) + 1, "ID")
+            headers.append("ID")
+        return headers
+
+    def lire_partition(self, table, partition):
+        # Google Sheets ne sait pas filtrer côté serveur : on lit l'onglet (ou le shard) entier
+        ws = self._worksheet(table, partition)
+        headers = self._entetes(ws, table)
+        col_id = headers.index("ID") + 1
+        for _ in range(self.ESSAIS_IDS):
+            # Tout en texte : sinon un ID "012345678901" reviendrait 12345678901 (et ne serait plus retrouvé)
+            records = ws.get_all_records(numericise_ignore=["all"])
+            ids_lus = [_texte(r.get("ID")) for r in records]
+            if all(ids_lus):
+                return records
+            with self._verrou(partition):
+                # Les IDs manquants s'écrivent par numéro de ligne : l'onglet ne doit pas avoir bougé depuis la lecture
+                ids = ws.col_values(col_id)[1:]
+                if ids + [""] * (len(ids_lus) - len(ids)) != ids_lus:
+                    continue   # lignes déplacées entre-temps : on relit, hors du verrou
+                a_completer = []
+                for i, r in enumerate(records):
+                    if not ids_lus[i]:
+                        # Ligne historique sans ID : on lui en donne un (une seule fois)
+                        r["ID"] = nouvel_id()
+                        a_completer.append({"range": rowcol_to_a1(i + 2, col_id), "values": [[r["ID"]]]})
+                ws.batch_update(a_completer)
+            return records
+        # L'onglet bouge sans arrêt : lignes servies sans ID cette fois, complétées à une prochaine lecture
+        return records
+
+    def ajouter_lot(self, table, records):
+        # Un seul append_rows par onglet (plusieurs si les utilisateurs sont sur des shards différents)
+        par_onglet = {}
+        for record in records:
+            r = self._securiser(table, {**record, "ID": _texte(record.get("ID")) or nouvel_id()})
+            par_onglet.setdefault(self.partition(table, record["User"]), []).append([r.get(c, "") for c in COLONNES[table]])
+        for titre, rows in par_onglet.items():
+            self._worksheet(table, titre).append_rows(rows)
+
+    def appliquer_diff(self, table, user_email, inserts, updates, deletes):
+        titre = self.partition(table, user_email)
+        ws = self._worksheet(table, titre)
+        # Mises à jour et suppressions visent des numéros de ligne : dans un onglet partagé, une suppression
+        # d'une autre session entre la lecture des IDs et l'écriture décalerait les lignes (verrou par onglet)
+        with self._verrou(titre):
+            headers = self._entetes(ws, table)
+            col_id = headers.index("ID") + 1
+
+            # 1. Localiser les lignes par ID (une seule colonne téléchargée)
+            ligne_de = self._lignes_par_id(ws, col_id)
+
+            # 2. Mises à jour : une plage par ligne, envoyées en un seul appel
+            plages = []
+            for record in updates:
+                num = ligne_de.get(_texte(record.get("ID")))
+                if num is None:
+                    inserts = inserts + [record]  # supprimée entre-temps : on la recrée
+                    continue
+                r = self._securiser(table, {**record, "User": user_email})
+                plages.append({
+                    "range": f"{rowcol_to_a1(num, 1)}:{rowcol_to_a1(num, len(headers))}",
+                    "values": [[r.get(h, "") for h in headers]],
+                })
+            if plages:
+                ws.batch_update(plages)
+
+            # 3. Insertions : un seul append_rows
+            if inserts:
+                rows = [self._securiser(table, {**r, "User": user_email}) for r in inserts]
+                ws.append_rows([[r.get(h, "") for h in headers] for r in rows])
+
+            # 4. Suppressions : numéros relus juste avant (l'ID de chaque ligne visée est celui à supprimer),
+            #    du bas vers le haut pour ne pas décaler les suivantes
+            if deletes:
+                ligne_de = self._lignes_par_id(ws, col_id)
+                nums = sorted((ligne_de[rid] for rid in deletes if rid in ligne_de), reverse=True)
+                if nums:
+                    self.sh.batch_update({"requests": [
+                        {"deleteDimension": {"range": {"sheetId": ws.id, "dimension": "ROWS", "startIndex": n - 1, "endIndex": n}}}
+                        for n in nums
+                    ]})
+
+
+def migrer_vers_shards(sh, router, tables=("DATA", "CHARGES", "SOLDES"), force=False):
+    """Découpe les onglets monolithiques en shards. Les onglets d'origine sont conservés (sauvegarde).
+
+    Chaque shard est réécrit entièrement à partir de l'onglet d'origine : si l'annuaire ou des shards
+    existent déjà (migration faite, l'app a pu y écrire depuis), on refuse sauf `force=True`.
+    Retourne {table: {onglet: nb_lignes}}.
+    """
+    existants = {ws.title for ws in sh.worksheets()}
+    deja = sorted(t for t in existants if t == router.ONGLET_ANNUAIRE or any(t.startswith(f"{table}_") for table in tables))
+    if deja and not force:
+        raise ValueError(f"Migration déjà faite (onglets existants : {', '.join(deja)}). "
+                         "Relancer écraserait les écritures faites depuis dans les shards.")
+    affectations = {}
+    bilan = {}
+    for table in tables:
+        if table not in existants:
+            bilan[table] = {}   # table créée après la mise en place (ex. SOLDES) : rien à découper
+            continue
+        values = sh.worksheet(table).get_all_values()
+        if not values:
+            bilan[table] = {}
+            continue
+        headers = values[0]
+        if "ID" not in headers:
+            headers = headers + ["ID"]
+        i_user, i_id = headers.index("User"), headers.index("ID")
+
+        # 1. Regroupement des lignes par shard
+        par_shard = {}
+        for row in values[1:]:
+            row = row + [""] * (len(headers) - len(row))
+            if not any(row):
+                continue
+            if not row[i_id]:
+                row[i_id] = nouvel_id()
+            user = row[i_user]
+            affectations.setdefault(user, router.shard_calcule(user))
+            par_shard.setdefault(affectations[user], []).append(row)
+
+        # 2. Ecriture de chaque shard en un appel
+        bilan[table] = {}
+        for shard, rows in par_shard.items():
+            titre = f"{table}_{shard}"
+            if titre in existants:
+                ws = sh.worksheet(titre)
+                ws.clear()
+            else:
+                ws = sh.add_worksheet(titre, rows=len(rows) + 100, cols=len(headers))
+            ws.update([headers] + rows)
+            bilan[table][titre] = len(rows)
+
+    # 3. L'annuaire n'est publié qu'une fois toutes les données copiées
+    router.enregistrer(affectations)
+    return bilan
+
+
+class SQLiteStorage(StorageBackend):
+    """Moteur local : une table SQLite par onglet, indexée sur User (+ Mois Paiement)."""
+
+    FENETRE_NATIVE = True
+
+    def __init__(self, path="salaryflow.db"):
+        # Une seule connexion partagée entre les sessions Streamlit (threads) -> verrou
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            if path != ":memory:":
+                self.conn.execute("PRAGMA journal_mode=WAL")
+            for table, cols in COLONNES.items():
+                cols_sql = ", ".join(f'"{c}"' for c in cols)
+                self.conn.execute(f'CREATE TABLE IF NOT EXISTS "{table}" ({cols_sql})')
+                # Base créée avant la colonne ID
+                existantes = [row[1] for row in self.conn.execute(f'PRAGMA table_info("{table}")')]
+                if "ID" not in existantes:
+                    self.conn.execute(f'ALTER TABLE "{table}" ADD COLUMN "ID"')
+                self.conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{table.lower()}_id" ON "{table}" ("ID")')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS "idx_data_user_mois" ON "DATA" ("User", "Mois Paiement")')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS "idx_charges_user" ON "CHARGES" ("User")')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS "idx_soldes_user" ON "SOLDES" ("User")')
+
+    def _inserer(self, table, records):
+        cols = COLONNES[table]
+        cols_sql = ", ".join(f'"{c}"' for c in cols)
+        marks = ", ".join("?" for _ in cols)
+        self.conn.executemany(
+            f'INSERT INTO "{table}" ({cols_sql}) VALUES ({marks})',
+            [[_cellule(r.get(c, "")) for c in cols] for r in records],
+        )
+
+    def partition(self, table, user_email):
+        # L'index sur User permet de ne lire que les lignes du compte
+        return str(user_email)
+
+    def partitions(self, table):
+        with self.lock:
+            return [u for (u,) in self.conn.execute(f'SELECT DISTINCT "User" FROM "{table}"')]
+
+    def _selectionner(self, table, where, params):
+        cols = COLONNES[table]
+        cols_sql = ", ".join(f'"{c}"' for c in cols)
+        with self.lock, self.conn:
+            rows = self.conn.execute(
+                f'SELECT rowid, {cols_sql} FROM "{table}" WHERE {where} ORDER BY rowid', params
+            ).fetchall()
+            records = []
+            for rowid, *values in rows:
+                r = dict(zip(cols, values))
+                if not _texte(r["ID"]):
+                    # Ligne historique sans ID : on lui en donne un (une seule fois)
+                    r["ID"] = nouvel_id()
+                    self.conn.execute(f'UPDATE "{table}" SET "ID" = ? WHERE rowid = ?', (r["ID"], rowid))
+                records.append(r)
+        return records
+
+    def lire_partition(self, table, partition):
+        return self._selectionner(table, '"User" = ?', (partition,))
+
+    def lire_tout(self, table):
+        # Une requête au lieu d'une par compte
+        return self._selectionner(table, "1 = 1", ())
+
+    def lire_fenetre(self, user_email, debut, fin):
+        # Plage sur l'index (User, Mois Paiement) : seules les lignes de la fenêtre sont lues,
+        # + les lignes historiques au mois illisible, classées comme à l'ingestion (depuis Date Paiement)
+        records = self._selectionner(
+            "DATA",
+            '"User" = ? AND (("Mois Paiement" >= ? AND "Mois Paiement" < ?)'
+            ' OR IFNULL("Mois Paiement", \'\') NOT GLOB \'[0-9][0-9][0-9][0-9]-[0-9][0-9]*\')',
+            (str(user_email), debut, decaler_mois(fin, 1)),
+        )
+        return [r for r in records if debut <= mois_paiement(r) <= fin]
+
+    def non_appliquee(self, erreur):
+        # Transaction annulée en cas d'erreur : rien n'a été écrit
+        return isinstance(erreur, sqlite3.Error)
+
+    def ajouter_lot(self, table, records):
+        with self.lock, self.conn:
+            self._inserer(table, [{**r, "ID": _texte(r.get("ID")) or nouvel_id()} for r in records])
+
+    def appliquer_diff(self, table, user_email, inserts, updates, deletes):
+        cols = [c for c in COLONNES[table] if c not in ("User", "ID")]
+        set_sql = ", ".join(f'"{c}" = ?' for c in cols)
+        with self.lock, self.conn:
+            self.conn.executemany(
+                f'UPDATE "{table}" SET {set_sql} WHERE "ID" = ? AND "User" = ?',
+                [[_cellule(r.get(c, "")) for c in cols] + [_texte(r["ID"]), str(user_email)] for r in updates],
+            )
+            self.conn.executemany(
+                f'DELETE FROM "{table}" WHERE "ID" = ? AND "User" = ?',
+                [(rid, str(user_email)) for rid in deletes],
+            )
+            self._inserer(table, [{**r, "User": user_email} for r in inserts])
@@ -0,0 +1,5 @@
+"""Les modules de l'app sont à la racine du dépôt (pas de paquet) : on la met dans le chemin d'import."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
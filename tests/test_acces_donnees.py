@@ -0,0 +1,75 @@
+"""Lectures / sauvegardes de l'app : fenêtre + saisies en file, écritures différentielles et invalidation."""
+import pandas as pd
+import pytest
+
+from acces_donnees import AccesDonnees, avec_ids, cle_version
+from schema import categoriser, ingerer_charges, ingerer_revenus
+from snapshot_cache import SnapshotCache
+from storage import SQLiteStorage
+from write_behind import WriteBehindQueue
+
+U = "u@test.fr"
+
+
+def revenu(mois, net="100.00", id=""):
+    return {"User": U, "Date": f"01/{mois[5:]}/{mois[:4]}", "Mois": mois, "Source": "S", "Type": "Salaire",
+            "Détails": "", "Montant Net": net, "Date Paiement": f"{mois}-05", "Mois Paiement": mois, "ID": id}
+
+
+@pytest.fixture
+def acces():
+    db = SQLiteStorage(":memory:")
+    db.ajouter_lot("DATA", [revenu("2026-01", id="a"), revenu("2026-03", id="b")])
+    db.ajouter_lot("CHARGES", [{"User": U, "Groupe": "FIXES", "Intitule": "Loyer", "Montant": "600", "Jour": 5, "ID": "c"}])
+    return AccesDonnees(db, WriteBehindQueue(db, intervalle=3600), SnapshotCache(ttl=300))
+
+
+def test_lectures_en_file_visibles_dans_la_fenetre(acces):
+    acces.soumettre_revenu("autre@test.fr", revenu("2026-03"))
+    acces.soumettre_revenu(U, revenu("2026-03", id="n1"))
+    acces.soumettre_revenu(U, revenu("2026-06", id="n2"))
+    assert sorted(acces.lire_revenus(U, ("2026-02", "2026-04"))["ID"]) == ["b", "n1"]
+    assert sorted(acces.lire_revenus(U)["ID"]) == ["a", "b", "n1", "n2"]
+    lectures = {nom: fn() for nom, fn in acces.lectures(U).items()}
+    assert list(lectures) == ["DATA", "CHARGES", "SOLDES"]
+    assert lectures["CHARGES"]["ID"].tolist() == ["c"] and lectures["SOLDES"].empty
+
+
+def test_sauver_revenus_envoie_la_file_puis_le_diff(acces):
+    acces.soumettre_revenu(U, revenu("2026-04", id="n1"))
+    avant = acces.lire_revenus(U)
+    apres = avant[avant["ID"] != "a"].copy()
+    apres.loc[apres["ID"] == "n1", "Montant Net"] = 25000
+    apres = categoriser(pd.concat([apres, ingerer_revenus([revenu("2026-05", net="5")])], ignore_index=True), "DATA")
+    apres = acces.sauver("DATA", U, avant, apres)
+    assert apres["ID"].str.len().gt(0).all()
+    stocke = {r["ID"]: r["Montant Net"] for r in acces.db.lire_partition("DATA", U)}
+    assert set(stocke) == set(apres["ID"]) and stocke["n1"] == "250.00"
+    assert acces.file.en_attente("DATA", U) == []
+
+
+def test_sauver_revenus_refuse_si_la_file_ne_part_pas(acces, monkeypatch):
+    acces.soumettre_revenu(U, revenu("2026-04", id="n1"))
+    monkeypatch.setattr(acces.file, "flush", lambda: False)
+    avant = acces.lire_revenus(U)
+    with pytest.raises(RuntimeError):
+        acces.sauver("DATA", U, avant, avant.iloc[:1])
+    assert len(acces.db.lire_partition("DATA", U)) == 2
+
+
+def test_ecriture_invalide_le_cache(acces):
+    avant = acces.lire_snapshot("CHARGES", U, ingerer_charges)
+    revision = acces.cache.revision(cle_version("CHARGES", "*"))
+    apres = avant.copy()
+    apres.loc[0, "Montant"] = 70000
+    acces.sauver("CHARGES", U, avant, apres)
+    assert acces.lire_snapshot("CHARGES", U, ingerer_charges)["Montant"].tolist() == [70000]
+    assert acces.cache.revision(cle_version("CHARGES", "*")) == revision + 1
+    # Rien de changé : aucune écriture, le cache reste valide
+    acces.sauver("CHARGES", U, apres, apres)
+    assert acces.cache.revision(cle_version("CHARGES", "*")) == revision + 1
+
+
+def test_avec_ids_ne_touche_que_les_lignes_sans_id():
+    df = avec_ids(ingerer_charges([{"User": U, "Montant": "1", "ID": "x"}, {"User": U, "Montant": "2"}]))
+    assert df["ID"].iloc[0] == "x" and len(df["ID"].iloc[1]) == 12
@@ -0,0 +1,40 @@
+"""Export : la timeline exportée suit le grand livre, comme le tableau de bord."""
+import pandas as pd
+
+import export
+from moteur import IndexMensuel
+from schema import ingerer_charges, ingerer_revenus
+
+REVENUS = ingerer_revenus([
+    {"User": "u@test.fr", "Date": "2026-03-01", "Source": "Paie", "Type": "Intérim", "Montant Net": "1000",
+     "Date Paiement": f"2026-{m:02d}-10", "Mois Paiement": f"2026-{m:02d}"}
+    for m in (3, 4, 5)
+])
+CHARGES = ingerer_charges([{"User": "u@test.fr", "Groupe": "FIXES", "Intitule": "Loyer", "Montant": "600", "Jour": 5}])
+
+
+def timeline(**kwargs):
+    return pd.concat(export.blocs_timeline(REVENUS, CHARGES, "2026-03", "2026-05", **kwargs), ignore_index=True)
+
+
+def test_timeline_sans_solde_chaque_mois_part_de_zero():
+    tl = timeline()
+    assert tl["Cumul"].tolist() == [-600.0, 400.0] * 3
+
+
+def test_timeline_depuis_le_solde_reel():
+    attendu = [-100.0, 900.0, 300.0, 1300.0, 700.0, 1700.0]
+    assert timeline(ouverture=("2026-03", 50000))["Cumul"].tolist() == attendu
+    index = IndexMensuel(REVENUS, CHARGES)
+    index.ouvrir("2026-04", 90000)
+    assert timeline(index=index)["Cumul"].tolist() == attendu
+    assert tuple(timeline(index=index).columns) == tuple(export.COLONNES_TIMELINE_EXPORT)
+
+
+def test_csv_et_xlsx_en_bytes():
+    entetes, blocs = export.COLONNES_TIMELINE_EXPORT, timeline(ouverture=("2026-03", 50000))
+    csv = export.vers_csv(entetes, [blocs])
+    assert isinstance(csv, bytes) and csv.startswith("﻿".encode())
+    assert csv.decode("utf-8-sig").splitlines()[1].endswith(";-100,00")
+    xlsx = export.vers_xlsx({"Timeline": (entetes, [blocs])})
+    assert isinstance(xlsx, bytes) and xlsx[:2] == b"PK"
@@ -0,0 +1,75 @@
+"""Import de relevés : raisons de rejet et numéros de ligne du fichier source (CSV et XLSX)."""
+import io
+
+from openpyxl import Workbook
+
+from import_revenus import importer
+
+ENTETE = ["Date", "Client", "Type", "Taux", "Heures", "Paniers", "Net"]
+
+
+def csv(*lignes):
+    return "\n".join([";".join(ENTETE), *lignes]).encode("utf-8")
+
+
+def xlsx(*lignes):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(ENTETE)
+    for ligne in lignes:
+        ws.append([v if v != "" else None for v in ligne.split(";")] if ligne else [])
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def erreurs(lecteur, nom, *lignes, taille=2):
+    ok, ko = importer(lecteur(*lignes), nom, "u@test.fr", taille=taille)
+    return ok, list(zip(ko["Ligne"], ko["Raison"]))
+
+
+def test_raisons_de_rejet():
+    ok, ko = erreurs(
+        csv, "releve.csv",
+        "01/03/2026;Agence;Intérim;12,50;100;10;",
+        "pas une date;Agence;Intérim;12;10;;",
+        "2026-03-02;Agence;Pigiste;;;;50",
+        "2026-03-03;Agence;Salaire;;;;0",
+    )
+    assert ko == [(3, "Date illisible"), (4, "Type inconnu"), (5, "Montant nul ou illisible")]
+    assert ok["Montant Net"].tolist() == [118975]
+    assert ok["Mois Paiement"].tolist() == ["2026-04"]
+
+
+def test_csv_lignes_vides_ni_rejetees_ni_decalees():
+    lignes = [
+        "2026-03-01;A;Salaire;;;;100",
+        ";;;;;;",
+        "",
+        "2026-03-02;A;Salaire;;;;0",
+        " ; ;;;;;",
+        "x;A;Salaire;;;;100",
+    ]
+    ok, ko = erreurs(csv, "releve.csv", *lignes)
+    assert ko == [(5, "Montant nul ou illisible"), (7, "Date illisible")]
+    assert len(ok) == 1
+
+
+def test_xlsx_lignes_vides_ni_rejetees_ni_decalees():
+    lignes = ["2026-03-01;A;Salaire;;;;100", "", "", "2026-03-02;A;Salaire;;;;0", "", "x;A;Salaire;;;;100"]
+    ok, ko = erreurs(xlsx, "releve.xlsx", *lignes)
+    assert ko == [(5, "Montant nul ou illisible"), (7, "Date illisible")]
+    assert len(ok) == 1
+
+
+def test_numeros_de_ligne_independants_de_la_taille_des_morceaux():
+    lignes = ["x;A;Salaire;;;;100" if i % 3 == 0 else "2026-03-01;A;Salaire;;;;100" for i in range(10)]
+    for taille in (1, 3, 5000):
+        ok, ko = erreurs(csv, "releve.csv", *lignes, taille=taille)
+        assert [l for l, _ in ko] == [2, 5, 8, 11]
+        assert len(ok) == 6
+
+
+def test_fichier_sans_ligne():
+    ok, ko = importer(csv(), "releve.csv", "u@test.fr")
+    assert ok.empty and ko.empty
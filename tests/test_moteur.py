@@ -0,0 +1,274 @@
+"""Moteur de calcul : timeline du mois (et son cumul), sur des tableaux au schéma canonique."""
+import numpy as np
+import pandas as pd
+
+from moteur import (
+    COLONNES_TIMELINE, IndexMensuel, bilan_mois, build_timeline, date_tension, decaler_mois, derniere_ouverture,
+    projeter, scenarios,
+)
+from schema import ingerer_charges, ingerer_revenus, ingerer_soldes
+
+MOIS = "2026-04"
+
+
+def revenu(source, net, date_paiement, type_="Intérim"):
+    return {"User": "u@test.fr", "Date": "2026-03-01", "Source": source, "Type": type_,
+            "Montant Net": net, "Date Paiement": date_paiement, "Mois Paiement": date_paiement[:7]}
+
+
+def charge(intitule, montant, jour, groupe="FIXES"):
+    return {"User": "u@test.fr", "Groupe": groupe, "Intitule": intitule, "Montant": montant, "Jour": jour}
+
+
+def revenus(*lignes):
+    return ingerer_revenus(list(lignes))
+
+
+def charges(*lignes):
+    return ingerer_charges(list(lignes))
+
+
+# --- 1. BUILD_TIMELINE ---
+def test_timeline_triee_par_jour_avec_cumul():
+    df_r = revenus(revenu("Agence", "1000", "2026-04-20"), revenu("Client", "250,50", "2026-04-03"))
+    df_c = charges(charge("Loyer", "600", 5), charge("Forfait", "20", 28, "VARIABLES"))
+    tl = build_timeline(df_r, df_c, MOIS)
+    assert list(tl.columns) == COLONNES_TIMELINE
+    assert tl["Jour"].tolist() == [3, 5, 20, 28]
+    assert tl["Nom"].tolist() == ["Client", "Loyer", "Agence", "Forfait"]
+    assert tl["Montant"].tolist() == [250.5, -600.0, 1000.0, -20.0]
+    assert tl["Cumul"].tolist() == [250.5, -349.5, 650.5, 630.5]
+
+
+def test_seuls_les_revenus_payes_dans_le_mois():
+    df_r = revenus(revenu("Mars", "500", "2026-03-28"), revenu("Avril", "300", "2026-04-10"), revenu("Mai", "700", "2026-05-02"))
+    tl = build_timeline(df_r, charges(), MOIS)
+    assert tl["Nom"].tolist() == ["Avril"]
+
+
+def test_meme_jour_les_charges_passent_avant_les_revenus():
+    df_r = revenus(revenu("Paie", "900", "2026-04-05"))
+    df_c = charges(charge("Loyer", "600", 5))
+    tl = build_timeline(df_r, df_c, MOIS)
+    assert tl["Type"].tolist() == ["Charge", "Intérim"]
+    # Le point bas de la journée est visible : le loyer part avant l'arrivée de la paie
+    assert tl["Cumul"].tolist() == [-600.0, 300.0]
+    assert date_tension(tl) == 5
+
+
+def test_point_bas_et_tension():
+    df_r = revenus(revenu("Paie", "1000", "2026-04-25"))
+    df_c = charges(charge("Loyer", "700", 2), charge("Courses", "200", 12, "VARIABLES"), charge("Livret", "50", 30, "EPARGNE"))
+    tl = build_timeline(df_r, df_c, MOIS)
+    assert tl["Cumul"].min() == -900.0
+    assert tl.loc[tl["Cumul"].idxmin(), "Jour"] == 12
+    assert date_tension(tl) == 2
+    assert tl["Cumul"].iloc[-1] == 50.0
+
+
+def test_pas_de_tension_si_le_cumul_reste_positif():
+    tl = build_timeline(revenus(revenu("Paie", "1000", "2026-04-01")), charges(charge("Loyer", "600", 5)), MOIS)
+    assert date_tension(tl) is None
+
+
+def test_simulation_le_15_et_solde_initial():
+    df_c = charges(charge("Loyer", "600", 5))
+    tl = build_timeline(revenus(), df_c, MOIS, sim=400.0, solde_initial=100.0)
+    assert tl["Nom"].tolist() == ["Loyer", "Simulation"]
+    assert tl["Jour"].tolist() == [5, 15]
+    assert tl["Cumul"].tolist() == [-500.0, -100.0]
+
+
+def test_charges_a_zero_et_revenus_a_zero_ignores():
+    df_r = ingerer_revenus([revenu("Vide", "0", "2026-04-10")], filtrer=False)
+    tl = build_timeline(df_r, charges(charge("Rien", "0", 3)), MOIS)
+    assert tl.empty
+
+
+def test_entrees_vides():
+    for df_r, df_c in ((None, None), (revenus(), charges()), (pd.DataFrame(), pd.DataFrame())):
+        tl = build_timeline(df_r, df_c, MOIS)
+        assert tl.empty and list(tl.columns) == COLONNES_TIMELINE
+        assert date_tension(tl) is None
+
+
+def test_cumul_exact_en_centimes():
+    # 10 x 0,10 € : pas d'erreur d'arrondi flottant dans le cumul
+    df_r = revenus(*(revenu(f"S{i}", "0,10", "2026-04-10") for i in range(10)))
+    tl = build_timeline(df_r, charges(), MOIS)
+    assert tl["Cumul"].iloc[-1] == 1.0
+    assert np.array_equal(tl["Cumul"].to_numpy(), np.arange(1, 11) / 10)
+
+
+# --- 2. PROJETER ---
+def test_projection_tension_au_point_bas_de_la_journee():
+    # Loyer et paie le même jour : le solde de fin de journée reste positif mais le loyer part d'abord
+    df_r = revenus(revenu("Paie", "900", "2026-04-05"))
+    df_c = charges(charge("Loyer", "600", 5))
+    soldes, resume = projeter(df_r, df_c, MOIS, n_mois=2)
+    assert soldes.loc[MOIS, 5] == 300.0
+    assert resume.loc[MOIS, "Tension"] == 5
+    assert resume.loc[MOIS, "Tension"] == date_tension(build_timeline(df_r, df_c, MOIS))
+    # Mai : loyer sans paie, tension aussi le 5
+    assert resume.loc["2026-05", "Tension"] == 5
+
+
+def test_projection_sans_tension_avec_solde_initial():
+    df_r = revenus(revenu("Paie", "900", "2026-04-05"))
+    df_c = charges(charge("Loyer", "600", 5))
+    soldes, resume = projeter(df_r, df_c, MOIS, n_mois=2, solde_initial=1000.0)
+    assert np.isnan(resume.loc[MOIS, "Tension"])
+    assert resume["Clôture"].tolist() == [1300.0, 700.0]
+    assert soldes.loc["2026-05", 5] == 700.0
+
+
+def test_projection_jours_hors_mois():
+    df_c = charges(charge("Loyer", "600", 31))
+    soldes, resume = projeter(revenus(), df_c, "2026-02", n_mois=2)
+    assert soldes.loc["2026-02", 28] == -600.0
+    assert soldes.loc["2026-02", [29, 30, 31]].isna().all()
+    assert resume["Tension"].tolist() == [28, 31]
+
+
+# --- 3. MOIS ---
+def test_decaler_mois():
+    assert decaler_mois("2026-04", 1) == "2026-05"
+    assert decaler_mois("2026-12", 1) == "2027-01"
+    assert decaler_mois("2026-01", -1) == "2025-12"
+    assert decaler_mois("2026-04", -16) == "2024-12"
+    assert decaler_mois("2026-04", 0) == "2026-04"
+
+
+# --- 4. INDEX MENSUEL ---
+def historique_trois_mois():
+    return revenus(
+        revenu("A", "1000", "2026-03-05"), revenu("B", "200", "2026-04-05"),
+        revenu("C", "300", "2026-04-20"), revenu("D", "400", "2026-05-05"),
+    )
+
+
+def meme_index(index, df_r, df_c):
+    ref = IndexMensuel(df_r, df_c)
+    assert {m: t for m, t in index.totaux.items() if t} == ref.totaux
+    assert {m: p.tolist() for m, p in index.positions.items() if len(p)} == {m: p.tolist() for m, p in ref.positions.items()}
+
+
+def test_index_suit_les_modifications_ligne_a_ligne():
+    df_r, df_c = historique_trois_mois(), charges(charge("Loyer", "600", 5))
+    index = IndexMensuel(df_r, df_c)
+    # B passe de 200 € en avril à 250 € en mai
+    index.modifier_revenu(1, "2026-04", 20000, "2026-05", 25000)
+    df_r.loc[1, ["Montant Net", "Mois Paiement"]] = [25000, "2026-05"]
+    meme_index(index, df_r, df_c)
+    # A est supprimée : les positions suivantes reculent
+    index.supprimer_revenu(0, "2026-03", 100000)
+    df_r = df_r.drop(index=0).reset_index(drop=True)
+    meme_index(index, df_r, df_c)
+    index.ajouter_revenu(len(df_r), "2026-06", 5000)
+    df_r = pd.concat([df_r, revenus(revenu("E", "50", "2026-06-01"))], ignore_index=True)
+    meme_index(index, df_r, df_c)
+    assert index.revenus(df_r, "2026-05")["Source"].tolist() == ["B", "D"]
+
+
+def test_grand_livre_de_proche_en_proche():
+    index = IndexMensuel(historique_trois_mois(), charges(charge("Loyer", "600", 5)))
+    index.ouvrir("2026-04", 50000)
+    assert index.solde_ouverture("2026-04") == 50000
+    assert index.solde_ouverture("2026-05") == 50000 + 50000 - 60000
+    assert index.solde_ouverture("2026-03") == 50000 - (100000 - 60000)
+    assert index.solde_ouverture("2026-07") == 40000 + (40000 - 60000) - 60000
+
+
+def test_grand_livre_n_oublie_que_les_mois_dependants():
+    index = IndexMensuel(historique_trois_mois(), charges(charge("Loyer", "600", 5)))
+    index.ouvrir("2026-03", 0)
+    soldes = {m: index.solde_ouverture(m) for m in ("2026-04", "2026-05", "2026-06", "2026-07")}
+    index.modifier_revenu(3, "2026-05", 40000, "2026-05", 10000)
+    # Les soldes jusqu'à mai (ouverture de mai comprise) ne dépendent pas du flux de mai
+    assert set(index._soldes) >= {"2026-03", "2026-04", "2026-05"}
+    assert not set(index._soldes) & {"2026-06", "2026-07"}
+    assert index.solde_ouverture("2026-05") == soldes["2026-05"]
+    assert index.solde_ouverture("2026-06") == soldes["2026-06"] - 30000
+    assert index.solde_ouverture("2026-07") == soldes["2026-07"] - 30000
+
+
+def test_derniere_ouverture():
+    assert derniere_ouverture(ingerer_soldes([])) is None
+    df_s = ingerer_soldes([
+        {"User": "u@test.fr", "Mois": "2026-04", "Solde": "-120,50", "ID": "b"},
+        {"User": "u@test.fr", "Mois": "2026-02", "Solde": "900", "ID": "a"},
+    ])
+    assert derniere_ouverture(df_s) == ("2026-04", -12050)
+
+
+def test_bilan_mois_depuis_le_solde_reel():
+    df_r, df_c = historique_trois_mois(), charges(charge("Loyer", "600", 5))
+    sans = bilan_mois(df_r, df_c, "2026-05")
+    assert sans["debut"] == 0 and sans["tension"] == 5
+    # 500 € au 1er avril : ouverture de mai = 500 + 500 - 600 = 400 €, le loyer ne fait plus passer sous zéro
+    avec = bilan_mois(df_r, df_c, "2026-05", ouverture=("2026-04", 50000))
+    assert avec["debut"] == 400.0
+    assert avec["timeline"]["Cumul"].tolist() == [-200.0, 200.0]
+    assert avec["tension"] == 5
+    avec = bilan_mois(df_r, df_c, "2026-05", ouverture=("2026-04", 80000))
+    assert avec["tension"] is None
+    assert avec["solde"] == sans["solde"]
+
+
+def test_solde_du_mois_et_grand_livre_memes_sorties():
+    # Charge hors FIXES / EPARGNE / VARIABLES et charge négative : le solde affiché est le flux du grand livre
+    df_r = historique_trois_mois()
+    df_c = charges(charge("Loyer", "600", 5), charge("Mutuelle", "40", 8, "AUTRE"), charge("Avoir", "-30", 3, "VARIABLES"))
+    for mois in ("2026-03", "2026-04", "2026-05"):
+        b = bilan_mois(df_r, df_c, mois, ouverture=("2026-03", 50000))
+        suivant = bilan_mois(df_r, df_c, decaler_mois(mois, 1), ouverture=("2026-03", 50000))
+        assert b["total_sorties"] == 640.0
+        assert suivant["debut"] == b["debut"] + b["solde"] == b["timeline"]["Cumul"].iloc[-1]
+        assert scenarios(df_r, df_c, mois).iloc[0]["Solde"] == b["solde"]
+
+
+# --- 5. SCÉNARIOS ---
+def mois_type():
+    df_r = revenus(revenu("Paie", "1500", "2026-04-10"))
+    df_c = charges(
+        charge("Loyer", "800", 5), charge("Courses", "400", 12, "VARIABLES"),
+        charge("Livret", "200", 10, "EPARGNE"), charge("Forfait", "50", 10),
+    )
+    return df_r, df_c
+
+
+def test_scenario_neutre_redonne_le_tableau_de_bord():
+    df_r, df_c = mois_type()
+    for solde in (0.0, 300.0):
+        s = scenarios(df_r, df_c, MOIS, solde_initial=solde).iloc[0]
+        tl = build_timeline(df_r, df_c, MOIS, solde_initial=solde)
+        b = bilan_mois(df_r, df_c, MOIS)
+        assert (s["Entrées"], s["Sorties"], s["Solde"], s["Score"]) == (b["entree_totale"], b["total_sorties"], b["solde"], b["score"])
+        assert s["Etat"] == b["etat"]
+        assert s["Point bas"] == tl["Cumul"].min()
+        assert (None if np.isnan(s["Tension"]) else s["Tension"]) == date_tension(tl)
+
+
+def test_grille_de_scenarios():
+    df_r, df_c = mois_type()
+    grille = scenarios(df_r, df_c, MOIS, montants=(0.0, 1000.0), jours=(1, 15), coupes_variables=(0, 50), sans_epargne=(False, True))
+    assert len(grille) == 16
+    s = grille.set_index(["Montant", "Jour", "Coupe variables", "Sans épargne"])
+    assert s.loc[(0.0, 15, 50.0, False), "Sorties"] == 1250.0
+    assert s.loc[(0.0, 15, 0.0, True), "Sorties"] == 1250.0
+    assert s.loc[(1000.0, 15, 0.0, False), "Entrées"] == 2500.0
+    # Revenu en plus versé le 1er : le loyer du 5 passe, mais le 10 livret et forfait partent avant la paie
+    assert s.loc[(0.0, 1, 0.0, False), "Tension"] == 5
+    assert s.loc[(1000.0, 1, 0.0, False), "Tension"] == 10
+    assert s.loc[(1000.0, 1, 0.0, False), "Point bas"] == -50.0
+    assert np.isnan(s.loc[(1000.0, 1, 0.0, True), "Tension"])
+    assert s.loc[(1000.0, 15, 0.0, False), "Tension"] == 5
+
+
+def test_scenario_le_meme_jour_que_les_charges():
+    # Revenu en plus le 5, jour du loyer : le loyer passe d'abord (comme dans la timeline)
+    df_c = charges(charge("Loyer", "800", 5))
+    s = scenarios(revenus(), df_c, MOIS, montants=(1000.0,), jours=(5,)).iloc[0]
+    assert s["Point bas"] == -800.0
+    assert s["Tension"] == 5
+    assert s["Solde"] == 200.0
@@ -0,0 +1,60 @@
+"""Moteur de paie : nets et dates de paiement tirés de la table de règles, identiques ligne à ligne et par lots."""
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from paie import REGLES, TYPES_REVENUS, calculer_net, calculer_paie, date_paiement
+
+
+@pytest.mark.parametrize("type_c, taux, heures, paniers, charges, net", [
+    ("Intérim", 12.5, 100, 0, None, 1179.75),            # 1250 x 1.21 x (1 - 22 %)
+    ("Intérim", "12,50", "100", "10", None, 1189.75),
+    ("Intérim", 12.5, 100, 0, 0, 1512.5),                # charges remplacées ligne à ligne
+    ("Micro-Entreprise", 400, 3, 0, None, 945.6),        # 1200 x (1 - 21,2 %)
+    ("Micro-Entreprise", "400", "3", "", "21.20", 945.6),
+    ("Salaire", 2000, 1, 0, None, 2000.0),
+    ("Type inconnu", 10, 2, 5, None, 25.0),              # règle "Autre"
+])
+def test_calculer_net(type_c, taux, heures, paniers, charges, net):
+    assert calculer_net(type_c, taux, heures, paniers, charges) == net
+
+
+def test_calculer_net_entrees_vides():
+    assert calculer_net("Intérim", "", None, "abc") == 0.0
+
+
+@pytest.mark.parametrize("type_c, mission, paiement", [
+    ("Intérim", datetime.date(2026, 3, 20), datetime.datetime(2026, 4, 12)),
+    ("Intérim", datetime.date(2026, 12, 1), datetime.datetime(2027, 1, 12)),
+    ("Micro-Entreprise", datetime.date(2026, 3, 20), datetime.datetime(2026, 4, 19)),
+    ("Salaire", datetime.date(2026, 3, 20), datetime.datetime(2026, 3, 20)),
+    ("Type inconnu", datetime.date(2026, 3, 20), datetime.datetime(2026, 3, 20)),
+])
+def test_date_paiement(type_c, mission, paiement):
+    assert date_paiement(type_c, mission) == paiement
+
+
+def test_lot_identique_au_calcul_unitaire():
+    types = TYPES_REVENUS + ["Type inconnu"]
+    n = len(types)
+    taux, heures, paniers = np.linspace(10, 30, n), np.arange(1, n + 1) * 7.5, np.full(n, 4.2)
+    missions = pd.to_datetime(["2026-01-31"] * n)
+    res = calculer_paie(types, taux, heures, paniers, missions)
+    assert res["Net"].tolist() == [calculer_net(*x) for x in zip(types, taux, heures, paniers)]
+    assert res["Date Paiement"].tolist() == [pd.Timestamp(date_paiement(t, "2026-01-31")) for t in types]
+
+
+def test_table_de_regles_remplacable():
+    regles = REGLES.copy()
+    regles.loc["Intérim", ["charges", "delai_valeur"]] = [0.0, 5]
+    res = calculer_paie(["Intérim"], [10], [10], [0], pd.to_datetime(["2026-03-20"]), regles=regles)
+    assert res["Net"].tolist() == [121.0]
+    assert res["Date Paiement"].tolist() == [pd.Timestamp("2026-04-05")]
+
+
+def test_charges_nan_gardent_la_regle():
+    res = calculer_paie(["Intérim"] * 2, [10, 10], [10, 10], [0, 0], pd.to_datetime(["2026-03-20"] * 2),
+                        charges_pct=[np.nan, 50])
+    assert res["Net"].tolist() == [94.38, 60.5]
@@ -0,0 +1,103 @@
+"""Accès sous quota : seau à jetons, reprises et appels non idempotents."""
+from unittest import mock
+
+import pytest
+import requests
+from gspread.exceptions import APIError
+
+from benchmarks.fake_gspread import FakeSpreadsheet
+from quota import ClasseurPlanifie, Planificateur, TokenBucket
+
+
+def erreur_api(code):
+    reponse = mock.Mock(status_code=code)
+    reponse.json.return_value = {"error": {"code": code, "message": "erreur", "status": "X"}}
+    return APIError(reponse)
+
+
+def planificateur(**kwargs):
+    return Planificateur(debit=1000, capacite=1000, base=0.001, plafond=0.001, **kwargs)
+
+
+def en_panne(*erreurs, resultat="ok"):
+    """Fonction qui lève `erreurs` une à une puis réussit. Compte ses appels."""
+    reste = list(erreurs)
+
+    def fn(*args, **kwargs):
+        fn.appels += 1
+        if reste:
+            raise reste.pop(0)
+        return resultat
+    fn.appels = 0
+    return fn
+
+
+def test_seau_a_jetons():
+    seau = TokenBucket(debit=100, capacite=2)
+    assert seau.prendre() == 0 and seau.prendre() == 0
+    assert seau.prendre() > 0   # rafale épuisée : on attend le prochain jeton
+
+
+@pytest.mark.parametrize("erreur", [erreur_api(429), erreur_api(503), requests.exceptions.ConnectionError()])
+def test_lecture_reprise(erreur):
+    p = planificateur()
+    fn = en_panne(erreur, erreur)
+    assert p.executer("get_all_records", fn) == "ok"
+    assert fn.appels == 3
+    assert p.stats()["get_all_records"]["reprises"] == 2
+
+
+@pytest.mark.parametrize("nom", ["append_rows", "batch_update_classeur", "delete_rows"])
+def test_pas_de_rejeu_d_un_appel_non_idempotent_sur_5xx(nom):
+    p = planificateur()
+    fn = en_panne(erreur_api(503))
+    with pytest.raises(APIError):
+        p.executer(nom, fn)
+    assert fn.appels == 1
+    assert p.stats()[nom]["echecs"] == 1
+
+
+def test_appel_non_idempotent_repris_sur_429():
+    p = planificateur()
+    fn = en_panne(erreur_api(429))
+    assert p.executer("append_rows", fn) == "ok"
+    assert fn.appels == 2
+
+
+def test_erreur_definitive_pas_reprise():
+    p = planificateur()
+    fn = en_panne(erreur_api(400))
+    with pytest.raises(APIError):
+        p.executer("get_all_records", fn)
+    assert fn.appels == 1
+
+
+def test_abandon_apres_max_essais():
+    p = planificateur(max_essais=3)
+    fn = en_panne(*(erreur_api(503) for _ in range(5)))
+    with pytest.raises(APIError):
+        p.executer("get_all_records", fn)
+    assert fn.appels == 3
+
+
+def test_suppression_de_lignes_du_classeur_jamais_rejouee():
+    sh = FakeSpreadsheet({"DATA": [["User", "ID"], ["u", "a"], ["u", "b"], ["u", "c"]]})
+    supprimer = sh.batch_update
+
+    def supprime_puis_503(body):
+        supprimer(body)   # Google a appliqué la suppression... puis la réponse se perd
+        raise erreur_api(503)
+
+    sh.batch_update = supprime_puis_503
+    classeur = ClasseurPlanifie(sh, planificateur())
+    corps = {"requests": [{"deleteDimension": {"range": {"sheetId": 0, "dimension": "ROWS", "startIndex": 1, "endIndex": 2}}}]}
+    with pytest.raises(APIError):
+        classeur.batch_update(corps)
+    assert sh.worksheet("DATA").rows == [["User", "ID"], ["u", "b"], ["u", "c"]]   # "b" n'a pas été supprimée en plus
+
+
+def test_onglets_en_cache():
+    sh = FakeSpreadsheet({"DATA": [["User"]]})
+    classeur = ClasseurPlanifie(sh, planificateur())
+    assert classeur.worksheet("DATA") is classeur.worksheet("DATA")
+    assert sh.appels["worksheet"] == 1
@@ -0,0 +1,75 @@
+"""Schéma canonique : parsing des dates et montants saisis à la main, centimes int64, aller-retour stockage."""
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from schema import centimes, dates, ingerer_charges, ingerer_revenus, ingerer_soldes, nombres, vers_stockage
+
+
+def test_dates_mixtes():
+    serie = pd.Series(["2026-03-15", "15/03/2026", " 2026-03-15 08:00:00", "mars", "", None])
+    res = dates(serie)
+    assert res.dtype == "datetime64[ns]"
+    assert res[:3].tolist() == [pd.Timestamp("2026-03-15")] * 3
+    assert res[3:].isna().all()
+
+
+def test_dates_deja_typees():
+    objets = pd.Series([datetime.date(2026, 3, 15), datetime.datetime(2026, 4, 1, 12)])
+    assert dates(objets).tolist() == [pd.Timestamp("2026-03-15"), pd.Timestamp("2026-04-01 12:00")]
+    assert dates(pd.Series(pd.to_datetime(["2026-03-15"]))).dtype == "datetime64[ns]"
+
+
+def test_nombres_a_la_francaise():
+    serie = pd.Series(["'12,50", "1 200,5", "1 200,50 €", "-3", "abc", "", None])
+    res = nombres(serie)
+    assert res[:4].tolist() == [12.5, 1200.5, 1200.5, -3.0]
+    assert res[4:].isna().all()
+    assert nombres(pd.Series([1, 2])).dtype == float
+
+
+def test_centimes_int64_sans_erreur_d_arrondi():
+    res = centimes(pd.Series(["0,1", "0.2", 1189.75, "19,99", "illisible"]))
+    assert res.dtype == "int64"
+    assert res.tolist() == [10, 20, 118975, 1999, 0]
+    # 0.1 + 0.2 en flottants != 0.3, en centimes si
+    assert res[0] + res[1] == centimes(pd.Series(["0,30"]))[0]
+
+
+def test_ingerer_revenus():
+    df = ingerer_revenus([
+        {"User": "u@test.fr", "Date": "01/03/2026", "Source": "Agence", "Type": "Intérim",
+         "Montant Net": "'1 189,75", "Date Paiement": "2026-04-12", "Mois Paiement": ""},
+        {"User": "u@test.fr", "Date": "2026-03-02", "Type": "Salaire", "Montant Net": 2000,
+         "Date Paiement": "02/03/2026", "Mois Paiement": "2026-03-31"},
+        {"User": "u@test.fr", "Date": "2026-03-03", "Type": "Salaire", "Montant Net": "0"},
+    ])
+    assert len(df) == 2
+    assert df["Montant Net"].dtype == "int64" and df["Montant Net"].tolist() == [118975, 200000]
+    assert df["Date"].dtype == "datetime64[ns]" and df["Date Paiement"].dtype == "datetime64[ns]"
+    assert df["Mois Paiement"].tolist() == ["2026-04", "2026-03"]
+    assert isinstance(df["Type"].dtype, pd.CategoricalDtype)
+    assert df["ID"].tolist() == ["", ""]
+
+
+def test_ingerer_sans_filtre_et_vide():
+    assert len(ingerer_revenus([{"Montant Net": "0"}], filtrer=False)) == 1
+    vide = ingerer_revenus([])
+    assert vide.empty and vide["Montant Net"].dtype == "int64"
+
+
+def test_ingerer_charges_et_soldes():
+    ch = ingerer_charges([{"Groupe": "FIXES", "Intitule": "Loyer", "Montant": "600,5", "Jour": ""}])
+    assert ch["Montant"].tolist() == [60050] and ch["Jour"].tolist() == [1]
+    so = ingerer_soldes([{"Mois": "2026-03-01", "Solde": "-12,34"}, {"Mois": "??", "Solde": "5"}])
+    assert so["Mois"].tolist() == ["2026-03"] and so["Solde"].tolist() == [-1234]
+
+
+def test_aller_retour_stockage():
+    lignes = [{"User": "u@test.fr", "Date": "01/03/2026", "Mois": "2026-03", "Source": "Agence", "Type": "Intérim",
+               "Détails": "", "Montant Net": "1189.75", "Date Paiement": "2026-04-12", "Mois Paiement": "2026-04", "ID": "a1"}]
+    df = ingerer_revenus(lignes)
+    assert vers_stockage(df, "DATA") == lignes
+    assert vers_stockage(ingerer_revenus(vers_stockage(df, "DATA")), "DATA") == lignes
+    assert np.array_equal(ingerer_revenus(vers_stockage(df, "DATA"))["Montant Net"], df["Montant Net"])
@@ -0,0 +1,245 @@
+"""Couche de stockage : Google Sheets (sur le classeur en mémoire des benchmarks) et SQLite."""
+import sqlite3
+import threading
+
+import pytest
+
+from benchmarks.fake_gspread import FakeSpreadsheet
+from schema import ingerer_revenus
+from storage import COLONNES_REVENUS, GoogleSheetsStorage, ShardRouter, SQLiteStorage, diff_lignes, migrer_vers_shards
+
+U = "u@test.fr"
+
+
+def revenu(source, net="100.00", mois="2026-04", id=""):
+    return {"User": U, "Date": "2026-03-01", "Mois": "2026-03", "Source": source, "Type": "Intérim", "Détails": "",
+            "Montant Net": net, "Date Paiement": f"{mois}-05", "Mois Paiement": mois, "ID": id}
+
+
+def classeur(*lignes, colonnes=COLONNES_REVENUS):
+    return FakeSpreadsheet({"DATA": [list(colonnes)] + [[r.get(c, "") for c in colonnes] for r in lignes]})
+
+
+def sans_blocage(fn, delai=5):
+    """Exécute fn dans un thread : échec (au lieu d'un test bloqué) s'il ne rend pas la main"""
+    resultat = {}
+    t = threading.Thread(target=lambda: resultat.setdefault("valeur", fn()), daemon=True)
+    t.start()
+    t.join(delai)
+    assert not t.is_alive(), "appel bloqué"
+    return resultat["valeur"]
+
+
+# --- 1. IDS MANQUANTS (onglets d'avant la colonne ID) ---
+def test_ids_completes_une_seule_fois():
+    sh = classeur(revenu("A"), revenu("B", id="b1"), colonnes=COLONNES_REVENUS[:-1])
+    db = GoogleSheetsStorage(sh)
+    lignes = db.lire_partition("DATA", "DATA")
+    assert lignes[0]["ID"] and lignes[1]["ID"]
+    assert [r["ID"] for r in db.lire_partition("DATA", "DATA")] == [r["ID"] for r in lignes]
+
+
+def test_ids_gardes_en_texte():
+    sh = classeur(revenu("A", id="012345678901"))
+    assert GoogleSheetsStorage(sh).lire_partition("DATA", "DATA")[0]["ID"] == "012345678901"
+
+
+def test_ajout_pendant_le_complement_des_ids_sans_blocage():
+    # Une ligne arrive entre la lecture et la vérification : on relit (sans se bloquer sur son propre verrou)
+    sh = classeur(revenu("A"), revenu("B"))
+    ws = sh.worksheet("DATA")
+    lire = ws.get_all_records
+    deja = []
+
+    def lire_puis_ajout(**kwargs):
+        records = lire(**kwargs)
+        if not deja:
+            deja.append(1)
+            ws.rows.append([revenu("C", id="c1").get(c, "") for c in COLONNES_REVENUS])
+        return records
+
+    ws.get_all_records = lire_puis_ajout
+    db = GoogleSheetsStorage(sh)
+    lignes = sans_blocage(lambda: db.lire_partition("DATA", "DATA"))
+    assert [r["Source"] for r in lignes] == ["A", "B", "C"]
+    assert all(r["ID"] for r in lignes)
+    ids = ws.col_values(COLONNES_REVENUS.index("ID") + 1)[1:]
+    assert ids == [r["ID"] for r in lignes]
+    # Le verrou de l'onglet est bien libéré
+    sans_blocage(lambda: db.appliquer_diff("DATA", U, [], [], []))
+
+
+def test_onglet_qui_bouge_sans_arret():
+    sh = classeur(revenu("A"))
+    ws = sh.worksheet("DATA")
+    lire = ws.get_all_records
+
+    def lire_puis_ajout(**kwargs):
+        records = lire(**kwargs)
+        ws.rows.append([revenu("X").get(c, "") for c in COLONNES_REVENUS])
+        return records
+
+    ws.get_all_records = lire_puis_ajout
+    lignes = sans_blocage(lambda: GoogleSheetsStorage(sh).lire_partition("DATA", "DATA"))
+    assert lignes[0]["Source"] == "A"
+    assert sh.appels["get_all_records"] == GoogleSheetsStorage.ESSAIS_IDS
+
+
+# --- 2. ÉCRITURE DIFFÉRENTIELLE PAR ID ---
+def colonne(sh, nom, titre="DATA"):
+    return [r[COLONNES_REVENUS.index(nom)] for r in sh.worksheet(titre).rows[1:]]
+
+
+def test_diff_lignes():
+    avant = [revenu("A", id="a"), revenu("B", id="b"), revenu("C", id="c")]
+    apres = [revenu("A", id="a"), revenu("B2", id="b"), revenu("D")]
+    inserts, updates, deletes = diff_lignes(avant, apres, COLONNES_REVENUS)
+    assert [r["Source"] for r in inserts] == ["D"] and inserts[0]["ID"]
+    assert [r["Source"] for r in updates] == ["B2"]
+    assert deletes == ["c"]
+    # Même valeur sous une autre forme (nombre / texte) : pas une modification
+    assert diff_lignes([{"ID": 7, "Jour": "5"}], [{"ID": "7", "Jour": 5}], ["Jour"]) == ([], [], [])
+
+
+def test_appliquer_diff_par_id():
+    sh = classeur(*(revenu(s, id=s.lower()) for s in "ABCDEF"))
+    db = GoogleSheetsStorage(sh)
+    db.appliquer_diff("DATA", U, [revenu("G", id="g")], [revenu("B2", "250.50", id="b")], ["a", "c", "f"])
+    assert colonne(sh, "ID") == ["b", "d", "e", "g"]
+    assert colonne(sh, "Source") == ["B2", "D", "E", "G"]
+    assert colonne(sh, "Montant Net")[0] == "'250.50"
+    assert sh.appels["batch_update"] == 2 and sh.appels["append_rows"] == 1
+
+
+def test_suppressions_du_bas_vers_le_haut():
+    sh = classeur(*(revenu(s, id=s.lower()) for s in "ABCDE"))
+    corps = []
+    supprimer = sh.batch_update
+    sh.batch_update = lambda body: (corps.append(body), supprimer(body))[1]
+    GoogleSheetsStorage(sh).appliquer_diff("DATA", U, [], [], ["b", "e", "c"])
+    debuts = [r["deleteDimension"]["range"]["startIndex"] for r in corps[0]["requests"]]
+    assert debuts == [5, 3, 2]
+    assert colonne(sh, "ID") == ["a", "d"]
+
+
+def test_lignes_deplacees_entre_lecture_et_ecriture():
+    # Une autre session a supprimé "a" : les numéros de ligne ont changé, les IDs non
+    sh = classeur(*(revenu(s, id=s.lower()) for s in "ABCD"))
+    db = GoogleSheetsStorage(sh)
+    db.appliquer_diff("DATA", U, [], [], ["a"])
+    db.appliquer_diff("DATA", U, [], [revenu("C2", id="c"), revenu("A2", id="a")], ["d"])
+    assert colonne(sh, "ID") == ["b", "c", "a"]
+    assert colonne(sh, "Source") == ["B", "C2", "A2"]   # "a", supprimée entre-temps, est recréée
+
+
+# --- 3. SHARDS ---
+def test_routage_par_annuaire():
+    sh = classeur()
+    router = ShardRouter(sh, shards=4)
+    db = GoogleSheetsStorage(sh, router)
+    db.ajouter_lot("DATA", [{**revenu("A", id="a"), "User": "x@test.fr"}, {**revenu("B", id="b"), "User": "y@test.fr"}])
+    assert router.annuaire() == {"x@test.fr": router.shard_calcule("x@test.fr"), "y@test.fr": router.shard_calcule("y@test.fr")}
+    assert [r["Source"] for r in db.lire("DATA", "x@test.fr")] == ["A"]
+    # L'annuaire fait foi : un nouveau process relit l'affectation, même déplacée
+    router.enregistrer({"x@test.fr": "03", "y@test.fr": router.shard("y@test.fr")})
+    assert GoogleSheetsStorage(sh, ShardRouter(sh, shards=4)).partition("DATA", "x@test.fr") == "DATA_03"
+
+
+def test_migration_puis_refus_de_la_relancer():
+    sh = classeur(*({**revenu(s, id=s.lower()), "User": f"{s.lower()}@test.fr"} for s in "ABCD"))
+    router = ShardRouter(sh, shards=2)
+    bilan = migrer_vers_shards(sh, router, tables=("DATA",))
+    assert sum(bilan["DATA"].values()) == 4
+    db = GoogleSheetsStorage(sh, router)
+    assert [r["Source"] for r in db.lire("DATA", "c@test.fr")] == ["C"]
+    assert len(sh.worksheet("DATA").rows) == 5   # onglet d'origine gardé en sauvegarde
+
+    # L'app écrit dans les shards : relancer sans force les écraserait avec l'onglet d'origine
+    db.ajouter_lot("DATA", [{**revenu("E", id="e"), "User": "c@test.fr"}])
+    with pytest.raises(ValueError, match="déjà faite"):
+        migrer_vers_shards(sh, ShardRouter(sh, shards=2), tables=("DATA",))
+    assert [r["Source"] for r in db.lire("DATA", "c@test.fr")] == ["C", "E"]
+    migrer_vers_shards(sh, ShardRouter(sh, shards=2), tables=("DATA",), force=True)
+    assert [r["Source"] for r in GoogleSheetsStorage(sh, ShardRouter(sh, shards=2)).lire("DATA", "c@test.fr")] == ["C"]
+
+
+def test_migration_table_absente():
+    sh = classeur(revenu("A", id="a"))
+    assert migrer_vers_shards(sh, ShardRouter(sh, shards=2), tables=("DATA", "SOLDES"))["SOLDES"] == {}
+
+
+# --- 4. SQLITE (sans réseau) ---
+def test_sqlite_aller_retour(tmp_path):
+    chemin = str(tmp_path / "sf.db")
+    db = SQLiteStorage(chemin)
+    db.ajouter_lot("DATA", [revenu("A", id="a"), {**revenu("B"), "User": "autre@test.fr"}, revenu("C", "12.5", id="012")])
+    db.ajouter_lot("CHARGES", [{"User": U, "Groupe": "FIXES", "Intitule": "Loyer", "Montant": 600, "Jour": 5}])
+    # Relu par une autre connexion (fichier WAL)
+    db = SQLiteStorage(chemin)
+    lignes = db.lire("DATA", U)
+    assert [r["Source"] for r in lignes] == ["A", "C"]
+    assert lignes[1]["ID"] == "012" and lignes[1]["Montant Net"] == "12.5"
+    assert db.lire("CHARGES", U)[0]["Intitule"] == "Loyer" and db.lire("CHARGES", U)[0]["ID"]
+    assert sorted(db.partitions("DATA")) == ["autre@test.fr", U]
+    assert len(db.lire_tout("DATA")) == 3
+
+
+def test_sqlite_fenetre():
+    db = SQLiteStorage(":memory:")
+    db.ajouter_lot("DATA", [revenu(m, mois=m) for m in ("2025-12", "2026-01", "2026-02", "2026-03")])
+    assert [r["Source"] for r in db.lire_fenetre(U, "2026-01", "2026-02")] == ["2026-01", "2026-02"]
+    assert [r["Source"] for r in db.lire_fenetre(U, "2025-12", "2025-12")] == ["2025-12"]
+    assert db.lire_fenetre("autre@test.fr", "2020-01", "2030-12") == []
+
+
+def test_sqlite_appliquer_diff():
+    db = SQLiteStorage(":memory:")
+    db.ajouter_lot("DATA", [revenu("A", id="a"), revenu("B", id="b"), {**revenu("X", id="a"), "User": "autre@test.fr"}])
+    db.appliquer_diff("DATA", U, [revenu("C", id="c")], [revenu("A2", "50.00", id="a")], ["b"])
+    assert [(r["Source"], r["ID"]) for r in db.lire("DATA", U)] == [("A2", "a"), ("C", "c")]
+    assert db.lire("DATA", U)[0]["Montant Net"] == "50.00"
+    # Même ID chez un autre compte : jamais touché
+    assert [r["Source"] for r in db.lire("DATA", "autre@test.fr")] == ["X"]
+
+
+def test_sqlite_ids_completes_une_seule_fois(tmp_path):
+    # Base créée avant la colonne ID : elle est ajoutée, puis remplie à la première lecture
+    chemin = str(tmp_path / "ancienne.db")
+    conn = sqlite3.connect(chemin)
+    colonnes = COLONNES_REVENUS[:-1]
+    cols_sql = ", ".join(f'"{c}"' for c in colonnes)
+    conn.execute(f'CREATE TABLE "DATA" ({cols_sql})')
+    conn.executemany(f'INSERT INTO "DATA" VALUES ({", ".join("?" for _ in colonnes)})', [[revenu(s)[c] for c in colonnes] for s in "AB"])
+    conn.commit()
+    conn.close()
+    db = SQLiteStorage(chemin)
+    ids = [r["ID"] for r in db.lire("DATA", U)]
+    assert all(ids) and len(set(ids)) == 2
+    assert [r["ID"] for r in SQLiteStorage(chemin).lire("DATA", U)] == ids
+
+
+def test_sqlite_non_appliquee():
+    db = SQLiteStorage(":memory:")
+    assert db.non_appliquee(sqlite3.OperationalError("database is locked"))
+    assert not db.non_appliquee(RuntimeError())
+
+
+def test_fenetre_identique_sur_les_deux_moteurs():
+    # Lignes historiques : mois vide, illisible ou avec le jour ; la date de paiement fait foi comme à l'ingestion
+    lignes = [
+        {**revenu("canonique", mois="2026-04"), "ID": "1"},
+        {**revenu("vide"), "Mois Paiement": "", "Date Paiement": "2026-04-12", "ID": "2"},
+        {**revenu("fr"), "Mois Paiement": "avril", "Date Paiement": "20/04/2026", "ID": "3"},
+        {**revenu("espace"), "Mois Paiement": " 2026-04 ", "ID": "4"},
+        {**revenu("avec jour"), "Mois Paiement": "2026-04-30", "ID": "5"},
+        {**revenu("hors"), "Mois Paiement": "", "Date Paiement": "2026-06-01", "ID": "6"},
+        {**revenu("illisible"), "Mois Paiement": "", "Date Paiement": "", "ID": "7"},
+    ]
+    sqlite = SQLiteStorage(":memory:")
+    sqlite.ajouter_lot("DATA", lignes)
+    sheets = GoogleSheetsStorage(classeur(*lignes))
+    attendu = ["canonique", "vide", "fr", "espace", "avec jour"]
+    assert [r["Source"] for r in sqlite.lire_fenetre(U, "2026-03", "2026-05")] == attendu
+    assert [r["Source"] for r in sheets.lire_fenetre(U, "2026-03", "2026-05")] == attendu
+    mois = ingerer_revenus(sqlite.lire("DATA", U))["Mois Paiement"].tolist()
+    assert mois == ["2026-04"] * 5 + ["2026-06", ""]
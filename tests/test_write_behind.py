@@ -0,0 +1,113 @@
+"""File d'écriture différée : lots, statuts des tickets et renvois."""
+from unittest import mock
+
+import requests
+from gspread.exceptions import APIError
+
+from benchmarks.fake_gspread import FakeSpreadsheet
+from storage import GoogleSheetsStorage, StorageBackend
+from write_behind import ECHEC, EN_ATTENTE, ENVOYE, WriteBehindQueue
+
+
+def erreur_api(code):
+    reponse = mock.Mock(status_code=code)
+    reponse.json.return_value = {"error": {"code": code, "message": "erreur", "status": "X"}}
+    return APIError(reponse)
+
+
+class Backend(StorageBackend):
+    """Moteur factice : les erreurs de `pannes` sont levées une à une, puis les lots passent"""
+
+    def __init__(self, *pannes, renvoyables=(429,)):
+        self.pannes = list(pannes)
+        self.renvoyables = renvoyables
+        self.lots = []
+
+    def ajouter_lot(self, table, records):
+        if self.pannes:
+            raise self.pannes.pop(0)
+        self.lots.append((table, [r["ID"] for r in records]))
+
+    def non_appliquee(self, erreur):
+        return isinstance(erreur, APIError) and erreur.code in self.renvoyables
+
+
+def file(backend, **kwargs):
+    # Thread de fond endormi pendant le test : les envois se font par flush()
+    return WriteBehindQueue(backend, intervalle=3600, **kwargs)
+
+
+def revenu(source):
+    return {"User": "u@test.fr", "Source": source}
+
+
+def test_un_lot_par_table_et_tickets_envoyes():
+    backend = Backend()
+    q = file(backend)
+    t1, t2 = q.soumettre("DATA", revenu("A")), q.soumettre("DATA", revenu("B"))
+    t3 = q.soumettre("CHARGES", revenu("C"))
+    assert q.statut(t1) == EN_ATTENTE
+    assert [r["Source"] for r in q.en_attente("DATA", "u@test.fr")] == ["A", "B"]
+    assert q.flush() is True
+    assert backend.lots == [("DATA", [t1, t2]), ("CHARGES", [t3])]
+    assert {q.statut(t) for t in (t1, t2, t3)} == {ENVOYE}
+    assert q.en_attente("DATA", "u@test.fr") == [] and q._statuts == {}
+
+
+def test_refus_avant_ecriture_renvoye():
+    backend = Backend(erreur_api(429))
+    q = file(backend)
+    t = q.soumettre("DATA", revenu("A"))
+    assert q.flush() is False
+    assert q.statut(t) == EN_ATTENTE
+    assert [r["ID"] for r in q.en_attente("DATA", "u@test.fr")] == [t]   # toujours visible
+    assert q.flush() is True
+    assert backend.lots == [("DATA", [t])]
+    assert q.statut(t) == ENVOYE
+
+
+def test_ecriture_peut_etre_passee_pas_de_renvoi():
+    # 503 : Google a peut-être écrit, renvoyer créerait un doublon
+    backend = Backend(erreur_api(503))
+    q = file(backend)
+    t = q.soumettre("DATA", revenu("A"))
+    assert q.flush() is False
+    assert q.statut(t) == ECHEC
+    assert q.en_attente("DATA", "u@test.fr") == []
+    q.flush()
+    assert backend.lots == []
+
+
+def test_echec_apres_max_essais():
+    backend = Backend(*(erreur_api(429) for _ in range(3)))
+    q = file(backend, max_essais=3)
+    t = q.soumettre("DATA", revenu("A"))
+    for _ in range(3):
+        q.flush()
+    assert q.statut(t) == ECHEC
+    assert backend.lots == []
+
+
+def test_lignes_en_vol_visibles_pendant_l_envoi():
+    vues = []
+    q = None
+
+    class Lent(Backend):
+        def ajouter_lot(self, table, records):
+            vues.append([r["Source"] for r in q.en_attente(table, "u@test.fr")])
+            super().ajouter_lot(table, records)
+
+    q = file(Lent())
+    q.soumettre("DATA", revenu("A"))
+    q.flush()
+    assert vues == [["A"]]
+
+
+def test_non_appliquee_google_sheets():
+    db = GoogleSheetsStorage(FakeSpreadsheet())
+    assert db.non_appliquee(erreur_api(429))
+    assert not db.non_appliquee(erreur_api(500))
+    assert not db.non_appliquee(erreur_api(503))
+    assert db.non_appliquee(requests.exceptions.ConnectTimeout())
+    assert not db.non_appliquee(requests.exceptions.ReadTimeout())
+    assert not db.non_appliquee(RuntimeError())
@@ -0,0 +1,123 @@
+"""File d'écriture différée : les ajouts de revenus de toutes les sessions partent en lots."""
+import atexit
+import logging
+import random
+import threading
+import time
+
+import perf
+from storage import nouvel_id
+
+log = logging.getLogger(__name__)
+
+EN_ATTENTE, ENVOYE, ECHEC = "pending", "flushed", "failed"
+
+
+class WriteBehindQueue:
+    """Un thread par process : toutes les `intervalle` secondes, les lignes en attente
+    sont regroupées en un seul `ajouter_lot` par table (donc un append_rows par onglet).
+    Un lot refusé sans avoir été écrit (voir StorageBackend.non_appliquee) est retenté avec un délai
+    exponentiel, puis marqué en échec. Si l'écriture a pu passer (5xx, timeout), il est marqué en échec
+    tout de suite : le renvoyer créerait des doublons.
+    """
+
+    def __init__(self, backend, intervalle=2.0, max_essais=5, apres_ecriture=None):
+        self.backend = backend
+        self.apres_ecriture = apres_ecriture  # callback(table, records) une fois le lot écrit
+        self.intervalle = float(intervalle)
+        self.max_essais = int(max_essais)
+        self.lock = threading.Lock()
+        self._envoi = threading.Lock()   # un seul flush à la fois (thread de fond / sauvegarde d'une session)
+        self._file = []        # [(ticket, table, record)]
+        self._en_vol = []      # lot en cours d'envoi : encore visible dans en_attente jusqu'à l'accusé
+        self._essais = {}      # ticket -> nb d'échecs
+        self._statuts = {}     # ticket -> EN_ATTENTE / ECHEC (les tickets envoyés sont retirés)
+        self._prochain_essai = 0.0
+        self._thread = threading.Thread(target=self._boucle, name="write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def soumettre(self, table, record):
+        """Met la ligne en file et rend la main tout de suite. Retourne un ticket (l'ID de la ligne)."""
+        ticket = record.get("ID") or nouvel_id()
+        with self.lock:
+            self._file.append((ticket, table, {**record, "ID": ticket}))
+            self._statuts[ticket] = EN_ATTENTE
+        return ticket
+
+    def statut(self, ticket):
+        with self.lock:
+            return self._statuts.get(ticket, ENVOYE)
+
+    def en_attente(self, table, user_email):
+        """Lignes pas encore écrites pour cet utilisateur (pour qu'il voie ses propres saisies)"""
+        with self.lock:
+            return [dict(r) for _, t, r in self._en_vol + self._file if t == table and str(r.get("User")) == str(user_email)]
+
+    def flush(self):
+        """Envoie immédiatement tout ce qui est en attente (un lot par table).
+        Attend la fin d'un envoi déjà en cours. False si une partie du lot n'a pas pu être écrite."""
+        with self._envoi:
+            with self.lock:
+                lot, self._file = self._file, []
+                self._en_vol = list(lot)
+            try:
+                return self._envoyer(lot)
+            finally:
+                with self.lock:
+                    self._en_vol = []
+
+    def _envoyer(self, lot):
+        if not lot:
+            return True
+
+        ok = True
+        for table in dict.fromkeys(t for _, t, _ in lot):
+            items = [(ticket, r) for ticket, t, r in lot if t == table]
+            try:
+                with perf.span("ecriture.lot", table=table, lignes=len(items)):
+                    self.backend.ajouter_lot(table, [r for _, r in items])
+            except Exception as e:
+                ok = False
+                self._echec(table, items, e)
+            else:
+                with self.lock:
+                    self._en_vol = [x for x in self._en_vol if x[1] != table]
+                    for ticket, _ in items:
+                        # statut() d'un ticket inconnu = ENVOYE : on ne garde rien (taille bornée)
+                        self._statuts.pop(ticket, None)
+                        self._essais.pop(ticket, None)
+                if self.apres_ecriture:
+                    self.apres_ecriture(table, [r for _, r in items])
+        return ok
+
+    def _echec(self, table, items, erreur):
+        a_retenter = []
+        renvoyable = self.backend.non_appliquee(erreur)
+        with self.lock:
+            self._en_vol = [x for x in self._en_vol if x[1] != table]
+            for ticket, r in items:
+                self._essais[ticket] = self._essais.get(ticket, 0) + 1
+                if not renvoyable or self._essais[ticket] >= self.max_essais:
+                    self._essais.pop(ticket, None)
+                    self._statuts[ticket] = ECHEC
+                    log.error("Ecriture abandonnée (%s, ticket %s) : %s", table, ticket, erreur)
+                else:
+                    a_retenter.append((ticket, table, r))
+            # Les lignes en échec repassent en tête de file (l'ordre d'arrivée est conservé)
+            self._file = a_retenter + self._file
+            n = max((self._essais.get(t, 0) for t, _, _ in a_retenter), default=0)
+        if a_retenter:
+            delai = min(60.0, self.intervalle * 2 ** n) * random.uniform(0.5, 1.0)
+            self._prochain_essai = time.monotonic() + delai
+            log.warning("Ecriture %s en échec (%s), nouvel essai dans %.1fs", table, erreur, delai)
+
+    def _boucle(self):
+        while True:
+            time.sleep(self.intervalle)
+            if time.monotonic() < self._prochain_essai:
+                continue
+            try:
+                self.flush()
+            except Exception:
+                log.exception("Erreur inattendue dans la file d'écriture")